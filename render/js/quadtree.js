@@ -0,0 +1,98 @@
+/**  Quadtree
+***  index of the bounding boxes of the shapes of a diagram, to find those in
+***  a rectangle, e.g. the viewport or the point clicked, without looking at
+***  all of them. An item is any object with x, y, width and height, kept in
+***  the smallest square of the tree which contains it.
+**/
+
+var QUADTREE_MAX_ITEMS = 16;//a square of more items is split in four
+var QUADTREE_MAX_DEPTH = 16;
+
+function Quadtree(x, y, size, depth)
+{
+	this.x = x;
+	this.y = y;
+	this.size = size;
+	this.depth = depth || 0;
+	this.items = [];
+	this.children = null;//the four quarters once split
+}
+
+//the quarter which contains item, null if it straddles the middle
+Quadtree.prototype.quarter = function(item)
+{
+	var half = this.size/2, mx = this.x + half, my = this.y + half;
+	var left = item.x + item.width <= mx, right = item.x >= mx;
+	var top = item.y + item.height <= my, bottom = item.y >= my;
+	if(!(left || right) || !(top || bottom))
+		return null;
+	return this.children[(right ? 1 : 0) + (bottom ? 2 : 0)];
+};
+
+Quadtree.prototype.split = function()
+{
+	var half = this.size/2, depth = this.depth + 1, items = this.items;
+	this.children = [new Quadtree(this.x, this.y, half, depth),
+	                 new Quadtree(this.x + half, this.y, half, depth),
+	                 new Quadtree(this.x, this.y + half, half, depth),
+	                 new Quadtree(this.x + half, this.y + half, half, depth)];
+	this.items = [];
+	for(var i=0;i<items.length;i++)
+		this.insert(items[i]);
+};
+
+Quadtree.prototype.insert = function(item)
+{
+	var node = this;
+	while(node.children !== null)
+	{
+		var quarter = node.quarter(item);
+		if(quarter === null)
+			break;
+		node = quarter;
+	}
+	node.items.push(item);
+	if(node.children === null && node.items.length > QUADTREE_MAX_ITEMS && node.depth < QUADTREE_MAX_DEPTH)
+		node.split();
+};
+
+//the items whose box meets the rectangle x, y, w, h, edges included, added to found
+Quadtree.prototype.query = function(x, y, w, h, found)
+{
+	found = found || [];
+	var stack = [this];
+	while(stack.length)
+	{
+		var node = stack.pop();
+		if(node.x > x + w || node.y > y + h || node.x + node.size < x || node.y + node.size < y)
+			continue;
+		for(var i=0;i<node.items.length;i++)
+		{
+			var item = node.items[i];
+			if(item.x <= x + w && item.y <= y + h && item.x + item.width >= x && item.y + item.height >= y)
+				found.push(item);
+		}
+		if(node.children !== null)
+			stack.push(node.children[0], node.children[1], node.children[2], node.children[3]);
+	}
+	return found;
+};
+
+//a Quadtree of items, its square just large enough
+Quadtree.build = function(items)
+{
+	var left = Infinity, top = Infinity, right = -Infinity, bottom = -Infinity;
+	for(var i=0;i<items.length;i++)
+	{
+		left = Math.min(left, items[i].x);
+		top = Math.min(top, items[i].y);
+		right = Math.max(right, items[i].x + items[i].width);
+		bottom = Math.max(bottom, items[i].y + items[i].height);
+	}
+	if(!items.length)
+		left = top = right = bottom = 0;
+	var tree = new Quadtree(left, top, Math.max(right - left, bottom - top, 1));
+	for(var i=0;i<items.length;i++)
+		tree.insert(items[i]);
+	return tree;
+};
@@ -1,3 +1,4 @@
+from itertools import izip
 
 def repr_keys(keys):
     ''' String repr of keys '''
@@ -12,6 +13,145 @@ def repr_indi_key(key):
     SEP = ', '
     return '({})'.format(SEP.join([att for att in key]))
 
+def relation_signature(R):
+    ''' Canonical, order independent form of relation R '''
+
+    def canonical(attrs):
+        return sorted(attrs) if attrs is not None else None
+
+    keys  = sorted(canonical(k) for k in R.keys) if R.keys is not None else []
+    fkeys = []
+    if R.fkeys is not None:
+        fkeys = sorted([canonical(fk.key), fk.refed_relation, canonical(fk.refed_key)]
+                       for fk in R.fkeys.values())
+    return [R.name, canonical(R.attributes), canonical(R.pkey), keys, fkeys, canonical(R.refed_by)]
+
+def key_groups(keys):
+    ''' Groups of keys connected by shared attributes
+
+        Keys sharing an attribute are in the same group, and so are the
+        groups they join. A union-find of the attributes finds them, so
+        the groups do not depend on the order of keys, in near linear time.
+        Returns a list of lists of keys, each in the order of keys, the
+        groups in the order of their first key.
+    '''
+
+    root = {}
+
+    def find(attr):
+        while root[attr] != attr:
+            root[attr] = root[root[attr]]
+            attr = root[attr]
+        return attr
+
+    keys = list(keys)
+    for k in keys:
+        top = None
+        for a in k:
+            a = find(root.setdefault(a, a))
+            if top is None:
+                top = a
+            elif a != top:
+                root[a] = top
+
+    groups, index = [], {}
+    for k in keys:
+        if not k:
+            # no attribute to share
+            groups.append([k])
+            continue
+        top = find(next(iter(k)))
+        if top not in index:
+            index[top] = len(groups)
+            groups.append([])
+        groups[index[top]].append(k)
+    return groups
+
+# the keys of a group whose choices max_disjoint_keys tries all, the
+# 2**MAX_EXACT_GROUP choices of a larger group are not
+MAX_EXACT_GROUP = 12
+
+def max_disjoint_keys(group):
+    ''' The largest number of pairwise disjoint keys of group, e.g. 2 for
+        {A}, {B}, {A, B}, whatever the order of the keys
+        group is a group of key_groups, a relation has a few foreign keys
+        sharing attributes at most, so all choices are tried. A group of
+        more than MAX_EXACT_GROUP keys is counted greedily instead, taking
+        the smallest keys first and keys of the same size by their sorted
+        attributes: a lower bound of the largest number, and the same for
+        the same keys in any order.
+    '''
+
+    group = sorted(group, key=lambda k: (len(k), sorted(k)))
+    if len(group) > MAX_EXACT_GROUP:
+        used, found = frozenset(), 0
+        for k in group:
+            if used.isdisjoint(k):
+                used, found = used.union(k), found + 1
+        return found
+
+    def count(i, used):
+        if i == len(group):
+            return 0
+        best = count(i + 1, used)
+        if used.isdisjoint(group[i]):
+            best = max(best, 1 + count(i + 1, used.union(group[i])))
+        return best
+
+    return count(0, frozenset())
+
+def count_disjoint_keys(keys):
+    ''' The largest number of pairwise disjoint keys, the sum of that of
+        each of their groups
+    '''
+    return sum(max_disjoint_keys(group) for group in key_groups(keys))
+
+def count_disjoint_keys_with(keys, count, key):
+    ''' count_disjoint_keys of keys and key, count being that of keys
+        Only the groups of keys which key joins are counted again, a key
+        disjoint from all of them adds one.
+    '''
+    joined = [group for group in key_groups(keys) if any(not key.isdisjoint(k) for k in group)]
+    if not joined:
+        return count + 1
+    return count - sum(max_disjoint_keys(group) for group in joined) + \
+           max_disjoint_keys([key] + [k for group in joined for k in group])
+
+def count_disjoint_masks(masks, keys):
+    ''' count_disjoint_keys of keys, masks being their masks in one
+        AttributeLayout
+        Keys sharing no attribute, the most common case, are counted from
+        their masks alone, in one pass.
+    '''
+    union = 0
+    for mask in masks:
+        if union & mask:
+            return count_disjoint_keys(keys)
+        union |= mask
+    return len(masks)
+
+def pack_attributes(attributes):
+    ''' The flat tuple (name, elements, cardinality, ...) of attributes, a
+        dict of elements -> Attribute, the elements of a single attribute
+        kept as the attribute alone
+    '''
+    packed = []
+    for elements, attr in attributes.iteritems():
+        if len(elements) == 1:
+            elements, = elements
+        packed.extend((attr.name, elements, attr.cardinality))
+    return tuple(packed)
+
+def unpack_attributes(packed):
+    ''' The dict of elements -> Attribute of packed, see pack_attributes '''
+    attributes = {}
+    for i in xrange(0, len(packed), 3):
+        elements = packed[i + 1]
+        if type(elements) is not frozenset:
+            elements = frozenset([elements])
+        attributes[elements] = Attribute(packed[i], elements, packed[i + 2])
+    return attributes
+
 def repr_cardinality(card):
     ''' String repr of key '''
     if card in Cardinality.valid_cardinalities:
@@ -89,6 +229,8 @@ class Attribute(object):
         The cardinality of each attribute is associated with Entity or Relationship
     '''
 
+    __slots__ = ('_name', '_elements', '_cardinality')
+
     def __init__(self, name, elements, cardinality):
         self._name = name
         if type(elements) == frozenset:
@@ -123,7 +265,8 @@ class Attribute(object):
     def to_dict(self):
         ''' Return a dict representation of attribute '''
         attr_dict = {'cardinality': repr_cardinality(self._cardinality)}
-        attr_dict.update({'elements': [e for e in self._elements]})
+        # sorted, a frozenset has no order of its own
+        attr_dict.update({'elements': sorted(self._elements)})
 
         return attr_dict
 
@@ -133,18 +276,200 @@ class Attribute(object):
         return self._name
 
 
+# the bits of the attributes of a layout, bit i is BITS[i]
+BITS = [1 << i for i in range(64)]
+
+class AttributeLayout(object):
+    ''' The bit of each attribute of a relation
+
+        A subset of the attributes is encoded as an int mask, so that subset,
+        equality and disjointness tests are single integer operations.
+    '''
+
+    __slots__ = ('_names', '_bits')
+
+    def __init__(self, names):
+        self._names = names # a tuple of attribute names, bit i is names[i]
+        while len(BITS) < len(names):
+            BITS.append(1 << len(BITS))
+        self._bits  = dict(izip(names, BITS))
+
+    def mask(self, attrs):
+        ''' Return the mask of attrs, None if attrs is not in the layout '''
+        mask = 0
+        bits = self._bits
+        for a in attrs:
+            if a not in bits:
+                return None
+            mask |= bits[a]
+        return mask
+
+    def elements(self, mask):
+        ''' Return the frozenset view of mask '''
+        return frozenset([name for i, name in enumerate(self._names) if mask >> i & 1])
+
+    @property
+    def names(self):
+        ''' Return the attribute names in bit order '''
+        return self._names
+
+
+class AttributeTable(object):
+    ''' Per-schema symbol table of attribute layouts
+
+        Masks are local to the layout of a relation, so they stay as wide as
+        the relation rather than the whole schema. Relations with the same
+        attributes share one layout.
+    '''
+
+    def __init__(self):
+        self._layouts = {} # frozenset of attributes -> AttributeLayout
+
+    def layout(self, attributes):
+        ''' Return the layout of a relation with attributes '''
+        layout = self._layouts.get(attributes)
+        if layout is None:
+            layout = self._layouts[attributes] = AttributeLayout(tuple(sorted(attributes)))
+        return layout
+
+    def encode(self, relations, schema=None):
+        ''' Encode the attribute sets of relations, an iterable of Relation,
+            a refed key in the layout of the relation of schema, a dict of
+            name -> Relation, it references
+        '''
+        layout = self.layout
+        for R in relations:
+            R_layout = layout(R.attributes)
+            R.encode(R_layout)
+            fkeys = R.fkeys
+            if fkeys is None:
+                continue
+            mask = R_layout.mask
+            for fk in fkeys.itervalues():
+                fk.key_mask = mask(fk.key)
+                if schema is not None and fk.refed_relation in schema:
+                    fk.refed_key_mask = layout(schema[fk.refed_relation].attributes).mask(fk.refed_key)
+
+    def __len__(self):
+        return len(self._layouts)
+
+
+class NameTable(object):
+    ''' Per-schema table of shared attribute names and attribute sets
+
+        Equal names and sets of different relations become one object. A set
+        is only shared when it also iterates in the same order, so what is
+        built from it (e.g. the names of composite attributes) is unchanged.
+    '''
+
+    def __init__(self):
+        self._names = {} # name -> the shared name
+        self._sets  = {} # frozenset -> the shared frozenset
+
+    def name(self, name):
+        ''' Return the shared name equal to name '''
+        return self._names.setdefault(name, name)
+
+    def share(self, attrs):
+        ''' Return the shared frozenset of attrs, a frozenset '''
+        shared = self._sets.setdefault(attrs, attrs)
+        if shared is not attrs and tuple(shared) != tuple(attrs):
+            return attrs
+        return shared
+
+    def split(self, names, share=True):
+        ''' Return the shared frozenset of the sequence of names, of shared
+            names only if not share (e.g. the attributes of a relation,
+            which compact keeps in a tuple)
+        '''
+        attrs = frozenset([self.name(n) for n in names])
+        return self.share(attrs) if share else attrs
+
+    def __len__(self):
+        return len(self._sets)
+
+
 class ForeignKey(object):
     ''' Represents a foreign key in relation '''
 
+    __slots__ = ('key', 'refed_key', 'refed_relation', 'key_mask', 'refed_key_mask')
+
     def __init__(self, key, refed_key, refed_relation):
 
         self.key = key
         self.refed_key = refed_key
         self.refed_relation = refed_relation
 
+        # masks set by AttributeTable.encode
+        self.key_mask = self.refed_key_mask = None
+
+    def compact(self, names):
+        ''' Share the keys and the referenced relation name through names,
+            see Relation.compact. Returns self.
+        '''
+        self.key            = names.share(self.key)
+        self.refed_key      = names.share(self.refed_key)
+        self.refed_relation = names.name(self.refed_relation)
+        return self
+
+    def as_tuple(self):
+        ''' Return (key, refed_key, refed_relation) '''
+        return (self.key, self.refed_key, self.refed_relation)
+
+
+class ForeignKeys(object):
+    ''' The read-only dict of key -> ForeignKey of a compacted relation,
+        a view of the tuple key, refed key, refed relation, ... it keeps
+        them in; a relation has a few foreign keys at most, the ForeignKeys
+        asked for are built from it.
+    '''
+
+    __slots__ = ('_fkeys',)
+
+    def __init__(self, fkeys):
+        self._fkeys = fkeys
+
+    def __len__(self):
+        return len(self._fkeys) // 3
+
+    def __iter__(self):
+        return iter(self._fkeys[::3])
+
+    def __contains__(self, key):
+        return key in self._fkeys[::3]
+
+    def __getitem__(self, key):
+        fkeys = self._fkeys
+        for i in xrange(0, len(fkeys), 3):
+            if fkeys[i] == key:
+                return ForeignKey(*fkeys[i:i + 3])
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        return list(self._fkeys[::3])
+
+    def values(self):
+        fkeys = self._fkeys
+        return [ForeignKey(*fkeys[i:i + 3]) for i in xrange(0, len(fkeys), 3)]
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def items(self):
+        return [(fk.key, fk) for fk in self.values()]
+
+
 class Relation(object):
     ''' Represents a relation in Relational model '''
 
+    # a schema holds as many Relations as it has lines, so without an
+    # instance dict; the layout and masks are set by encode
+    __slots__ = ('_name', '_attributes', '_keys', '_pkey', '_fkeys', '_refed_by',
+                 '_primes', '_num_disjoint_fkeys', '_compacted', '_layout', '_pkey_mask')
+
     def __init__(self, name, attributes, 
                        keys=None, pkey=None, 
                        fkeys=None, refed_by=None):
@@ -155,33 +480,110 @@ class Relation(object):
         self._pkey       = pkey
         self._fkeys      = fkeys
         self._refed_by   = refed_by
+        self._compacted  = False
+        self._layout     = self._pkey_mask = None
 
         self._update_primes()
-        self._count_disjoint_fkeys()
+        # kept current by add_fkey
+        self._num_disjoint_fkeys = count_disjoint_keys(fkeys) if fkeys else 0
+
+    @classmethod
+    def from_keys(cls, name, attributes, keys=(), fkeys=()):
+        ''' Build relation with all its keys and foreign keys at once
+            keys is a sequence of keys, the first one is the primary key
+            fkeys is an iterable of ForeignKey
+        '''
+        keys = list(keys)
+        if keys:
+            R = cls(name, attributes, keys=set(keys), pkey=keys[0])
+        else:
+            R = cls(name, attributes)
+
+        for fkey in fkeys:
+            R.add_fkey(fkey)
+        return R
 
     def _update_primes(self):
-        ''' update prime attributes '''
-        self._primes = set([])
+        ''' rebuild prime attributes from all keys '''
+        self._primes = set()
         if self._keys is not None:
-            for key in self._keys:
-                self._primes.update(key)
-
-    def _count_disjoint_fkeys(self):
-        ''' count disjoint foreign keys '''
+            self._primes.update(*self._keys)
+
+    def compact(self, names):
+        ''' Shrink R to the least memory, names is the NameTable of the schema
+            The name and the attribute sets of R are shared with the other
+            relations, its attributes, keys, foreign keys and referencing
+            relations are kept in tuples in their iteration order, a primary
+            key of several attributes as the int of their bits in the tuple
+            of attributes, the primes not at all. The properties return them
+            as before, the attributes, primary key, primes and non-primes as
+            frozensets built when asked for and the foreign keys as a
+            ForeignKeys view. Adding to R afterwards expands it again.
+        '''
+        if self._compacted:
+            return
+        self._name       = names.name(self._name)
+        self._attributes = tuple(names.name(a) for a in self._attributes)
+        self._primes     = None
+        pkey = self._pkey
+        if pkey is not None:
+            # one attribute is shared with the fkeys referencing it, the
+            # bits are kept if the frozenset of them iterates as pkey (its
+            # elements are joined for names)
+            bits = sum(1 << i for i, a in enumerate(self._attributes) if a in pkey)
+            if len(pkey) > 1 and tuple(self._elements(bits)) == tuple(pkey):
+                self._pkey = bits
+            else:
+                self._pkey = names.share(pkey)
+        if self._keys is not None:
+            # the keys other than the primary key, most relations have none,
+            # from a list so that no keys is the one empty tuple
+            self._keys = tuple([names.share(k) for k in self._keys if k != pkey])
         if self._fkeys is not None:
-            attr_seen = set([])
-            counter = 0
-            for fk in self._fkeys:
-                if not len(fk.intersection(attr_seen)):
-                    counter += 1
-                attr_seen.update(fk)
-        else:
-            counter = 0
-        self._num_disjoint_fkeys = counter
+            self._fkeys = tuple(a for fk in self._fkeys.values() for a in
+                                    fk.compact(names).as_tuple())
+        if self._refed_by is not None:
+            self._refed_by = tuple(names.name(r) for r in self._refed_by)
+        # the masks are encoded again
+        self._layout = self._pkey_mask = None
+        self._compacted = True
+
+    def _elements(self, bits):
+        ''' Return the frozenset of the attributes of bits of a compacted R '''
+        return frozenset([a for i, a in enumerate(self._attributes) if bits >> i & 1])
+
+    def _expand(self):
+        ''' Undo compact before R is changed or encoded '''
+        if not self._compacted:
+            return
+        self._pkey       = self.pkey
+        self._primes     = set(self.primes)
+        self._attributes = frozenset(self._attributes)
+        if self._keys is not None:
+            self._keys = set((self._pkey,) + self._keys)
+        if self._fkeys is not None:
+            self._fkeys = dict(ForeignKeys(self._fkeys).items())
+        if self._refed_by is not None:
+            self._refed_by = set(self._refed_by)
+        self._compacted = False
+
+    def encode(self, layout):
+        ''' Compute the mask of the primary key of R in layout, the layout of
+            its attributes, those of other attribute sets of R are computed
+            when asked for
+            Masks are a snapshot, adding a key or an fkey or setting the
+            primary key leaves R unencoded (layout is None), and so does a
+            primary key not in layout. A compacted R is expanded, its masks
+            are kept with its ForeignKeys.
+        '''
+        self._expand()
+        self._pkey_mask = layout.mask(self._pkey) if self._pkey is not None else None
+        self._layout    = layout if self._pkey_mask is not None else None
 
     def add_key(self, key):
         ''' add key to relation '''
 
+        self._expand()
         if self._keys is None:
             self._keys = set([key])
             # if pkey not set, the first key becomes the pkey
@@ -189,7 +591,9 @@ class Relation(object):
         else:
             self._keys.add(key)
 
-        self._update_primes()
+        self._primes.update(key)
+        # the masks are encoded again
+        self._layout = None
 
     def add_fkey(self, fkey):
         ''' add foreign key to relation '''
@@ -197,17 +601,24 @@ class Relation(object):
         if not isinstance(fkey, ForeignKey):
             raise ValueError('Input is not an instance of ForeighKey')
         elif not fkey.key.issubset(self._attributes):
-            raise ValueError('Key {} is not a subset of attributes of R'.foramt(fkey.key))
-        elif self._fkeys is None:
+            raise ValueError('Key {} is not a subset of attributes of R'.format(repr_indi_key(fkey.key)))
+
+        self._expand()
+        if self._fkeys is None:
             self._fkeys = {fkey.key: fkey}
+            self._num_disjoint_fkeys = 1
         else:
-            self._fkeys.update({fkey.key: fkey})
-
-        self._count_disjoint_fkeys()
+            if fkey.key not in self._fkeys:
+                # replacing an fkey leaves the count as it is
+                self._num_disjoint_fkeys = count_disjoint_keys_with(self._fkeys, self._num_disjoint_fkeys,
+                                                                    fkey.key)
+            self._fkeys[fkey.key] = fkey
+        self._layout = None
 
     def add_refed_by(self, refed_by):
         ''' Add other relation to refed_by ''' 
 
+        self._expand()
         if self._refed_by is None:
             self._refed_by = set([refed_by])
         else:
@@ -215,14 +626,16 @@ class Relation(object):
 
     def set_primary_key(self, key):
         ''' Set the primay key of relation '''
-        if key in self._keys:
+        if key in self.keys:
+            self._expand()
             self._pkey = key
+            self._layout = None
         else:
             raise KeyError('{} is not a key of R'.format(key))
 
     def __str__(self):
         ''' String representation '''
-        return '{}{}'.format(self._name, repr_str(self._pkey))
+        return '{}{}'.format(self._name, repr_str(self.pkey))
 
     @property
     def name(self):
@@ -232,21 +645,29 @@ class Relation(object):
     @property
     def attributes(self):
         "Get the attributes of relation."
+        if self._compacted:
+            return frozenset(self._attributes)
         return self._attributes
 
     @property
     def keys(self):
-        "Get the keys of relation."
+        "Get the keys of relation, a tuple if compacted."
+        if self._compacted and self._keys is not None:
+            return (self.pkey,) + self._keys
         return self._keys
 
     @property
     def pkey(self):
         "Get the primary key of relation."
+        if self._compacted and isinstance(self._pkey, (int, long)):
+            return self._elements(self._pkey)
         return self._pkey
 
     @property
     def fkeys(self):
         "Get the foreign keys of relation."
+        if self._compacted and self._fkeys is not None:
+            return ForeignKeys(self._fkeys)
         return self._fkeys
 
     @property
@@ -257,32 +678,81 @@ class Relation(object):
     @property
     def primes(self):
         "return the primes attributes "
+        if self._compacted:
+            keys = self.keys
+            return keys[0].union(*keys[1:]) if keys else frozenset()
         return self._primes
 
     @property
     def non_primes(self):
         "return the non-primes attributes "
+        if self._compacted:
+            primes = self.primes
+            return frozenset([a for a in self._attributes if a not in primes])
         return self._attributes.difference(self._primes)
 
+    @property
+    def layout(self):
+        "Get the AttributeLayout of relation, None if not encoded."
+        return self._layout
+
+    @property
+    def attr_mask(self):
+        "Get the mask of attributes."
+        return (1 << len(self._layout.names)) - 1
+
+    @property
+    def pkey_mask(self):
+        "Get the mask of the primary key."
+        return self._pkey_mask
+
+    @property
+    def non_prime_mask(self):
+        "Get the mask of the non-prime attributes."
+        return self.attr_mask & ~self._layout.mask(self._primes)
+
+    @property
+    def fkey_groups(self):
+        ''' the groups of fkeys sharing attributes, see key_groups '''
+        if self._fkeys is None:
+            return []
+        return key_groups(self.fkeys)
+
     @property
     def num_disjoint_fkeys(self):
-        ''' return the disjoint fkeys count '''
-        if self._num_disjoint_fkeys:
-            return self._num_disjoint_fkeys
-        else:
-            return 0
+        ''' return the largest number of pairwise disjoint fkeys, see
+            count_disjoint_keys
+        '''
+        return self._num_disjoint_fkeys
 
 class Entity(object):
     ''' Represents Entity in ER model '''
 
+    __slots__ = ('_name', '_type', '_attributes', '_identifier', '_compacted')
+
     def __init__(self, name, Etype = None, identifier = None, attributes = None):
         self._name = name
         self._type = Etype
         self._attributes = attributes
+        self._compacted = False
 
         # call the setter function
         self.identifier = identifier
 
+    def compact(self):
+        ''' Shrink the Entity to the least memory
+            Its attributes are kept in the tuple of pack_attributes and its
+            identifier as its elements, attributes and identifier return new
+            Attributes of them. The Entity may still be changed.
+        '''
+        if self._compacted:
+            return
+        if self._attributes is not None:
+            self._attributes = pack_attributes(self._attributes)
+        if isinstance(self._identifier, Attribute):
+            self._identifier = self._identifier.elements
+        self._compacted = True
+
     def add_attribute(self, attribute):
         ''' Add attribute to Entity 
             attribute is an instance of Attribute
@@ -290,7 +760,11 @@ class Entity(object):
         if not isinstance(attribute, Attribute):
             raise ValueError('Not an instance of Attribute')
 
-        if self._attributes is None:
+        if self._compacted:
+            attributes = self.attributes or {}
+            attributes[attribute.elements] = attribute
+            self._attributes = pack_attributes(attributes)
+        elif self._attributes is None:
             self._attributes = {attribute.elements: attribute}
         else:
             # will update attribute if already in dict
@@ -300,16 +774,24 @@ class Entity(object):
         ''' Remove attribute from Entity 
             attribute is an instance of Attribute
         '''
-        if self._attributes is not None and attr_elements in self._attributes:
+        attributes = self.attributes
+        if attributes is not None and attr_elements in attributes:
             # remove
-            self._attributes.pop(attr_elements)
+            attributes.pop(attr_elements)
+            if self._compacted:
+                self._attributes = pack_attributes(attributes)
 
     @property
     def attributes(self):
+        ''' the dict of elements -> Attribute, a new one if compacted '''
+        if self._compacted and self._attributes is not None:
+            return unpack_attributes(self._attributes)
         return self._attributes
 
     @property
     def identifier(self):
+        if self._compacted and self._identifier is not None:
+            return Attribute('_'.join(self._identifier), self._identifier, Cardinality.one2one)
         return self._identifier
 
     @identifier.setter
@@ -323,15 +805,15 @@ class Entity(object):
             self._identifier = None
             return
 
-        if self._attributes is not None and attr_elem in self._attributes:
+        if self._attributes is not None and attr_elem in self.attributes:
             # attr_elem already in attributes
-            self._attributes[attr_elem].Cardinality = one2one
+            self.attributes[attr_elem].Cardinality = one2one
             self._identifier = attr_elem
             return
 
         name = '_'.join(attr_elem)
         identifier = Attribute(name, attr_elem, Cardinality.one2one)
-        self._identifier = identifier
+        self._identifier = attr_elem if self._compacted else identifier
         self.add_attribute(identifier)
 
     @property
@@ -348,6 +830,8 @@ class Entity(object):
 class Relationship(object):
     ''' Represents Relationship in ER model '''
 
+    __slots__ = ('_name', '_identifier', '_entities', '_attributes', '_type', '_compacted')
+
     def __init__(self, name, Rtype = None, identifier= None):
 
         self._name        = name
@@ -360,15 +844,38 @@ class Relationship(object):
         self._attributes  = {}
         # the type of Relationship
         self._type        = Rtype
+        self._compacted   = False
+
+    def compact(self):
+        ''' Shrink the Relationship to the least memory, as Entity.compact
+            Its participating entities are kept in a tuple of name,
+            cardinality, ... and entities returns a new dict of them. Its
+            identifier, which is not returned by any property, is dropped.
+        '''
+        if self._compacted:
+            return
+        self._identifier = None
+        self._entities   = tuple(x for item in self._entities.iteritems() for x in item)
+        self._attributes = pack_attributes(self._attributes)
+        self._compacted  = True
 
     def add_participating_entity(self, name, cardinality):
         ''' Add participating entity passed by name '''
-        self._entities.update({name: cardinality})
+        if self._compacted:
+            entities = self.entities
+            entities[name] = cardinality
+            self._entities = tuple(x for item in entities.iteritems() for x in item)
+        else:
+            self._entities.update({name: cardinality})
 
     def add_attribute(self, attr):
         ''' Add attribute to the Relationship '''
         if not isinstance(attr, Attribute):
             raise ValueError('Input is not an instance of Attibute.')
+        elif self._compacted:
+            attributes = self.attributes
+            attributes[attr.elements] = attr
+            self._attributes = pack_attributes(attributes)
         else:
             self._attributes.update({attr.elements: attr})
 
@@ -383,12 +890,17 @@ class Relationship(object):
 
     @property
     def entities(self):
-        "Get the entities associated with the relationship."
+        "Get the entities associated with the relationship, a new dict if compacted."
+        if self._compacted:
+            entities = self._entities
+            return dict(izip(entities[::2], entities[1::2]))
         return self._entities
 
     @property
     def attributes(self):
-        "Get the attributes of relationship."
+        "Get the attributes of relationship, a new dict if compacted."
+        if self._compacted:
+            return unpack_attributes(self._attributes)
         return self._attributes
 
     @property
@@ -403,4 +915,3 @@ class Relationship(object):
             self._type = Rtype
         else:
             raise ValueError("Invalid Relationship type: {}".format(Rtype))
-
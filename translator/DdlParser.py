@@ -0,0 +1,582 @@
+#!/usr/bin/python
+
+import re
+
+from SchemaParser import catalog_relations
+
+# characters read from the dump at a time
+BLOCK_SIZE = 1 << 16
+
+# the longest token looked at across two blocks, e.g. a $tag$
+_GUARD = 64
+
+# statements parsed by their first word, the others are skipped unread
+DDL_WORDS = ('CREATE', 'ALTER')
+
+# the start of anything that may hide a ';' which does not end the statement
+_SPECIAL_RE = re.compile(r"""[;'"`]|--|/\*|\$(?:[A-Za-z_]\w*)?\$""")
+
+_FIRST_WORD_RE = re.compile(r'\s*([A-Za-z]+)[^A-Za-z]')
+_COPY_RE       = re.compile(r'COPY\b.*\bFROM\s+stdin\b', re.I | re.S)
+_COPY_END_RE   = re.compile(r'\n\\\.')
+
+def _skip_pattern(backslash_escapes):
+    ''' regex running over the complete parts of a skipped statement
+
+        A literal is only taken once the character after it is in the
+        buffer, so that a doubled quote is never split between blocks.
+    '''
+    if backslash_escapes:
+        string = r"'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'(?=[^'])"
+    else:
+        string = r"'[^']*(?:''[^']*)*'(?=[^'])"
+    return re.compile('(?:' + '|'.join([
+                r"""[^;'"`\-/$]+""",
+                string,
+                r'"[^"]*(?:""[^"]*)*"(?=[^"])',
+                r'`[^`]*(?:``[^`]*)*`(?=[^`])',
+                r'--[^\n]*\n',
+                r'/\*.*?\*/',
+                r'-(?=[^-])',
+                r'/(?=[^*])',
+                r'\$(?=[^$A-Za-z_])']) + ')*', re.S)
+
+
+class StatementScanner(object):
+    ''' Split a SQL dump into statements, reading it a block at a time
+
+        Only the statements starting with one of words are kept, with the
+        comments replaced by a space. The others, e.g. INSERT, are scanned
+        for the end of their quotes and comments without being stored, and
+        the data of COPY ... FROM stdin is skipped up to its '\\.' line, so
+        the memory used is that of a block and the longest statement kept.
+        backslash_escapes tells whether '\\' escapes a character in a quoted
+        string, as in MySQL dumps.
+    '''
+
+    def __init__(self, stream, words=DDL_WORDS, backslash_escapes=True, block_size=BLOCK_SIZE):
+        self._stream     = stream
+        self._words      = set(word.upper() for word in words)
+        self._block_size = block_size
+        self._skip_re    = _skip_pattern(backslash_escapes)
+        self._escapes    = backslash_escapes
+
+        self._buf    = ''
+        self._pos    = 0
+        self._eof    = False
+        self._lineno = 1        # the line of _buf[_pos]
+
+        self._state  = None     # the quote, comment or COPY data being scanned
+        self._new_statement()
+
+    def _new_statement(self):
+        self._keep   = None     # whether the statement is kept, None until its first word
+        self._parts  = []
+        self._start  = None     # line of the first part
+
+    def _read(self):
+        ''' append a block to the buffer, False at the end of the stream '''
+        block = self._stream.read(self._block_size)
+        if not block:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + block
+        self._pos = 0
+        return True
+
+    def _consume(self, end, text=True):
+        ''' move to end, adding the text passed to the statement if kept '''
+        start = self._pos
+        if end <= start:
+            return
+        if self._keep is not False:
+            if self._start is None:
+                self._start = self._lineno
+            self._parts.append(self._buf[start:end] if text else ' ')
+            if self._keep is None:
+                self._check_first_word()
+        self._lineno += self._buf.count('\n', start, end)
+        self._pos = end
+
+    def _check_first_word(self):
+        head = ''.join(self._parts)
+        if not head.strip():
+            # only blanks so far
+            self._parts, self._start = [], None
+            return
+        matches = _FIRST_WORD_RE.match(head)
+        if matches is not None:
+            word = matches.group(1).upper()
+            self._start += head.count('\n', 0, matches.start(1))
+            if word in self._words:
+                self._keep = True
+            elif word == 'COPY':
+                # kept to know whether data follows
+                self._keep = 'COPY'
+            else:
+                self._keep, self._parts = False, []
+        elif len(head) > _GUARD:
+            # no word to start with
+            self._keep, self._parts = False, []
+
+    def _end_statement(self):
+        ''' the statement kept, if any, and get ready for the next '''
+        keep, start = self._keep, self._start
+        text = ''.join(self._parts).strip()
+        self._new_statement()
+        if keep == 'COPY':
+            if _COPY_RE.match(text):
+                self._state = 'COPY'
+                self._keep  = False
+        elif keep and text:
+            return start, text
+        return None
+
+    def _step(self):
+        ''' scan on from _pos, return a statement ended, None if it needs
+            another block (or there is nothing left), False otherwise
+        '''
+        buf, pos = self._buf, self._pos
+        end      = len(buf)
+        # tokens starting in the guard are left for the next block
+        limit    = end if self._eof else end - _GUARD
+        state    = self._state
+
+        if state is None:
+            if self._keep is False:
+                # skip at once all the statement in the buffer that is complete
+                matches = self._skip_re.match(buf, pos)
+                if matches.end() > pos:
+                    self._consume(matches.end())
+                    return False
+            matches = _SPECIAL_RE.search(buf, pos)
+            if matches is None or matches.start() >= limit:
+                self._consume(max(pos, limit))
+                return None
+            self._consume(matches.start())
+            token = matches.group()
+            if token == ';':
+                self._pos = matches.end()
+                return self._end_statement() or False
+            self._state = token
+            if token in ('--', '/*'):
+                self._pos = matches.end()
+            else:
+                # a quote, part of the statement
+                self._consume(matches.end())
+            return False
+
+        if state == 'COPY':
+            matches = _COPY_END_RE.search(buf, pos)
+            if matches is None:
+                self._consume(end if self._eof else max(pos, end - 2), text=False)
+                return None
+            self._consume(matches.end(), text=False)
+            self._state = None
+            # the line ends as a statement
+            self._new_statement()
+            return False
+
+        if state == '--':
+            newline = buf.find('\n', pos)
+            if newline < 0:
+                self._consume(end, text=False)
+                return None
+            self._consume(newline, text=False)
+            self._state = None
+            return False
+
+        if state == '/*':
+            close = buf.find('*/', pos)
+            if close < 0:
+                self._consume(end if self._eof else max(pos, end - 1), text=False)
+                return None
+            self._consume(close + 2, text=False)
+            self._state = None
+            return False
+
+        if state[0] == '$':
+            close = buf.find(state, pos)
+            if close < 0:
+                self._consume(end if self._eof else max(pos, end - len(state) + 1))
+                return None
+            self._consume(close + len(state))
+            self._state = None
+            return False
+
+        # in a quote
+        i = pos
+        while True:
+            close = buf.find(state, i)
+            if state == "'" and self._escapes:
+                backslash = buf.find('\\', i, close if close >= 0 else end)
+                if backslash >= 0:
+                    if backslash + 1 >= end and not self._eof:
+                        self._consume(backslash)
+                        return None
+                    i = backslash + 2
+                    continue
+            if close < 0:
+                self._consume(end)
+                return None
+            if close + 1 >= end and not self._eof:
+                # a doubled quote may go on in the next block
+                self._consume(close)
+                return None
+            if close + 1 < end and buf[close + 1] == state:
+                i = close + 2
+                continue
+            self._consume(close + 1)
+            self._state = None
+            return False
+
+    def statements(self):
+        ''' Yield (line number, text) of each statement kept '''
+        while True:
+            statement = self._step()
+            if statement:
+                yield statement
+            elif statement is None:
+                if self._eof:
+                    break
+                # once the stream ends the guard is scanned too
+                self._read()
+
+        # a last statement without ';'
+        if self._state is None:
+            statement = self._end_statement()
+            if statement:
+                yield statement
+
+
+# tokens of a DDL statement
+_TOKEN_RE = re.compile(r'''\s*(?:
+                (?P<quoted>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\]) |
+                (?P<string>'(?:[^'\\]|\\.|'')*') |
+                (?P<punct>[(),.;]) |
+                (?P<word>[^\s(),.;'"`\[]+))''', re.X | re.S)
+
+class Token(object):
+    ''' A token of a DDL statement, word is the upper case of a bare word '''
+
+    def __init__(self, value, word):
+        self.value = value
+        self.word  = word
+
+def tokenize(text):
+    ''' the Tokens of text, identifiers unquoted '''
+    tokens = []
+    for matches in _TOKEN_RE.finditer(text):
+        kind = matches.lastgroup
+        value = matches.group(kind)
+        if kind == 'quoted':
+            quote = value[0]
+            value = value[1:-1]
+            if quote != '[':
+                value = value.replace(quote * 2, quote)
+            tokens.append(Token(value, None))
+        elif kind == 'word':
+            tokens.append(Token(value, value.upper()))
+        elif kind == 'punct':
+            tokens.append(Token(value, value))
+        else:
+            tokens.append(Token(value, None))
+    return tokens
+
+def _words(tokens, i, *words):
+    ''' whether tokens from i are the bare words given '''
+    return all(i + j < len(tokens) and tokens[i + j].word == word for j, word in enumerate(words))
+
+def _group(tokens, i):
+    ''' (the tokens in the parentheses opening at i, the index after them) '''
+    depth = 0
+    for j in range(i, len(tokens)):
+        if tokens[j].word == '(':
+            depth += 1
+        elif tokens[j].word == ')':
+            depth -= 1
+            if depth == 0:
+                return tokens[i + 1:j], j + 1
+    return tokens[i + 1:], len(tokens)
+
+def _split(tokens):
+    ''' tokens split at the commas outside of parentheses '''
+    items, item, depth = [], [], 0
+    for token in tokens:
+        if token.word == '(':
+            depth += 1
+        elif token.word == ')':
+            depth -= 1
+        elif token.word == ',' and depth == 0:
+            items.append(item)
+            item = []
+            continue
+        item.append(token)
+    if item:
+        items.append(item)
+    return items
+
+def _name(tokens, i):
+    ''' (the last part of the qualified name at i, the index after it) '''
+    name = tokens[i].value
+    i += 1
+    while _words(tokens, i, '.') and i + 1 < len(tokens):
+        name = tokens[i + 1].value
+        i += 2
+    return name, i
+
+def _find(tokens, i, word):
+    ''' index of word outside of parentheses from i, None if missing '''
+    depth = 0
+    for j in range(i, len(tokens)):
+        if depth == 0 and tokens[j].word == word:
+            return j
+        if tokens[j].word == '(':
+            depth += 1
+        elif tokens[j].word == ')':
+            depth -= 1
+    return None
+
+def _columns(tokens):
+    ''' the column names of a key, None if it has an expression '''
+    columns = []
+    for item in _split(tokens):
+        if len(item) > 1 and item[1].word == '(':
+            # a prefix length is kept, an expression is not a column
+            inner, _ = _group(item, 1)
+            if len(inner) != 1 or not inner[0].value.isdigit():
+                return None
+        columns.append(item[0].value)
+    return columns or None
+
+def _key_shape(tokens, i):
+    ''' whether tokens from i are the rest of a key or index definition,
+        [KEY | INDEX] [name] [USING method] (column, ...), rather than the
+        type of a column named like the word before, e.g. key VARCHAR(10)
+    '''
+    while i < len(tokens) and tokens[i].word in ('KEY', 'INDEX', 'NULLS', 'NOT', 'DISTINCT'):
+        i += 1
+    if i < len(tokens) and tokens[i].word != '(':
+        # the name of the key
+        i += 1
+    if _words(tokens, i, 'USING'):
+        i += 2
+    if not _words(tokens, i, '(') or i + 1 >= len(tokens):
+        return False
+    # a type has a length or the values of an enum in its parentheses
+    first = tokens[i + 1].value
+    return not (first.isdigit() or first.startswith("'"))
+
+def _constraint_shape(tokens):
+    ''' whether tokens, starting with a word of DdlBuilder.IGNORED_CONSTRAINTS,
+        are a table constraint and not a column named like it
+    '''
+    word = tokens[0].word
+    if word in ('KEY', 'INDEX', 'FULLTEXT', 'SPATIAL'):
+        return _key_shape(tokens, 1)
+    if word == 'CHECK':
+        return _words(tokens, 1, '(')
+    if word == 'EXCLUDE':
+        return _words(tokens, 1, '(') or _words(tokens, 1, 'USING')
+    if word == 'PERIOD':
+        return _words(tokens, 1, 'FOR')
+    if word == 'LIKE':
+        # LIKE parent [INCLUDING ... | EXCLUDING ...], a qualified parent
+        # or options tell it from a column of a type
+        if len(tokens) < 2:
+            return False
+        _, i = _name(tokens, 1)
+        return i > 2 or (i < len(tokens) and tokens[i].word in ('INCLUDING', 'EXCLUDING'))
+    return False
+
+
+class DdlBuilder(object):
+    ''' Build the dict of Relations from DDL statements
+
+        Understands CREATE TABLE with column and table constraints,
+        ALTER TABLE ... ADD of columns and constraints, and CREATE UNIQUE
+        INDEX. Other statements are ignored.
+    '''
+
+    # words of table constraints which are not keys, a column of the same
+    # name is told apart by what follows, see _constraint_shape
+    IGNORED_CONSTRAINTS = frozenset(['KEY', 'INDEX', 'FULLTEXT', 'SPATIAL', 'CHECK',
+                                     'EXCLUDE', 'LIKE', 'PERIOD'])
+
+    # the words a named table constraint goes on with
+    CONSTRAINT_WORDS = frozenset(['PRIMARY', 'UNIQUE', 'FOREIGN', 'CHECK', 'EXCLUDE'])
+
+    def __init__(self):
+        self._tables     = {}   # lower case name -> (name, [column, ...], [pkey], [key, ...])
+        self._order      = []
+        self._references = {}   # lower case name -> [(table, parent, [column, ...], [column, ...]), ...]
+
+    def feed(self, statements):
+        ''' consume the (line number, text) of statements '''
+        for lineno, text in statements:
+            tokens = tokenize(text)
+            if _words(tokens, 0, 'CREATE'):
+                self._create(tokens, lineno)
+            elif _words(tokens, 0, 'ALTER', 'TABLE'):
+                self._alter_table(tokens, lineno)
+        return self
+
+    def _create(self, tokens, lineno):
+        i = 1
+        while i < len(tokens) and tokens[i].word in ('OR', 'REPLACE', 'GLOBAL', 'LOCAL',
+                                                     'TEMP', 'TEMPORARY', 'UNLOGGED', 'UNIQUE'):
+            i += 1
+        if _words(tokens, i, 'TABLE') and not _words(tokens, 1, 'UNIQUE'):
+            self._create_table(tokens, i + 1, lineno)
+        elif _words(tokens, i, 'INDEX') and _words(tokens, 1, 'UNIQUE'):
+            self._create_unique_index(tokens, i + 1, lineno)
+
+    def _create_table(self, tokens, i, lineno):
+        if _words(tokens, i, 'IF', 'NOT', 'EXISTS'):
+            i += 3
+        if i >= len(tokens):
+            return
+        name, i = _name(tokens, i)
+        if not _words(tokens, i, '('):
+            # CREATE TABLE ... AS, LIKE or PARTITION OF
+            return
+        elements, _ = _group(tokens, i)
+
+        # a table created again replaces the old one
+        lname = name.lower()
+        if lname not in self._tables:
+            self._order.append(lname)
+        self._tables[lname] = (name, [], [], [])
+        self._references[lname] = []
+        for element in _split(elements):
+            self._add_element(lname, element)
+
+    def _alter_table(self, tokens, lineno):
+        i = 2
+        while i < len(tokens) and tokens[i].word in ('IF', 'EXISTS', 'ONLY'):
+            i += 1
+        if i >= len(tokens):
+            return
+        name, i = _name(tokens, i)
+        lname = name.lower()
+        for action in _split(tokens[i:]):
+            if not _words(action, 0, 'ADD'):
+                continue
+            if lname not in self._tables:
+                print('Skip ALTER TABLE {} at line {} since relation definition missing.'.format(name, lineno))
+                return
+            j = 1
+            if _words(action, j, 'COLUMN'):
+                j += 1
+            if _words(action, j, 'IF', 'NOT', 'EXISTS'):
+                j += 3
+            self._add_element(lname, action[j:])
+
+    def _create_unique_index(self, tokens, i, lineno):
+        on = _find(tokens, i, 'ON')
+        if on is None or on + 1 >= len(tokens):
+            return
+        i = on + 1
+        if _words(tokens, i, 'ONLY'):
+            i += 1
+        name, i = _name(tokens, i)
+        start = _find(tokens, i, '(')
+        if start is None:
+            return
+        key, after = _group(tokens, start)
+        if _find(tokens, after, 'WHERE') is not None:
+            # a partial index is not a key
+            return
+        lname = name.lower()
+        if lname not in self._tables:
+            print('Skip index on {} at line {} since relation definition missing.'.format(name, lineno))
+            return
+        columns = _columns(key)
+        if columns is not None:
+            self._tables[lname][3].append(columns)
+
+    def _add_element(self, lname, tokens):
+        ''' add the column or table constraint of tokens to table lname '''
+        if not tokens:
+            return
+        if tokens[0].word == 'CONSTRAINT' and len(tokens) > 2 \
+                and tokens[2].word in self.CONSTRAINT_WORDS:
+            tokens = tokens[2:]
+        word = tokens[0].word
+        table = self._tables[lname]
+
+        if word == 'PRIMARY' and _words(tokens, 1, 'KEY'):
+            start = _find(tokens, 2, '(')
+            if start is not None:
+                columns = _columns(_group(tokens, start)[0])
+                if columns is not None:
+                    table[2][:] = columns
+        elif word == 'UNIQUE' and _key_shape(tokens, 1):
+            start = _find(tokens, 1, '(')
+            if start is not None:
+                columns = _columns(_group(tokens, start)[0])
+                if columns is not None:
+                    table[3].append(columns)
+        elif word == 'FOREIGN' and _words(tokens, 1, 'KEY'):
+            start = _find(tokens, 2, '(')
+            ref   = _find(tokens, 2, 'REFERENCES')
+            if start is not None and ref is not None and start < ref:
+                columns = _columns(_group(tokens, start)[0])
+                self._add_reference(lname, columns, tokens, ref)
+        elif word in self.IGNORED_CONSTRAINTS and _constraint_shape(tokens):
+            pass
+        else:
+            self._add_column(lname, tokens)
+
+    def _add_column(self, lname, tokens):
+        ''' add the column defined by tokens, with its constraints '''
+        table  = self._tables[lname]
+        column = tokens[0].value
+        table[1].append(column)
+
+        depth = 0
+        for i, token in enumerate(tokens[1:], 1):
+            if token.word == '(':
+                depth += 1
+            elif token.word == ')':
+                depth -= 1
+            elif depth:
+                continue
+            elif token.word == 'PRIMARY' and _words(tokens, i + 1, 'KEY'):
+                table[2][:] = [column]
+            elif token.word == 'UNIQUE':
+                table[3].append([column])
+            elif token.word == 'REFERENCES':
+                self._add_reference(lname, [column], tokens, i)
+                break
+
+    def _add_reference(self, lname, columns, tokens, i):
+        ''' add the foreign key of columns to the REFERENCES clause at i '''
+        if columns is None or i + 1 >= len(tokens):
+            return
+        parent, i = _name(tokens, i + 1)
+        refed = None
+        if _words(tokens, i, '('):
+            refed = _columns(_group(tokens, i)[0])
+            if refed is None:
+                return
+        self._references[lname].append((self._tables[lname][0], parent, columns, refed))
+
+    @property
+    def relations(self):
+        ''' dict of relation name -> Relation '''
+        tables = [self._tables[lname] for lname in self._order]
+        references = [ref for lname in self._order for ref in self._references[lname]]
+        return catalog_relations([(name, columns, pkey or None, keys) for name, columns, pkey, keys in tables],
+                                 references)
+
+
+def build_ddl_relations(stream, backslash_escapes=True):
+    ''' Build the relations of the DDL in stream, a file-like object '''
+    scanner = StatementScanner(stream, backslash_escapes=backslash_escapes)
+    return DdlBuilder().feed(scanner.statements()).relations
+
+def read_ddl(input_file, backslash_escapes=True):
+    ''' Read the relations of the CREATE TABLE statements of SQL dump input_file '''
+    with open(input_file) as infile:
+        return build_ddl_relations(infile, backslash_escapes)
@@ -0,0 +1,461 @@
+#!/usr/bin/python
+
+import json
+import math
+
+try:
+    import numpy
+except ImportError:
+    # the layout is optional, see layout_available
+    numpy = None
+
+# the sizes the renderer draws shapes with, see render/index.html
+ENTITY_HEIGHT = 40
+ATTR_HEIGHT   = 20
+
+# space kept between the shapes of different nodes
+GAP = 40
+
+# iterations of the force-directed layout of a connected part
+ITERATIONS = 60
+
+# more nodes are laid out on a grid, nodes far apart repulse each other
+# by cells, see _grid_repulsion
+EXACT_LIMIT = 1000
+
+# mean nodes of a fine cell of the grid, and fine cells a side of a coarse cell
+GRID_NODES = 4
+GRID_RATIO = 4
+
+# rows of the pairwise forces computed at once, bounds the memory used
+BLOCK = 256
+
+# largest angle between the attributes of a node
+MAX_ATTR_ANGLE = math.pi / 4
+
+
+def layout_available():
+    ''' whether NumPy, needed to lay diagrams out, is installed '''
+    return numpy is not None
+
+def entity_width(name):
+    ''' width of the box of an entity or relationship named name '''
+    return len(name) * 10 + 20
+
+def element_width(element):
+    ''' width of the ellipse of an attribute element '''
+    return len(element) * 5 + 10
+
+
+def _expand(lo, hi, order, distinct=True):
+    ''' pairs (i, order[k]) for every i and lo[i] <= k < hi[i], but (i, i)
+        if distinct
+    '''
+    counts = hi - lo
+    rows   = numpy.repeat(numpy.arange(len(lo)), counts)
+    first  = numpy.repeat(lo - (numpy.cumsum(counts) - counts), counts)
+    cols   = order[first + numpy.arange(len(rows))]
+    if not distinct:
+        return rows, cols
+    keep   = rows != cols
+    return rows[keep], cols[keep]
+
+def _group_pairs(groups):
+    ''' the pairs of nodes of the same group, groups the group of each node '''
+    order  = numpy.argsort(groups, kind='mergesort')
+    sorted = groups[order]
+    return _expand(numpy.searchsorted(sorted, groups, 'left'),
+                   numpy.searchsorted(sorted, groups, 'right'), order)
+
+def _cells(pos, cell):
+    ''' integer coordinates of the grid cells of cell wide squares of pos,
+        1 or more
+    '''
+    cells  = numpy.floor(pos / cell).astype(numpy.int64)
+    cells -= cells.min(axis=0) - 1
+    return cells
+
+def _grid_pairs(cells):
+    ''' the pairs of nodes in the same or adjacent cells, cells as _cells
+        returns them
+    '''
+    stride = cells[:, 1].max() + 2
+    keys   = cells[:, 0] * stride + cells[:, 1]
+    order  = numpy.argsort(keys, kind='mergesort')
+    sorted = keys[order]
+    rows, cols = [], []
+    for dx in (-1, 0, 1):
+        near = keys + dx * stride
+        r, c = _expand(numpy.searchsorted(sorted, near - 1, 'left'),
+                       numpy.searchsorted(sorted, near + 1, 'right'), order)
+        rows.append(r)
+        cols.append(c)
+    return numpy.concatenate(rows), numpy.concatenate(cols)
+
+def _sum_by(rows, values, n):
+    ''' (n, 2) array of the sums of the rows of values by rows '''
+    return numpy.column_stack((numpy.bincount(rows, values[:, 0], n),
+                               numpy.bincount(rows, values[:, 1], n)))
+
+def _repulsion(pos, radius, rows, cols, other_pos=None, other_radius=None, mass=None):
+    ''' displacement of the nodes by the repulsion of the pairs rows, cols
+
+        The repulsion of nodes at distance d is k * k / d, k the sum of their
+        radius, as in the layout of Fruchterman and Reingold. The pairs are
+        of nodes, or of nodes and the centers of other_pos of mass nodes.
+    '''
+    if other_pos is None:
+        other_pos, other_radius = pos, radius
+    # by coordinate, cheaper than rows of (n, 2) arrays
+    dx    = pos[rows, 0] - other_pos[cols, 0]
+    dy    = pos[rows, 1] - other_pos[cols, 1]
+    k     = radius[rows] + other_radius[cols]
+    force = k * k / numpy.maximum(dx * dx + dy * dy, 1e-4)
+    if mass is not None:
+        force *= mass[cols]
+    return numpy.column_stack((numpy.bincount(rows, dx * force, len(pos)),
+                               numpy.bincount(rows, dy * force, len(pos))))
+
+def _centers(cells, pos, radius):
+    ''' the occupied cells of cells, as _cells returns them, and the number
+        of nodes, the center and the mean radius of the nodes of each
+    '''
+    # by rows, then columns
+    keys, index, inverse = numpy.unique(cells[:, 1] * (cells[:, 0].max() + 1) + cells[:, 0],
+                                        return_index=True, return_inverse=True)
+    mass    = numpy.bincount(inverse).astype(float)
+    center  = _sum_by(inverse, pos, len(keys)) / mass[:, None]
+    cradius = numpy.bincount(inverse, radius) / mass
+    return cells[index], mass, center, cradius
+
+def _grid_repulsion(pos, radius):
+    ''' _repulsion of all pairs of nodes, as a two level Barnes-Hut tree
+
+        The nodes repulse those of the same and the adjacent cells of a fine
+        grid of about GRID_NODES nodes a cell, the centers of the other fine
+        cells of the same and the adjacent cells of a coarse grid of
+        GRID_RATIO by GRID_RATIO fine cells, and the centers of the other
+        coarse cells.
+    '''
+    n    = len(pos)
+    # the extent of most nodes, a few far out do not make the cells larger
+    size = numpy.maximum(numpy.percentile(pos, 90, axis=0) - numpy.percentile(pos, 10, axis=0), 1.0) * 1.25
+    fine = math.sqrt(size[0] * size[1] * GRID_NODES / n)
+    cells = _cells(pos, fine)
+    # a margin of a coarse cell, the windows below stay in the grid
+    cells += GRID_RATIO
+    rows, cols = _grid_pairs(cells)
+    disp = _repulsion(pos, radius, rows, cols)
+
+    # the fine cells of the coarse cell of a node and those adjacent, its
+    # window, by rows of fine cells
+    fcells, fmass, fcenter, fradius = _centers(cells, pos, radius)
+    stride = cells[:, 0].max() + 3 * GRID_RATIO
+    keys   = fcells[:, 1] * stride + fcells[:, 0]
+    coarse = cells // GRID_RATIO
+    x_lo   = (coarse[:, 0] - 1) * GRID_RATIO
+    rows, cols = [], []
+    for dy in range(3 * GRID_RATIO):
+        y = (coarse[:, 1] - 1) * GRID_RATIO + dy
+        r, c = _expand(numpy.searchsorted(keys, y * stride + x_lo, 'left'),
+                       numpy.searchsorted(keys, y * stride + x_lo + 3 * GRID_RATIO, 'left'),
+                       numpy.arange(len(keys)), distinct=False)
+        rows.append(r)
+        cols.append(c)
+    rows, cols = numpy.concatenate(rows), numpy.concatenate(cols)
+    # the adjacent fine cells are in the pairs of nodes already
+    far  = (numpy.abs(cells[rows, 0] - fcells[cols, 0]) > 1) | (numpy.abs(cells[rows, 1] - fcells[cols, 1]) > 1)
+    disp += _repulsion(pos, radius, rows[far], cols[far], fcenter, fradius, fmass)
+
+    ccells, cmass, ccenter, cradius = _centers(coarse, pos, radius)
+    for start in range(0, n, BLOCK):
+        part  = slice(start, start + BLOCK)
+        dx    = pos[part, 0, None] - ccenter[None, :, 0]
+        dy    = pos[part, 1, None] - ccenter[None, :, 1]
+        k     = radius[part, None] + cradius[None, :]
+        force = cmass * k * k / numpy.maximum(dx * dx + dy * dy, 1e-4)
+        # the adjacent coarse cells are in the pairs above
+        force[(numpy.abs(coarse[part, 0, None] - ccells[None, :, 0]) <= 1) &
+              (numpy.abs(coarse[part, 1, None] - ccells[None, :, 1]) <= 1)] = 0.0
+        disp[part, 0] += (dx * force).sum(axis=1)
+        disp[part, 1] += (dy * force).sum(axis=1)
+    return disp
+
+def force_layout(radius, edges, groups=None, iterations=ITERATIONS):
+    ''' Positions of the centers of the nodes of connected graphs
+
+        radius is the array of the radius of the nodes, edges the (m, 2)
+        array of the pairs of nodes joined and groups the array of the graph
+        of each node, the nodes of a graph consecutive, or None if there is
+        only one. The graphs are laid out each on its own, at once. Edges
+        pull their nodes to the sum of their radius and GAP, those of nodes
+        of more than two edges less, nodes of a graph push each other apart,
+        and the steps are limited by a temperature going down to zero, as in
+        the layout of Fruchterman and Reingold. The nodes of more than
+        EXACT_LIMIT are laid out on a grid, see _grid_repulsion. The nodes
+        start on a spiral, so the layout of the same graphs is always the
+        same. Returns an (n, 2) array.
+    '''
+
+    n = len(radius)
+    radius = radius + GAP / 2.0
+    if groups is None:
+        groups = numpy.zeros(n, dtype=numpy.int64)
+    first = numpy.searchsorted(groups, groups)
+    sizes = numpy.bincount(groups)[groups]
+    mean  = (numpy.bincount(groups, radius) / numpy.maximum(numpy.bincount(groups), 1))[groups]
+
+    # the sunflower spiral of each graph, all nodes about the same distance apart
+    rank   = numpy.arange(n) - first
+    angle  = rank * math.pi * (3 - math.sqrt(5))
+    spread = numpy.sqrt(rank + 0.5) * mean * 2
+    pos    = numpy.column_stack((spread * numpy.cos(angle), spread * numpy.sin(angle)))
+
+    grid = n > EXACT_LIMIT
+    if not grid:
+        rows, cols = _group_pairs(groups)
+    source, target = edges[:, 0], edges[:, 1]
+    degree = numpy.bincount(edges.ravel(), minlength=n)
+    # hubs pull their edges less, else their neighbours jam around them
+    weight = numpy.minimum(2.0 / numpy.maximum(degree[source], degree[target]), 1.0)
+    temperature = numpy.sqrt(sizes + 0.5) * mean / 2
+    for i in range(iterations):
+        if grid:
+            disp = _grid_repulsion(pos, radius)
+        else:
+            disp = _repulsion(pos, radius, rows, cols)
+
+        # the pull of the edges, d * d / k
+        delta = pos[source] - pos[target]
+        dist  = numpy.maximum(numpy.hypot(delta[:, 0], delta[:, 1]), 1e-2)
+        pull  = delta * (weight * dist / (radius[source] + radius[target]))[:, None]
+        disp -= _sum_by(source, pull, n)
+        disp += _sum_by(target, pull, n)
+
+        length = numpy.maximum(numpy.hypot(disp[:, 0], disp[:, 1]), 1e-9)
+        step   = temperature * (1 - float(i) / iterations)
+        pos   += disp * (numpy.minimum(length, step) / length)[:, None]
+
+    return separate(pos, radius - GAP / 2.0, groups)
+
+def separate(pos, radius, groups, rounds=200):
+    ''' Move the nodes of the graphs of a layout apart until the circles
+        of a graph keep GAP from each other, or for rounds at most, see
+        force_layout. Returns the new positions.
+    '''
+    pos  = pos.copy()
+    cell = 2.0 * radius.max() + GAP
+    for i in range(rounds):
+        rows, cols = _grid_pairs(_cells(pos, cell))
+        same  = groups[rows] == groups[cols]
+        rows, cols = rows[same], cols[same]
+        delta = pos[rows] - pos[cols]
+        dist  = numpy.maximum(numpy.hypot(delta[:, 0], delta[:, 1]), 1e-2)
+        short = numpy.maximum(radius[rows] + radius[cols] + GAP - dist, 0.0)
+        if not short.any():
+            break
+        # each node of an overlapping pair goes half the way
+        pos += _sum_by(rows, delta * (short / dist / 2)[:, None], len(pos))
+    return pos
+
+
+class _Node(object):
+    ''' An entity or relationship of the diagram and its attributes '''
+
+    __slots__ = ('item', 'width', 'height', 'attributes', 'ring', 'radius', 'x', 'y')
+
+    def __init__(self, item):
+        self.item   = item
+        self.width  = entity_width(item['name'])
+        self.height = ENTITY_HEIGHT
+        self.attributes = item.get('attributes', [])
+
+        # the attributes go around the node, far enough apart to not overlap
+        widths = [sum(element_width(e) + 10 for e in attr['elements']) for attr in self.attributes]
+        widest = max(widths) if widths else 0
+        step   = min(2 * math.pi / len(widths), MAX_ATTR_ANGLE) if widths else MAX_ATTR_ANGLE
+        body   = math.hypot(self.width, self.height) / 2
+        self.ring   = max(body + 40, (widest + 10) / step) if widths else 0
+        self.radius = self.ring + widest / 2.0 + ATTR_HEIGHT * 2 if widths else body
+
+
+class DiagramLayout(object):
+    ''' Positions of the shapes of the ER diagram of a translation
+
+        Entities and relationships are nodes joined by the participation of
+        the entities in the relationships, each connected part of the graph
+        is laid out by force_layout and the parts are packed in rows, the
+        largest first. The attributes of a node are put around it, away
+        from the lines to the other nodes.
+
+        The entity and relationship dicts are given the position (x, y) of
+        the top left corner of their shape and its width and height, each
+        of their attributes the point (x, y) its arrow points to and the
+        positions [x, y, width] of the ellipses of its elements, in the
+        order of elements. The renderer draws the shapes there as they are.
+    '''
+
+    def __init__(self, entities, relationships, iterations=ITERATIONS):
+        if numpy is None:
+            raise ImportError('NumPy is needed to lay out diagrams')
+        self._entities      = list(entities)
+        self._relationships = list(relationships)
+        self._iterations    = iterations
+        self._laid_out      = False
+
+    @property
+    def entities(self):
+        ''' the entity dicts, laid out '''
+        self._lay_out()
+        return self._entities
+
+    @property
+    def relationships(self):
+        ''' the relationship dicts, laid out '''
+        self._lay_out()
+        return self._relationships
+
+    def _graph(self):
+        ''' the nodes and the adjacency list of the diagram '''
+        nodes = [_Node(ent) for ent in self._entities] + [_Node(rel) for rel in self._relationships]
+        index = dict((ent['name'], i) for i, ent in enumerate(self._entities))
+        adjacent = [[] for node in nodes]
+        for i, rel in enumerate(self._relationships, len(self._entities)):
+            for p in rel['participating_entities']:
+                j = index.get(p['name'])
+                if j is not None and j not in adjacent[i]:
+                    adjacent[i].append(j)
+                    adjacent[j].append(i)
+        return nodes, adjacent
+
+    @staticmethod
+    def _components(adjacent):
+        ''' the lists of nodes of the connected parts of the graph '''
+        seen = [False] * len(adjacent)
+        components = []
+        for start in range(len(adjacent)):
+            if seen[start]:
+                continue
+            seen[start] = True
+            component = [start]
+            for i in component:
+                for j in adjacent[i]:
+                    if not seen[j]:
+                        seen[j] = True
+                        component.append(j)
+            components.append(component)
+        return components
+
+    def _lay_out(self):
+        if self._laid_out:
+            return
+        self._laid_out = True
+
+        nodes, adjacent = self._graph()
+
+        # the small parts are laid out together, up to EXACT_LIMIT nodes at once
+        batches = []
+        for component in self._components(adjacent):
+            if batches and len(batches[-1][-1]) + len(component) <= EXACT_LIMIT:
+                batches[-1][-1].extend(component)
+                batches[-1][0].append(len(component))
+            else:
+                batches.append(([len(component)], list(component)))
+
+        parts = []
+        for sizes, batch in batches:
+            local  = dict((i, k) for k, i in enumerate(batch))
+            radius = numpy.array([nodes[i].radius for i in batch], dtype=float)
+            edges  = numpy.array([(local[i], local[j]) for i in batch for j in adjacent[i] if i < j],
+                                 dtype=numpy.int64).reshape(-1, 2)
+            groups = numpy.repeat(numpy.arange(len(sizes)), sizes)
+            pos    = force_layout(radius, edges, groups, self._iterations)
+            start  = 0
+            for size in sizes:
+                part = slice(start, start + size)
+                low  = (pos[part] - radius[part, None]).min(axis=0)
+                high = (pos[part] + radius[part, None]).max(axis=0)
+                parts.append((batch[part], pos[part] - low, high - low))
+                start += size
+
+        # shelves of parts, about as wide as high
+        area  = sum(size[0] * size[1] for _, _, size in parts)
+        width = max([math.sqrt(area) * 1.3] + [size[0] for _, _, size in parts])
+        parts.sort(key=lambda part: -part[2][1])
+        x = y = shelf = 0.0
+        for component, pos, size in parts:
+            if x > 0 and x + size[0] > width:
+                x, y, shelf = 0.0, y + shelf + GAP, 0.0
+            for k, i in enumerate(component):
+                nodes[i].x = pos[k, 0] + x + GAP
+                nodes[i].y = pos[k, 1] + y + GAP
+            x += size[0] + GAP
+            shelf = max(shelf, size[1])
+
+        for i, node in enumerate(nodes):
+            self._place(node, [nodes[j] for j in adjacent[i]])
+
+    @staticmethod
+    def _place(node, neighbours):
+        ''' set the positions of node and of its attributes '''
+
+        item = node.item
+        item.update({'x': int(round(node.x - node.width / 2.0)), 'y': int(round(node.y - node.height / 2.0)),
+                     'width': node.width, 'height': node.height})
+        if not node.attributes:
+            return
+
+        # the attributes are centered on the side away from the neighbours
+        pull_x = sum((other.x - node.x) / max(math.hypot(other.x - node.x, other.y - node.y), 1e-2) \
+                        for other in neighbours)
+        pull_y = sum((other.y - node.y) / max(math.hypot(other.x - node.x, other.y - node.y), 1e-2) \
+                        for other in neighbours)
+        away = math.atan2(-pull_y, -pull_x) if neighbours else math.pi / 2
+        count = len(node.attributes)
+        step  = min(2 * math.pi / count, MAX_ATTR_ANGLE)
+
+        for k, attr in enumerate(node.attributes):
+            angle = away + (k - (count - 1) / 2.0) * step
+            ax = node.x + node.ring * math.cos(angle)
+            ay = node.y + node.ring * math.sin(angle)
+            widths = [element_width(e) for e in attr['elements']]
+            if len(widths) == 1:
+                # the arrow points to the ellipse
+                positions = [[ax - widths[0] / 2.0, ay - ATTR_HEIGHT / 2.0, widths[0]]]
+            else:
+                # the arrow points to a junction, the ellipses in a row beyond it
+                row = sum(widths) + 10 * (len(widths) - 1)
+                ey  = ay + (ATTR_HEIGHT if math.sin(angle) >= 0 else -2 * ATTR_HEIGHT)
+                ex  = ax - row / 2.0
+                positions = []
+                for w in widths:
+                    positions.append([ex, ey, w])
+                    ex += w + 10
+            attr.update({'x': int(round(ax)), 'y': int(round(ay)),
+                         'positions': [[int(round(px)), int(round(py)), w] for px, py, w in positions]})
+
+
+class LaidOutTranslation(object):
+    ''' The output of a Translator with the positions of a DiagramLayout
+
+        The diagram is laid out when made. Has the methods of Translator used
+        by OutputWriter, so the laid out JSON and bundle are written by
+        write_translation and write_bundle.
+    '''
+
+    def __init__(self, translator, iterations=ITERATIONS):
+        layout = DiagramLayout(translator.entity_dicts(), translator.relationship_dicts(), iterations)
+        self._entities      = layout.entities
+        self._relationships = layout.relationships
+
+    def entity_dicts(self):
+        return iter(self._entities)
+
+    def relationship_dicts(self):
+        return iter(self._relationships)
+
+    def write_entity_json(self, outf):
+        json.dump(self._entities, outf)
+
+    def write_relationship_json(self, outf):
+        json.dump(self._relationships, outf)
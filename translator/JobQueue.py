@@ -0,0 +1,370 @@
+#!/usr/bin/python
+
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+
+from multiprocessing import Process, Event
+
+from SchemaValidator import build_validated_relations
+from Translator import Translator
+from TranslationStats import percentile
+
+# submitting fails with QueueFull once this many jobs wait
+MAX_QUEUED = 100
+
+# finished jobs and their results are kept this many seconds
+JOB_TTL = 24 * 3600
+
+# seconds an idle worker waits before looking at the queue again
+POLL_INTERVAL = 0.2
+
+# number of recent jobs of the wait and run time percentiles
+LATENCY_WINDOW = 1000
+
+# seconds a worker holds a job it claimed, renewed while it runs the job;
+# the job of a worker which stopped renewing is queued again after it
+LEASE_TIME = 60
+
+# times a job is claimed at most; a job whose lease ran out this many times,
+# e.g. one which kills its workers, fails rather than being queued again
+MAX_ATTEMPTS = 3
+
+SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    seq               INTEGER PRIMARY KEY AUTOINCREMENT,
+    id                TEXT NOT NULL UNIQUE,
+    priority          INTEGER NOT NULL,
+    status            INTEGER NOT NULL,
+    schema            TEXT,
+    submitted         REAL NOT NULL,
+    started           REAL,
+    finished          REAL,
+    worker            TEXT,
+    lease             REAL,
+    attempts          INTEGER NOT NULL DEFAULT 0,
+    entity_json       TEXT,
+    relationship_json TEXT,
+    diagnostics       TEXT,
+    error             TEXT);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, seq);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished);
+'''
+
+# columns added since the first version of the table, with their types
+ADDED_COLUMNS = [('worker', 'TEXT'), ('lease', 'REAL'), ('attempts', 'INTEGER NOT NULL DEFAULT 0')]
+
+
+class JobStatus:
+    ''' Represents the enums of the status of a job '''
+
+    queued  = 1
+    running = 2
+    done    = 3
+    failed  = 4
+
+    names = {1: 'queued', 2: 'running', 3: 'done', 4: 'failed'}
+
+
+class QueueFull(Exception):
+    ''' Raised by JobQueue.submit when max_queued jobs wait already '''
+    pass
+
+
+def worker_id():
+    ''' the name of this process among the workers of all hosts '''
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+def translate_job(text):
+    ''' Translate the schema text of a job
+        Returns (entity_json, relationship_json, diagnostics as JSON)
+    '''
+    relations, diagnostics = build_validated_relations(text.splitlines())
+    translator = Translator(relations.values())
+    translator.translate()
+    return (translator.entity_json or '[]', translator.relationship_json or '[]',
+            json.dumps([d.as_dict() for d in diagnostics]))
+
+
+class JobQueue(object):
+    ''' Translation jobs kept in an SQLite database file
+
+        Any number of processes may share the file: servers submit jobs
+        and poll them, workers claim the queued job of the highest priority,
+        the earliest submitted first, and store its result. Each thread
+        has its own connection.
+
+        A worker holds the job it claimed for lease_time seconds and renews
+        the lease while it runs the job. The job of a worker whose lease
+        ran out, e.g. one killed, is queued again by the next claim, or
+        fails once it was claimed max_attempts times; those of the workers
+        still running are left alone. Only the worker holding the lease
+        stores the result of a job.
+    '''
+
+    def __init__(self, path, max_queued=MAX_QUEUED, job_ttl=JOB_TTL, lease_time=LEASE_TIME,
+                       max_attempts=MAX_ATTEMPTS):
+        self._path         = path
+        self._max_queued   = max_queued
+        self._job_ttl      = job_ttl
+        self.lease_time    = lease_time
+        self._max_attempts = max_attempts
+        self._local      = threading.local()
+        conn = self._connection()
+        conn.executescript(SCHEMA_SQL)
+        columns = set(row[1] for row in conn.execute('PRAGMA table_info(jobs)'))
+        for column, ctype in ADDED_COLUMNS:
+            if column not in columns:
+                # a file of an older version
+                conn.execute('ALTER TABLE jobs ADD COLUMN {} {}'.format(column, ctype))
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # transactions are begun explicitly
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            conn.text_factory = str
+            # readers polling do not block the writers
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, func, *args):
+        ''' Call func(conn, *args) in a write transaction, return its result '''
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = func(conn, *args)
+        except:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return result
+
+    def submit(self, text, priority=0):
+        ''' Queue the translation of schema text, return the ID of the job
+            Jobs of higher priority run first. Raises QueueFull if
+            max_queued jobs wait already.
+        '''
+
+        def submit(conn):
+            now = time.time()
+            # forget the jobs which expired
+            conn.execute('DELETE FROM jobs WHERE finished < ?', (now - self._job_ttl,))
+            queued, = conn.execute('SELECT COUNT(*) FROM jobs WHERE status = ?',
+                                   (JobStatus.queued,)).fetchone()
+            if queued >= self._max_queued:
+                raise QueueFull('{} jobs queued already'.format(queued))
+            job_id = uuid.uuid4().hex
+            conn.execute('INSERT INTO jobs (id, priority, status, schema, submitted) VALUES (?, ?, ?, ?, ?)',
+                         (job_id, priority, JobStatus.queued, text, now))
+            return job_id
+
+        return self._transaction(submit)
+
+    def claim(self, worker):
+        ''' Take the next job to run for worker, see worker_id, and hold it
+            for lease_time seconds, return (job ID, schema text) or None
+        '''
+
+        def claim(conn):
+            now = time.time()
+            self._requeue_expired(conn, now)
+            row = conn.execute('SELECT seq, id, schema FROM jobs WHERE status = ? '
+                               'ORDER BY priority DESC, seq LIMIT 1', (JobStatus.queued,)).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE jobs SET status = ?, started = ?, worker = ?, lease = ?, '
+                         'attempts = attempts + 1 WHERE seq = ?',
+                         (JobStatus.running, now, worker, now + self.lease_time, row[0]))
+            return row[1], row[2]
+
+        return self._transaction(claim)
+
+    def renew(self, job_id, worker):
+        ''' Hold job_id for lease_time seconds more, return whether worker
+            still holds it
+        '''
+        return self._connection().execute(
+                    'UPDATE jobs SET lease = ? WHERE id = ? AND worker = ? AND status = ?',
+                    (time.time() + self.lease_time, job_id, worker, JobStatus.running)).rowcount > 0
+
+    def finish(self, job_id, worker, entity_json, relationship_json, diagnostics):
+        ''' Store the result of job_id, the schema is not needed any more
+            Returns whether it was stored, not if worker lost its lease,
+            e.g. to the worker the job was queued again for.
+        '''
+        now = time.time()
+        return self._connection().execute(
+                    'UPDATE jobs SET status = ?, finished = ?, entity_json = ?, relationship_json = ?, '
+                    'diagnostics = ?, schema = NULL WHERE id = ? AND status = ? AND worker = ? AND lease > ?',
+                    (JobStatus.done, now, entity_json, relationship_json, diagnostics,
+                     job_id, JobStatus.running, worker, now)).rowcount > 0
+
+    def fail(self, job_id, worker, error):
+        ''' Record that job_id failed with error, return whether it was
+            recorded, see finish
+        '''
+        now = time.time()
+        return self._connection().execute(
+                    'UPDATE jobs SET status = ?, finished = ?, error = ?, schema = NULL '
+                    'WHERE id = ? AND status = ? AND worker = ? AND lease > ?',
+                    (JobStatus.failed, now, error, job_id, JobStatus.running, worker, now)).rowcount > 0
+
+    def _requeue_expired(self, conn, now):
+        expired = 'status = ? AND (lease IS NULL OR lease < ?)'
+        conn.execute('UPDATE jobs SET status = ?, finished = ?, error = ?, schema = NULL '
+                     'WHERE ' + expired + ' AND attempts >= ?',
+                     (JobStatus.failed, now,
+                      'the lease ran out {} times, the job is not run again'.format(self._max_attempts),
+                      JobStatus.running, now, self._max_attempts))
+        return conn.execute('UPDATE jobs SET status = ?, started = NULL, worker = NULL, lease = NULL '
+                            'WHERE ' + expired, (JobStatus.queued, JobStatus.running, now)).rowcount
+
+    def requeue_expired(self):
+        ''' Queue the running jobs whose lease ran out again, e.g. those of
+            workers which were killed, return their number; those claimed
+            max_attempts times fail
+        '''
+        return self._transaction(self._requeue_expired, time.time())
+
+    def status(self, job_id):
+        ''' dict of the status of job_id, None if there is no such job
+
+            The times are in ms: wait from submitting to starting, or until
+            now if the job waits, and run from starting to finishing. A
+            queued job has the number of jobs to run before it as position,
+            attempts is the number of times the job was claimed.
+        '''
+
+        conn = self._connection()
+        row  = conn.execute('SELECT seq, priority, status, submitted, started, finished, attempts, error '
+                            'FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        seq, priority, status, submitted, started, finished, attempts, error = row
+
+        now = time.time()
+        job = {'id': job_id,
+               'status': JobStatus.names[status],
+               'priority': priority,
+               'attempts': attempts,
+               'wait_ms': ((started or finished or now) - submitted) * 1000.0,
+               'run_ms': ((finished or now) - started) * 1000.0 if started else None}
+        if status == JobStatus.queued:
+            job['position'], = conn.execute(
+                'SELECT COUNT(*) FROM jobs WHERE status = ? AND (priority > ? OR priority = ? AND seq < ?)',
+                (JobStatus.queued, priority, priority, seq)).fetchone()
+        if error is not None:
+            job['error'] = error
+        return job
+
+    def result(self, job_id):
+        ''' (entity_json, relationship_json, diagnostics) of job_id, None
+            unless it is done
+        '''
+        return self._connection().execute(
+                    'SELECT entity_json, relationship_json, diagnostics FROM jobs WHERE id = ? AND status = ?',
+                    (job_id, JobStatus.done)).fetchone()
+
+    @property
+    def stats(self):
+        ''' dict of the jobs of each status, the wait of the oldest queued
+            job and the p50/p99 wait and run times of the recent jobs in ms
+        '''
+
+        conn  = self._connection()
+        stats = dict(('jobs_' + name, 0) for name in JobStatus.names.values())
+        for status, count in conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'):
+            stats['jobs_' + JobStatus.names[status]] = count
+
+        oldest, = conn.execute('SELECT MIN(submitted) FROM jobs WHERE status = ?',
+                               (JobStatus.queued,)).fetchone()
+        stats['oldest_wait_ms'] = (time.time() - oldest) * 1000.0 if oldest is not None else None
+
+        recent = conn.execute('SELECT started - submitted, finished - started FROM jobs '
+                              'WHERE finished IS NOT NULL AND started IS NOT NULL '
+                              'ORDER BY finished DESC LIMIT ?', (LATENCY_WINDOW,)).fetchall()
+        waits = [wait * 1000.0 for wait, run in recent]
+        runs  = [run * 1000.0 for wait, run in recent]
+        stats.update({'wait_p50_ms': percentile(waits, 50), 'wait_p99_ms': percentile(waits, 99),
+                      'run_p50_ms': percentile(runs, 50), 'run_p99_ms': percentile(runs, 99)})
+        return stats
+
+
+def renew_lease(queue, job_id, worker, done):
+    ''' Renew the lease of worker on job_id until done is set '''
+    while not done.wait(queue.lease_time / 3.0):
+        try:
+            if not queue.renew(job_id, worker):
+                return
+        except sqlite3.Error:
+            # tried again at the next renewal
+            pass
+
+def run_job(queue, worker, job_id, text):
+    ''' Run job_id claimed by worker and store its result '''
+
+    # the lease is renewed while the job runs
+    done      = threading.Event()
+    heartbeat = threading.Thread(target=renew_lease, args=(queue, job_id, worker, done))
+    heartbeat.daemon = True
+    heartbeat.start()
+    try:
+        try:
+            result = translate_job(text)
+        except Exception as e:
+            stored = queue.fail(job_id, worker, '{}: {}'.format(type(e).__name__, e))
+        else:
+            stored = queue.finish(job_id, worker, *result)
+    finally:
+        done.set()
+        heartbeat.join()
+    if not stored:
+        sys.stderr.write('Job {}: the lease of {} ran out, its result is dropped\n'.format(job_id, worker))
+
+def work(path, stop, poll=POLL_INTERVAL, lease_time=LEASE_TIME):
+    ''' Run the jobs of the queue in path until stop is set '''
+    queue  = JobQueue(path, lease_time=lease_time)
+    worker = worker_id()
+    while not stop.is_set():
+        try:
+            job = queue.claim(worker)
+            if job is not None:
+                run_job(queue, worker, *job)
+        except sqlite3.Error as e:
+            # e.g. the file locked longer than the timeout, the job is
+            # queued again once its lease runs out
+            sys.stderr.write('Job queue {}: {}: {}\n'.format(path, type(e).__name__, e))
+            stop.wait(poll)
+        else:
+            if job is None:
+                stop.wait(poll)
+
+
+class JobWorkers(object):
+    ''' A pool of worker processes running the jobs of a JobQueue file
+
+        The jobs of workers which stopped without finishing them are queued
+        again once their lease runs out, those of the workers of other pools
+        sharing the file are not touched while they run.
+    '''
+
+    def __init__(self, path, workers, poll=POLL_INTERVAL, lease_time=LEASE_TIME):
+        self._stop      = Event()
+        self._processes = [Process(target=work, args=(path, self._stop, poll, lease_time))
+                           for i in range(workers)]
+        for process in self._processes:
+            process.daemon = True
+            process.start()
+
+    def close(self):
+        ''' Stop the workers once they are done with their jobs '''
+        self._stop.set()
+        for process in self._processes:
+            process.join()
@@ -0,0 +1,176 @@
+#!/usr/bin/python
+
+import os
+import gzip
+import json
+import tempfile
+
+from contextlib import contextmanager
+
+# version of the format written by encode_bundle
+BUNDLE_VERSION = 2
+
+
+@contextmanager
+def atomic_open(filename, mode=0644):
+    ''' Open a temporary file which replaces filename once the block ends
+
+        Readers of filename see the old or the new content, never a half
+        written file. If the block raises, filename is left as it was.
+        The new file keeps the permissions of the file it replaces, or
+        gets mode if there is none.
+    '''
+
+    dirname = os.path.dirname(filename) or os.curdir
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.' + os.path.basename(filename) + '.')
+    try:
+        with os.fdopen(fd, 'w') as outf:
+            yield outf
+        try:
+            mode = os.stat(filename).st_mode & 0777
+        except OSError:
+            pass
+        os.chmod(tmp_path, mode)
+        os.rename(tmp_path, filename)
+    except:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def write_translation(translator, entity_file, relationship_file):
+    ''' Write the entity and relationship JSON of translator, each followed
+        by a newline, replacing entity_file and relationship_file atomically
+    '''
+
+    with atomic_open(entity_file) as outf:
+        translator.write_entity_json(outf)
+        outf.write('\n')
+    with atomic_open(relationship_file) as outf:
+        translator.write_relationship_json(outf)
+        outf.write('\n')
+
+
+class _Table(object):
+    ''' Numbers values in the order they are first seen '''
+
+    def __init__(self):
+        self._index  = {}
+        self._values = []
+
+    def __call__(self, value):
+        try:
+            return self._index[value]
+        except KeyError:
+            self._index[value] = len(self._values)
+            self._values.append(value)
+            return self._index[value]
+
+    @property
+    def values(self):
+        return self._values
+
+def encode_bundle(translator):
+    ''' Compact JSON of the entities and relationships of translator
+
+        The entities and relationships of entity_json and relationship_json
+        are written as arrays, every cardinality and type replaced by its
+        index in the lists of "codes", and every name or attribute element
+        used more than once by its index in "strings" (the others are
+        kept as strings, which compress better than unique numbers):
+            entity:       [name, type, identifier, [attribute, ...]]
+            attribute:    [cardinality, [element, ...]]
+            relationship: [name, type, [[entity, participation], ...](, [attribute, ...])]
+        The attributes of a relationship are left out if it has none, as in
+        relationship_json. If the translation is laid out, see DiagramLayout,
+        every entity and relationship ends with its box [x, y, width, height]
+        and every attribute with [x, y, [[x, y, width], ...]], the attributes
+        of a relationship then given even if empty. render/index.html decodes
+        it.
+    '''
+
+    entities      = list(translator.entity_dicts())
+    relationships = list(translator.relationship_dicts())
+
+    # the names used more than once
+    counts = {}
+    def count(name):
+        counts[name] = counts.get(name, 0) + 1
+    def count_attribute(attr):
+        for e in attr['elements']:
+            count(e)
+    for ent in entities:
+        count(ent['name'])
+        count_attribute(ent['identifier'])
+        for attr in ent['attributes']:
+            count_attribute(attr)
+    for rel in relationships:
+        count(rel['name'])
+        for p in rel['participating_entities']:
+            count(p['name'])
+        for attr in rel.get('attributes', ()):
+            count_attribute(attr)
+
+    table   = _Table()
+    codes   = dict((kind, _Table()) for kind in
+                    ('cardinality', 'entity_type', 'relationship_type', 'participation'))
+
+    def string(name):
+        return table(name) if counts[name] > 1 else name
+
+    def attribute(attr):
+        item = [codes['cardinality'](attr['cardinality']), [string(e) for e in attr['elements']]]
+        if 'positions' in attr:
+            item.append([attr['x'], attr['y'], attr['positions']])
+        return item
+
+    def box(item):
+        return [item['x'], item['y'], item['width'], item['height']]
+
+    laid_out = any('x' in item for item in entities[:1] + relationships[:1])
+
+    for i, ent in enumerate(entities):
+        entities[i] = [string(ent['name']), codes['entity_type'](ent['type']),
+                       attribute(ent['identifier']),
+                       [attribute(attr) for attr in ent['attributes']]]
+        if laid_out:
+            entities[i].append(box(ent))
+
+    for i, rel in enumerate(relationships):
+        item = [string(rel['name']), codes['relationship_type'](rel['type']),
+                [[string(p['name']), codes['participation'](p['cardinality'])] \
+                    for p in rel['participating_entities']]]
+        if 'attributes' in rel or laid_out:
+            item.append([attribute(attr) for attr in rel.get('attributes', ())])
+        if laid_out:
+            item.append(box(rel))
+        relationships[i] = item
+
+    bundle = {'version': BUNDLE_VERSION,
+              'strings': table.values,
+              'codes': dict((kind, codes[kind].values) for kind in codes),
+              'entities': entities,
+              'relationships': relationships}
+    return json.dumps(bundle, separators=(',', ':'))
+
+def write_bundle(translator, bundle_file):
+    ''' Write encode_bundle of translator to bundle_file, and gzipped to
+        bundle_file.gz for servers to send as it is, both atomically
+    '''
+
+    content = encode_bundle(translator)
+    with atomic_open(bundle_file) as outf:
+        outf.write(content)
+    with atomic_open(bundle_file + '.gz') as outf:
+        # no timestamp, the same bundle gives the same bytes
+        with gzip.GzipFile(os.path.basename(bundle_file), 'wb', 9, outf, mtime=0) as gzf:
+            gzf.write(content)
+
+def remove_bundle(bundle_file):
+    ''' Remove bundle_file and its .gz, which would be stale '''
+    for filename in (bundle_file, bundle_file + '.gz'):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+
+import random
+
+
+class SchemaGenerator(object):
+    ''' Generate random schemas in the format of schema files
+
+        The schema is made of entity groups and relationship relations.
+        An entity group is an entity relation E with
+            - width non-prime attributes
+            - a component relation, with probability components
+              (m:m, m:1 and 1:m in turn)
+            - with probability chains, a chain of idd_depth ID-dependent
+              relations and an ISA hierarchy of isa_depth relations
+        A relationship relation references 2 entities by its primary key,
+        plus another one by a non-prime attribute with probability
+        ind_density, and has width/2 non-prime attributes. A share
+        many2many of them are all-key relations with a multivalued
+        attribute instead.
+        About half of the relations are in entity groups. All names are
+        unique, so every identifier is unique too, and made of letters and
+        digits only as TBL_PAT requires of attributes.
+    '''
+
+    def __init__(self, relations=100, width=2, ind_density=0.3, idd_depth=1, isa_depth=1,
+                 many2many=0.2, components=0.5, chains=0.25, seed=0):
+        self.relations   = relations
+        self.width       = width
+        self.ind_density = ind_density
+        self.idd_depth   = idd_depth
+        self.isa_depth   = isa_depth
+        self.many2many   = many2many
+        self.components  = components
+        self.chains      = chains
+        self.seed        = seed
+
+    @property
+    def params(self):
+        ''' dict of the knobs of the generator '''
+        return {'relations': self.relations, 'width': self.width,
+                'ind_density': self.ind_density, 'idd_depth': self.idd_depth,
+                'isa_depth': self.isa_depth, 'many2many': self.many2many,
+                'components': self.components, 'chains': self.chains, 'seed': self.seed}
+
+    def generate(self):
+        ''' Return (relations, INDs, keys), the lines of the three sections '''
+
+        rnd = random.Random(self.seed)
+        tables, inds, keys = [], [], []
+
+        def relation(name, attributes, rkeys):
+            tables.append('{}({})'.format(name, ', '.join(attributes)))
+            keys.append('{}: {}'.format(name, '; '.join('(' + ', '.join(k) + ')' for k in rkeys)))
+
+        def IND(lrel, latt, rrel, ratt):
+            inds.append('{}({}) <= {}({})'.format(lrel, ', '.join(latt), rrel, ', '.join(ratt)))
+
+        def non_primes(prefix, count):
+            return ['{}A{}'.format(prefix, i) for i in range(count)]
+
+        entities = [] # (name, identifier)
+        budget = self.relations
+        i = 0
+        while len(tables) < budget // 2 or len(entities) < 2:
+            name, idr = 'E{}'.format(i), 'E{}Id'.format(i)
+            relation(name, [idr] + non_primes(name, self.width), [[idr]])
+            entities.append((name, idr))
+            # something has to reference every entity
+            referenced = False
+
+            if rnd.random() < self.chains:
+                # ID-dependency chain, each weak relation depends on the last
+                dep, dep_key = name, [idr]
+                for d in range(self.idd_depth):
+                    wname = 'W{}x{}'.format(i, d)
+                    wkey  = dep_key + ['{}N'.format(wname)]
+                    relation(wname, wkey + non_primes(wname, max(1, self.width // 2)), [wkey])
+                    IND(wname, dep_key, dep, dep_key)
+                    dep, dep_key = wname, wkey
+                    referenced = True
+
+                # ISA hierarchy, each subtype of the last
+                sup = name
+                for d in range(self.isa_depth):
+                    sname = 'S{}x{}'.format(i, d)
+                    relation(sname, [idr] + non_primes(sname, max(1, self.width // 2)), [[idr]])
+                    IND(sname, [idr], sup, [idr])
+                    sup = sname
+                    referenced = True
+                if sup != name:
+                    cname = 'SC{}'.format(i)
+                    relation(cname, [idr, cname + 'V'], [[idr, cname + 'V']])
+                    IND(cname, [idr], sup, [idr])
+
+            if rnd.random() < self.components or not referenced:
+                cname = 'C{}'.format(i)
+                kind  = i % 3
+                if kind == 0:
+                    # m:m, pkey of E part of the key
+                    relation(cname, [idr, cname + 'V'], [[idr, cname + 'V']])
+                elif kind == 1:
+                    # m:1, pkey of E is the key
+                    relation(cname, [idr, cname + 'V'], [[idr]])
+                else:
+                    # 1:m, pkey of E is a non-prime
+                    relation(cname, [cname + 'K', idr], [[cname + 'K']])
+                IND(cname, [idr], name, [idr])
+            i += 1
+
+        j = 0
+        while len(tables) < budget:
+            name = 'R{}'.format(j)
+            (ename1, idr1), (ename2, idr2) = rnd.sample(entities, 2)
+            if rnd.random() < self.many2many:
+                # all-key, m:m with a multivalued attribute
+                pkey = [idr1, idr2, name + 'M']
+                relation(name, pkey, [pkey])
+            else:
+                pkey  = [idr1, idr2]
+                attrs = pkey + non_primes(name, self.width // 2)
+                if rnd.random() < self.ind_density and len(entities) > 2:
+                    ename3, idr3 = rnd.choice([e for e in entities if e[1] not in pkey][:8] or entities)
+                    if idr3 not in pkey:
+                        attrs.append(idr3)
+                        IND(name, [idr3], ename3, [idr3])
+                relation(name, attrs, [pkey])
+            IND(name, [idr1], ename1, [idr1])
+            IND(name, [idr2], ename2, [idr2])
+            j += 1
+
+        return tables, inds, keys
+
+    def lines(self):
+        ''' the lines of the schema file '''
+        tables, inds, keys = self.generate()
+        return ['SCHEMA'] + tables + ['', 'INCLUSION DEPENDENCY'] + inds + \
+               ['', 'KEY (The first one is the primary key)'] + keys
+
+    def write(self, filename):
+        ''' Write the schema file filename '''
+        with open(filename, 'w') as outf:
+            for line in self.lines():
+                outf.write(line + '\n')
@@ -0,0 +1,287 @@
+#!/usr/bin/python
+
+import re
+
+from ClassDfn import Relation, ForeignKey
+
+# grammar of each section of the schema file
+TBL_PAT = r'(?P<name>\w+)\((?P<attributes>[a-zA-Z0-9, ]+)\)$'
+IND_PAT = r'(?P<lrel>\w+)\((?P<latt>.*)\) <= (?P<rrel>\w+)\((?P<ratt>.*)\)$'
+KEY_PAT = r'(?P<name>\w+):[ ]*(?P<keys>.*)$'
+
+INDIVIDUAL_KEY_PAT = r'\((?P<attr>.+)\)'
+
+# section headers, e.g. 'KEY (The first one is the primary key)'
+HEADER_PAT = r'(?P<section>SCHEMA|INCLUSION DEPENDENCY|KEY)(\s.*)?$'
+
+# precompiled patterns
+TBL_RE    = re.compile(TBL_PAT)
+IND_RE    = re.compile(IND_PAT)
+KEY_RE    = re.compile(KEY_PAT)
+HEADER_RE = re.compile(HEADER_PAT)
+INDIVIDUAL_KEY_RE = re.compile(INDIVIDUAL_KEY_PAT)
+
+
+def split_attributes(clause, names=None, share=True):
+    ''' frozenset of the comma separated attributes in clause
+        shared through names, a NameTable, if given, see NameTable.split
+    '''
+    if names is not None:
+        return names.split([c.strip() for c in clause.split(',')], share)
+    return frozenset([c.strip() for c in clause.split(',')])
+
+
+def share_name(name, names=None):
+    ''' name shared through names, a NameTable, if given '''
+    if names is not None:
+        return names.name(name)
+    return name
+
+
+class Section:
+    ''' Represents the enums of sections in a schema file '''
+
+    unknown = 0     # before any header, every grammar is tried
+    schema  = 1
+    IND     = 2
+    key     = 3
+
+    headers = {'SCHEMA': 1, 'INCLUSION DEPENDENCY': 2, 'KEY': 3}
+
+
+class SchemaEvent:
+    ''' Represents the enums of events yielded by parse_schema '''
+
+    relation = 1    # (relation, lineno, line, Relation)
+    IND      = 2    # (IND, lineno, line, lrel, ForeignKey)
+    key      = 3    # (key, lineno, line, name, key)
+    unknown  = 4    # (unknown, lineno, line) of lines not part of the schema
+
+
+def _match_relation(lineno, line, names):
+    matches = TBL_RE.match(line)
+    if matches is None:
+        return None
+    name = share_name(matches.group('name'), names)
+    return [(SchemaEvent.relation, lineno, line,
+             Relation(name, split_attributes(matches.group('attributes'), names, False)))]
+
+def _match_IND(lineno, line, names):
+    matches = IND_RE.match(line)
+    if matches is None:
+        return None
+    fkey = ForeignKey(split_attributes(matches.group('latt'), names),
+                      split_attributes(matches.group('ratt'), names),
+                      share_name(matches.group('rrel'), names))
+    return [(SchemaEvent.IND, lineno, line, share_name(matches.group('lrel'), names), fkey)]
+
+def _match_keys(lineno, line, names):
+    matches = KEY_RE.match(line)
+    if matches is None:
+        return None
+    name   = share_name(matches.group('name'), names)
+    events = []
+    for ind_k in matches.group('keys').split(';'):
+        matches = INDIVIDUAL_KEY_RE.match(ind_k.strip())
+        if matches is not None:
+            key = split_attributes(matches.group('attr'), names)
+            events.append((SchemaEvent.key, lineno, line, name, key))
+    return events
+
+# the grammar of each section, the expected one is tried first
+_GRAMMARS = {
+    Section.unknown: (_match_relation, _match_IND, _match_keys),
+    Section.schema:  (_match_relation, _match_IND, _match_keys),
+    Section.IND:     (_match_IND, _match_relation, _match_keys),
+    Section.key:     (_match_keys, _match_relation, _match_IND),
+}
+
+
+def parse_schema(stream, names=None):
+    ''' Parse a schema file line by line
+
+        stream is any iterable of lines, e.g. an opened file.
+        Yields the events of SchemaEvent in input order. Within a section only
+        the grammar of that section is matched, the others are tried only for
+        lines which do not fit the section (files without headers still parse).
+        The attribute sets are shared through names, a NameTable, if given.
+    '''
+
+    section = Section.unknown
+    for lineno, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        grammar = _GRAMMARS[section]
+        events  = grammar[0](lineno, line, names)
+        if events is None:
+            header = HEADER_RE.match(line)
+            if header is not None:
+                section = Section.headers[header.group('section')]
+                continue
+            for match in grammar[1:]:
+                events = match(lineno, line, names)
+                if events is not None:
+                    break
+            else:
+                # not part of the schema
+                events = [(SchemaEvent.unknown, lineno, line)]
+
+        for event in events:
+            yield event
+
+
+class SchemaBuilder(object):
+    ''' Build the dict of Relations from the events of parse_schema
+
+        Keys and INDs which cannot be added are skipped with a message,
+        or silently if quiet, e.g. when a SchemaValidator reports them.
+        A relation given no key is keyed by all its attributes, as in
+        catalog_relations. Given names, a NameTable, the relations are
+        compacted. Their keys and INDs are collected and added one relation
+        at a time once all events are fed, so the sets of the relations
+        being built are never all alive at once.
+    '''
+
+    def __init__(self, names=None, quiet=False):
+        self._relations = {}
+        self._names     = names
+        self._quiet     = quiet
+        # name -> [key, ForeignKey or name of a referencing relation, ...]
+        # collected in one list, most relations have a key and an IND
+        self._collected = {}
+
+    def add_relation(self, R):
+        ''' add (or redefine) relation R '''
+        if self._names is not None:
+            R.compact(self._names)
+        self._relations[R.name] = R
+        self._collected.pop(R.name, None)
+
+    def add_IND(self, lrel, fkey, line):
+        ''' add the foreign key of IND lrel[fkey.key] <= fkey.refed_relation[fkey.refed_key] '''
+        rrel = fkey.refed_relation
+        if lrel in self._relations and rrel in self._relations:
+            if not fkey.key.issubset(self._relations[lrel].attributes):
+                self._skip('Skip IND {} since attribute definition missing.'.format(line))
+                return
+            if self._names is not None:
+                self._collected.setdefault(lrel, []).append(fkey)
+                self._collected.setdefault(rrel, []).append(lrel)
+                return
+            self._relations[lrel].add_fkey(fkey)
+            self._relations[rrel].add_refed_by(lrel)
+        else:
+            self._skip('Skip IND {} since relation definition missing.'.format(line))
+
+    def add_key(self, name, key, line):
+        ''' add key to the relation of name '''
+        try:
+            if self._names is not None and name in self._relations:
+                self._collected.setdefault(name, []).append(key)
+                return
+            self._relations[name].add_key(key)
+        except KeyError:
+            self._skip('Skip key {} since relation definition missing.'.format(line))
+
+    def _skip(self, message):
+        if not self._quiet:
+            print(message)
+
+    def feed(self, events):
+        ''' consume events yielded by parse_schema '''
+        for event in events:
+            etype = event[0]
+            if   etype == SchemaEvent.relation:
+                self.add_relation(event[3])
+            elif etype == SchemaEvent.IND:
+                self.add_IND(event[3], event[4], event[2])
+            elif etype == SchemaEvent.key:
+                self.add_key(event[3], event[4], event[2])
+        return self
+
+    @property
+    def relations(self):
+        ''' dict of relation name -> Relation '''
+        for name, R in self._relations.items():
+            for item in self._collected.pop(name, ()):
+                if isinstance(item, ForeignKey):
+                    R.add_fkey(item)
+                elif isinstance(item, frozenset):
+                    R.add_key(item)
+                else:
+                    R.add_refed_by(item)
+            if R.keys is None:
+                # a set of tuples, all its attributes are its key
+                R.add_key(R.attributes)
+            if self._names is not None:
+                R.compact(self._names)
+        return self._relations
+
+
+def build_relations(lines, names=None):
+    ''' Build the relations of a schema given as an iterable of lines
+        The relations are compacted with names, a NameTable, if given.
+    '''
+    return SchemaBuilder(names).feed(parse_schema(lines, names)).relations
+
+def read_schema(input_file, names=None):
+    ''' Read the relations of schema file input_file, see build_relations '''
+    with open(input_file) as infile:
+        return build_relations(infile, names)
+
+def catalog_relations(tables, references):
+    ''' Build the relations of the catalog of a database
+
+        tables is a list of (name, [column, ...], primary key, [key, ...])
+        in schema order, the primary key a list of columns or None and
+        the keys the other candidate keys. references is a list of
+        (table, parent, [column, ...], [parent column, ...]) of the foreign
+        keys, the parent columns None for the primary key of the parent.
+        Names are matched without case as SQL does, foreign keys to missing
+        tables or columns are skipped with a message. A table without keys
+        is keyed by all its columns. Returns a dict as read_schema.
+    '''
+
+    table_names  = dict((name.lower(), name) for name, _, _, _ in tables)
+    column_names = dict((name, dict((c.lower(), c) for c in columns)) for name, columns, _, _ in tables)
+    pkeys        = dict((name, pkey) for name, _, pkey, _ in tables if pkey)
+
+    fkeys    = dict((name, []) for name, _, _, _ in tables)
+    refed_by = []
+    for table, parent, frm, to in references:
+        rtable = table_names.get(parent.lower())
+        if to is None:
+            # references the primary key of the parent
+            to = pkeys.get(rtable)
+        try:
+            key       = frozenset(column_names[table][c.lower()] for c in frm)
+            refed_key = frozenset(column_names[rtable][c.lower()] for c in to)
+        except (KeyError, TypeError):
+            print('Skip IND {}({}) <= {}({}) since relation definition missing.'.format(
+                    table, ', '.join(frm), parent, ', '.join(to or ())))
+            continue
+        fkeys[table].append(ForeignKey(key, refed_key, rtable))
+        refed_by.append((rtable, table))
+
+    # insert in the order of the schema, the translation follows it
+    relations = {}
+    for name, columns, pkey, keys in tables:
+        name_keys = []
+        for key in ([pkey] if pkey else []) + keys:
+            try:
+                key = frozenset(column_names[name][c.lower()] for c in key)
+            except KeyError:
+                print('Skip key {}({}) since column definition missing.'.format(name, ', '.join(key)))
+                continue
+            if key not in name_keys:
+                name_keys.append(key)
+        if not name_keys:
+            # a table without a primary key or unique index is a set of
+            # rows all the same, all its columns are its key
+            name_keys.append(frozenset(columns))
+        relations[name] = Relation.from_keys(name, frozenset(columns), name_keys, fkeys[name])
+    for rtable, table in refed_by:
+        relations[rtable].add_refed_by(table)
+    return relations
@@ -0,0 +1,206 @@
+#!/usr/bin/python
+
+from ClassDfn import repr_indi_key
+from SchemaParser import SchemaEvent, SchemaBuilder, parse_schema
+
+
+class Severity:
+    ''' Represents the enums of the severity of a Diagnostic '''
+
+    error   = 1     # the line is skipped, or translated from wrong attributes
+    warning = 2     # the line is translated, maybe not as meant
+
+    names = {1: 'error', 2: 'warning'}
+
+
+class Diagnostic(object):
+    ''' A problem found at line lineno of a schema '''
+
+    __slots__ = ('lineno', 'severity', 'message', 'line')
+
+    def __init__(self, lineno, severity, message, line):
+        self.lineno   = lineno
+        self.severity = severity
+        self.message  = message
+        self.line     = line
+
+    def as_dict(self):
+        ''' dict of the diagnostic, e.g. to dump as JSON '''
+        return {'lineno': self.lineno, 'severity': Severity.names[self.severity],
+                'message': self.message, 'line': self.line}
+
+    def __str__(self):
+        return 'line {}: {}: {}'.format(self.lineno, Severity.names[self.severity], self.message)
+
+
+def _names(attributes):
+    return ', '.join(sorted(attributes))
+
+
+class SchemaValidator(object):
+    ''' Check the events of parse_schema in one pass
+
+        The relations are indexed by name with their attributes as they are
+        defined, and every key and IND is checked against the index when it
+        is read, which is when SchemaBuilder adds it. Only what may be given
+        further down the file waits until all events are fed: the keys the
+        INDs reference, and where a missing relation is defined.
+    '''
+
+    def __init__(self):
+        self._relations   = {}  # name -> (lineno, attributes, line)
+        self._keys        = {}  # name -> set of keys
+        self._fkeys       = {}  # (name, key) -> lineno of the IND
+        self._missing     = []  # (lineno, line, what, name) of the relations not defined yet
+        self._refed_keys  = []  # (lineno, line, rrel, refed key) of the INDs added
+        self._diagnostics = []
+        self._done        = False
+
+    def _report(self, lineno, severity, message, line):
+        self._diagnostics.append(Diagnostic(lineno, severity, message, line))
+
+    def _relation_defined(self, lineno, line, what, name):
+        ''' whether relation name is defined, noted as missing if not '''
+        if name in self._relations:
+            return True
+        self._missing.append((lineno, line, what, name))
+        return False
+
+    def _check_relation(self, lineno, line, R):
+        if R.name in self._relations:
+            self._report(lineno, Severity.warning,
+                         'relation {} is defined again, the definition of line {} '
+                         'and its keys and INDs are dropped'.format(R.name, self._relations[R.name][0]),
+                         line)
+        # the attributes are \w+, so only separated by commas
+        if line.count(',') + 1 > len(R.attributes):
+            self._report(lineno, Severity.warning,
+                         'relation {} lists an attribute twice'.format(R.name), line)
+        self._relations[R.name] = (lineno, R.attributes, line)
+        self._keys[R.name] = set()
+
+    def _check_key(self, lineno, line, name, key):
+        if not self._relation_defined(lineno, line, 'key', name):
+            return
+        if not key <= self._relations[name][1]:
+            self._report(lineno, Severity.error,
+                         'key {} of {} has attributes not in {}: {}'.format(
+                            repr_indi_key(sorted(key)), name, name,
+                            _names(key - self._relations[name][1])),
+                         line)
+        self._keys[name].add(key)
+
+    def _check_IND(self, lineno, line, lrel, fkey):
+        relations = self._relations
+        rrel = fkey.refed_relation
+        if lrel not in relations or rrel not in relations:
+            # both are noted if missing
+            for name in ((lrel,) if lrel == rrel else (lrel, rrel)):
+                self._relation_defined(lineno, line, 'IND', name)
+            return
+
+        if not fkey.key <= relations[lrel][1]:
+            self._report(lineno, Severity.error,
+                         'IND skipped, attributes not in {}: {}'.format(
+                            lrel, _names(fkey.key - relations[lrel][1])),
+                         line)
+            return
+        if not fkey.refed_key <= relations[rrel][1]:
+            self._report(lineno, Severity.error,
+                         'IND references attributes not in {}: {}'.format(
+                            rrel, _names(fkey.refed_key - relations[rrel][1])),
+                         line)
+        elif len(fkey.key) != len(fkey.refed_key):
+            self._report(lineno, Severity.error,
+                         'IND has {} distinct attributes in {} but {} in {}'.format(
+                            len(fkey.key), lrel, len(fkey.refed_key), rrel),
+                         line)
+        else:
+            self._refed_keys.append((lineno, line, rrel, fkey.refed_key))
+
+        if (lrel, fkey.key) in self._fkeys:
+            self._report(lineno, Severity.warning,
+                         'IND replaces that of line {} on the same attributes of {}'.format(
+                            self._fkeys[lrel, fkey.key], lrel),
+                         line)
+        self._fkeys[lrel, fkey.key] = lineno
+
+    def check(self, events):
+        ''' Check the events of parse_schema and yield them on, so that a
+            SchemaBuilder can be fed from the same parse
+        '''
+        for event in events:
+            etype = event[0]
+            if   etype == SchemaEvent.relation:
+                self._check_relation(event[1], event[2], event[3])
+            elif etype == SchemaEvent.IND:
+                self._check_IND(event[1], event[2], event[3], event[4])
+            elif etype == SchemaEvent.key:
+                self._check_key(event[1], event[2], event[3], event[4])
+            elif etype == SchemaEvent.unknown:
+                self._report(event[1], Severity.warning,
+                             'skipped, not a relation, IND or key', event[2])
+            yield event
+
+    def feed(self, events):
+        ''' consume events yielded by parse_schema '''
+        for event in self.check(events):
+            pass
+        return self
+
+    def _finish(self):
+        ''' the checks waiting for all events '''
+        for lineno, line, what, name in self._missing:
+            if name in self._relations and self._relations[name][0] > lineno:
+                message = '{} skipped, relation {} is defined after it, at line {}'.format(
+                                what, name, self._relations[name][0])
+            else:
+                message = '{} skipped, relation {} is not defined'.format(what, name)
+            self._report(lineno, Severity.error, message, line)
+
+        for lineno, line, rrel, refed_key in self._refed_keys:
+            if refed_key not in self._keys[rrel]:
+                self._report(lineno, Severity.warning,
+                             'IND references {} which is not a key of {}'.format(
+                                repr_indi_key(sorted(refed_key)), rrel),
+                             line)
+
+        for name, (lineno, attributes, line) in self._relations.items():
+            if not self._keys[name]:
+                self._report(lineno, Severity.warning,
+                             'relation {} has no key, it is keyed by all its attributes'.format(name),
+                             line)
+
+        self._missing = self._refed_keys = None
+        # in the order of the lines, those of a line in the order found
+        self._diagnostics.sort(key=lambda d: d.lineno)
+
+    @property
+    def diagnostics(self):
+        ''' list of the Diagnostics of the schema, by line number '''
+        if not self._done:
+            self._finish()
+            self._done = True
+        return self._diagnostics
+
+
+def validate_schema(lines):
+    ''' Diagnostics of a schema given as an iterable of lines '''
+    return SchemaValidator().feed(parse_schema(lines)).diagnostics
+
+def build_validated_relations(lines, names=None):
+    ''' Build and check the relations of a schema given as an iterable of
+        lines in the same pass
+
+        Returns (relations, diagnostics), the relations as build_relations
+        returns them. The keys and INDs skipped are in the diagnostics
+        rather than printed.
+    '''
+    validator = SchemaValidator()
+    builder   = SchemaBuilder(names, quiet=True).feed(validator.check(parse_schema(lines, names)))
+    return builder.relations, validator.diagnostics
+
+def read_validated_schema(input_file, names=None):
+    ''' Read and check schema file input_file, see build_validated_relations '''
+    with open(input_file) as infile:
+        return build_validated_relations(infile, names)
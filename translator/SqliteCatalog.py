@@ -0,0 +1,113 @@
+#!/usr/bin/python
+
+import sqlite3
+
+from itertools import groupby
+from operator import itemgetter
+
+from SchemaParser import catalog_relations
+
+# the tables of the schema, not those SQLite keeps for itself, in the
+# order they were created like the lines of a schema file
+TABLES_SQL = """SELECT rowid AS seq, name FROM sqlite_master
+                WHERE type = 'table' AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\'"""
+
+# the catalog of all tables at once through the table-valued pragma
+# functions (SQLite 3.16 and later). The pragmas list indexes and
+# foreign keys last declared first, they are put back in declaration order.
+COLUMNS_SQL = '''SELECT t.name, c.name, c.pk FROM ({}) t, pragma_table_info(t.name) c
+                 ORDER BY t.seq, c.cid'''.format(TABLES_SQL)
+
+INDEXES_SQL = '''SELECT t.name, l.name, i.name FROM ({}) t, pragma_index_list(t.name) l,
+                        pragma_index_info(l.name) i
+                 WHERE l."unique" AND NOT l.partial AND l.origin != 'pk'
+                 ORDER BY t.seq, l.seq DESC, i.seqno'''.format(TABLES_SQL)
+
+FKEYS_SQL = '''SELECT t.name, f.id, f."table", f."from", f."to" FROM ({}) t,
+                      pragma_foreign_key_list(t.name) f
+               ORDER BY t.seq, f.id DESC, f.seq'''.format(TABLES_SQL)
+
+
+def _batched_catalog(conn):
+    ''' (columns, indexes, fkeys) rows of all tables in one query each '''
+    return (conn.execute(COLUMNS_SQL).fetchall(),
+            conn.execute(INDEXES_SQL).fetchall(),
+            conn.execute(FKEYS_SQL).fetchall())
+
+def _pragma_catalog(conn):
+    ''' The rows of _batched_catalog with a PRAGMA per table, for SQLite
+        older than 3.16
+    '''
+    columns, indexes, fkeys = [], [], []
+    for seq, table in conn.execute(TABLES_SQL + ' ORDER BY seq').fetchall():
+        quoted = '"' + table.replace('"', '""') + '"'
+        for cid, name, ctype, notnull, default, pk in conn.execute('PRAGMA table_info({})'.format(quoted)):
+            columns.append((table, name, pk))
+
+        index_list = conn.execute('PRAGMA index_list({})'.format(quoted)).fetchall()
+        for index in sorted(index_list, key=lambda index: -index[0]):
+            seq, iname, unique = index[:3]
+            # origin and partial are missing before SQLite 3.8.9
+            origin, partial = index[3:5] if len(index) >= 5 else ('c', 0)
+            if not unique or partial or origin == 'pk':
+                continue
+            iquoted = '"' + iname.replace('"', '""') + '"'
+            for seqno, cid, name in conn.execute('PRAGMA index_info({})'.format(iquoted)):
+                indexes.append((table, iname, name))
+
+        fkey_list = conn.execute('PRAGMA foreign_key_list({})'.format(quoted)).fetchall()
+        for fid, seq, rtable, frm, to in sorted((row[:5] for row in fkey_list),
+                                                key=lambda row: (-row[0], row[1])):
+            fkeys.append((table, fid, rtable, frm, to))
+    return columns, indexes, fkeys
+
+
+def load_relations(conn):
+    ''' Build the Relations of the tables in the SQLite connection conn
+
+        Every table becomes a Relation of its columns. The primary key
+        comes first among the keys, followed by the unique indexes in the
+        order they were created; expression and partial indexes are not
+        keys, and a table with neither is keyed by all its columns.
+        Foreign keys become INDs to the columns they reference, the
+        primary key of the parent when none are named. See
+        catalog_relations.
+    '''
+
+    conn.text_factory = str
+    try:
+        columns, indexes, fkeys = _batched_catalog(conn)
+    except sqlite3.OperationalError:
+        columns, indexes, fkeys = _pragma_catalog(conn)
+
+    # the rows of a table, index or foreign key are consecutive
+    tables = {}
+    order  = []
+    for table, rows in groupby(columns, itemgetter(0)):
+        rows = list(rows)
+        pkey = [column for _, column in sorted((pk, column) for _, column, pk in rows if pk)]
+        tables[table] = (table, [column for _, column, _ in rows], pkey or None, [])
+        order.append(table)
+
+    for (table, index), rows in groupby(indexes, itemgetter(0, 1)):
+        icolumns = [column for _, _, column in rows]
+        if None in icolumns:
+            # an index on an expression
+            continue
+        tables[table][3].append(icolumns)
+
+    references = []
+    for (table, fid), rows in groupby(fkeys, itemgetter(0, 1)):
+        rows = list(rows)
+        to = [row[4] for row in rows]
+        references.append((table, rows[0][2], [row[3] for row in rows], None if None in to else to))
+
+    return catalog_relations([tables[table] for table in order], references)
+
+def read_sqlite(db_file):
+    ''' Read the relations of the tables of SQLite database db_file '''
+    conn = sqlite3.connect(db_file)
+    try:
+        return load_relations(conn)
+    finally:
+        conn.close()
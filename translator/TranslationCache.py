@@ -0,0 +1,170 @@
+#!/usr/bin/python
+
+import os
+import json
+import errno
+import hashlib
+
+from collections import OrderedDict
+
+from ClassDfn import relation_signature
+from OutputWriter import atomic_open
+
+# version of the cached translations, hashed into every cache key; bump it
+# whenever the translation or its JSON changes, so that the entries written
+# before are not served
+CACHE_VERSION = 4
+
+
+def schema_digest(relations):
+    ''' Canonical hash of a parsed schema
+
+        relations is an iterable of Relation. The digest covers the
+        relation_signature of every relation, i.e. the name, attributes,
+        keys, primary key and INDs, and does not depend on the order of the
+        input lines.
+    '''
+
+    schema = [relation_signature(R) for R in relations]
+    schema.sort()
+
+    return hashlib.sha1(json.dumps(schema)).hexdigest()
+
+
+class TranslationCache(object):
+    ''' Cache of translated entity/relationship JSON keyed by schema_digest
+
+        A result is the list of the JSON fragments of its entities and that
+        of its relationships, as the Translator encodes them one at a time,
+        so the whole JSON is never joined to be cached. Results are kept in
+        memory with LRU eviction once they take more than max_bytes, and
+        also written under cache_dir if given, one fragment per line, which
+        is looked up on a memory miss.
+    '''
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, cache_dir=None):
+        self._max_bytes = max_bytes
+        self._cache_dir = cache_dir
+        self._entries   = OrderedDict() # digest -> (entity fragments, relationship fragments)
+        self._size      = 0
+
+        self.hits = self.misses = self.evictions = 0
+        self.disk_hits = self.disk_writes = 0
+
+    @staticmethod
+    def digest(relations, options=()):
+        ''' The cache key of relations, the schema_digest of relations,
+            CACHE_VERSION and options, the options of the Translator which
+            change its output
+        '''
+        return hashlib.sha1('{}:{}:{}'.format(CACHE_VERSION, json.dumps(options),
+                                              schema_digest(relations))).hexdigest()
+
+    @staticmethod
+    def _sizeof(entry):
+        return sum(len(fragment) for fragments in entry for fragment in fragments)
+
+    def _path(self, digest):
+        return os.path.join(self._cache_dir, digest[:2], digest + '.json')
+
+    def _remember(self, digest, entry):
+        ''' Put entry in memory as the most recently used one '''
+        if digest in self._entries:
+            self._size -= self._sizeof(self._entries.pop(digest))
+
+        size = self._sizeof(entry)
+        if size > self._max_bytes:
+            # larger than the whole cache, keep it on disk only
+            return
+        self._entries[digest] = entry
+        self._size += size
+
+        while self._size > self._max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= self._sizeof(evicted)
+            self.evictions += 1
+
+    def _read_disk(self, digest):
+        try:
+            with open(self._path(digest)) as inf:
+                count = int(inf.readline())
+                fragments = inf.read().split('\n')
+        except (IOError, ValueError):
+            return None
+        # every fragment ends with a newline
+        if count > len(fragments) - 1 or fragments[-1]:
+            return None
+        return fragments[:count], fragments[count:-1]
+
+    def _write_disk(self, digest, entry):
+        ''' Write entry to the disk tier, replacing the file atomically '''
+        path = self._path(digest)
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        with atomic_open(path) as outf:
+            # the number of entities, then a fragment per line,
+            # JSON never contains a raw newline
+            outf.write('{}\n'.format(len(entry[0])))
+            for fragments in entry:
+                for fragment in fragments:
+                    outf.write(fragment)
+                    outf.write('\n')
+        self.disk_writes += 1
+
+    def get(self, digest):
+        ''' Return (entity fragments, relationship fragments) of digest, None
+            on a miss
+        '''
+        if digest in self._entries:
+            entry = self._entries.pop(digest)
+            self._entries[digest] = entry
+            self.hits += 1
+            return entry
+
+        if self._cache_dir is not None:
+            entry = self._read_disk(digest)
+            if entry is not None:
+                self._remember(digest, entry)
+                self.hits += 1
+                self.disk_hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    def put(self, digest, entity_fragments, relationship_fragments):
+        ''' Store the translation of digest, the lists of the JSON of each
+            entity and relationship in output order
+        '''
+        entry = (list(entity_fragments), list(relationship_fragments))
+        self._remember(digest, entry)
+        if self._cache_dir is not None:
+            self._write_disk(digest, entry)
+
+    def clear(self):
+        ''' Drop the memory tier '''
+        self._entries.clear()
+        self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, digest):
+        return digest in self._entries
+
+    @property
+    def size(self):
+        ''' bytes of JSON held in memory '''
+        return self._size
+
+    @property
+    def stats(self):
+        ''' dict of the cache counters '''
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'disk_hits': self.disk_hits,
+                'disk_writes': self.disk_writes,
+                'entries': len(self._entries), 'bytes': self._size}
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+
+import sys
+import time
+import functools
+
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+class TranslationStats(object):
+    ''' Wall time and call count of the phases of translations
+
+        The time of a phase does not include that of the phases it calls,
+        so the times add up to the time of the translation. Phases are
+        kept in the order they first ran.
+    '''
+
+    def __init__(self):
+        self._phases  = OrderedDict() # name -> [seconds, calls]
+        self._nesting = []            # time of the phases called by those running
+
+    def time(self, phase, func, *args, **kwargs):
+        ''' Call func(*args, **kwargs) as phase and return its result '''
+        record = self._phases.setdefault(phase, [0.0, 0])
+        self._nesting.append(0.0)
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            record[0] += elapsed - self._nesting.pop()
+            record[1] += 1
+            if self._nesting:
+                self._nesting[-1] += elapsed
+
+    def seconds(self, phase):
+        ''' wall time spent in phase '''
+        return self._phases[phase][0] if phase in self._phases else 0.0
+
+    def calls(self, phase):
+        ''' number of times phase ran '''
+        return self._phases[phase][1] if phase in self._phases else 0
+
+    @property
+    def phases(self):
+        ''' names of the phases that ran '''
+        return self._phases.keys()
+
+    @property
+    def total(self):
+        ''' wall time of all the phases '''
+        return sum(seconds for seconds, calls in self._phases.values())
+
+    def as_dict(self):
+        ''' dict of phase -> {'seconds': ..., 'calls': ...} '''
+        return OrderedDict((phase, {'seconds': seconds, 'calls': calls}) \
+                                for phase, (seconds, calls) in self._phases.items())
+
+    def report(self):
+        ''' the phases as lines of text '''
+        lines = ['{:<28}{:>10.4f}s {:>6} calls'.format(phase, seconds, calls) \
+                    for phase, (seconds, calls) in self._phases.items()]
+        lines.append('{:<28}{:>10.4f}s'.format('total', self.total))
+        return lines
+
+    def merge(self, other):
+        ''' Add the times and calls of the phases of other, a TranslationStats
+            of e.g. a worker process, to those of self
+        '''
+        for phase, (seconds, calls) in other._phases.items():
+            record = self._phases.setdefault(phase, [0.0, 0])
+            record[0] += seconds
+            record[1] += calls
+
+    def clear(self):
+        self._phases.clear()
+
+
+def peak_memory():
+    ''' Peak resident memory of the process in bytes, None if unknown '''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # in bytes on Mac OS X, kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def percentile(values, p):
+    ''' The p-th percentile of values by nearest rank '''
+    if not values:
+        return None
+    values = sorted(values)
+    rank = int(round(p / 100.0 * (len(values) - 1)))
+    return values[rank]
+
+
+def phase(name):
+    ''' Decorator of the Translator methods timed as phase name
+
+        Only an attribute test is added to the call unless the
+        translator has stats.
+    '''
+    def decorate(method):
+        @functools.wraps(method)
+        def timed(self, *args, **kwargs):
+            if self._stats is None:
+                return method(self, *args, **kwargs)
+            return self._stats.time(name, method, self, *args, **kwargs)
+        return timed
+    return decorate
@@ -3,48 +3,80 @@
 import re
 import sys
 import json
+import cPickle
+import traceback
+from itertools import groupby, izip
+from multiprocessing import Process, Pipe
 
-from ClassDfn import Relation, Entity, Relationship, Attribute
+from ClassDfn import Relation, Entity, Relationship, Attribute, AttributeTable, NameTable
 from ClassDfn import Cardinality, EntityType, RelationshipType  # enum type
 from ClassDfn import repr_keys, repr_cardinality, repr_entity_type, repr_relationship_type # function
+from ClassDfn import relation_signature, count_disjoint_keys, count_disjoint_masks
+from TranslationStats import TranslationStats, phase, peak_memory
 
 class Translator(object):
     ''' Traslate Relation schema to ER diagram'''
 
-    # helper functions
-    @staticmethod
-    def _count_disjoint_keys(keys):
-        ''' return the count of disjoint keys '''
-
-        # keys is a set
-        attr_seen = set([])
-        counter = 0
-        for k in keys:
-            # k is a frozenset of attributes
-            if len(k.intersection(attr_seen)) == 0:
-                counter += 1
-            attr_seen.update(k)
-
-        return counter
-
-
-    def __init__(self, relations):
-        ''' take a list of object relation as input '''
+    def __init__(self, relations, cache=None, processes=1, timings=False, compact=False,
+                       bitsets=False, fkey_targets=False):
+        ''' take a list of object relation as input
+            cache:   a TranslationCache, the JSON fragments of a schema
+                     already translated are served from it
+            processes: translate the IND-graph components of the schema in
+                     this many worker processes
+            timings: record the wall time and calls of each phase in stats
+            compact: compact the relations before translating them and
+                     the Entities and Relationships as they are found, see
+                     Relation.compact and Entity.compact
+            bitsets: test the fkeys of the relations of relationships as int
+                     masks of an AttributeTable
+            fkey_targets: a relationship with an identifier shared by
+                     Entities (e.g. ISA) is with the Entity the fkey
+                     references, see _identified_entity
+        '''
 
         tf = [isinstance(r, Relation) for r in relations] 
         if all(tf):
             self._relations = {r.name: r for r in relations}
-            self._core_relations = self._comp_relations = None
-            self._ISA_relations  = self._IDD_relations  = None
-            self._relationships  = None
-            self._entities       = None
-
-            self._entity_json       = None
-            self._relationship_json = None
-            self._unassigned_relations = []
+            # the names in the order given, see _entity_positions
+            self._relation_order = [r.name for r in relations]
+            self._cache = cache
+            self._processes = processes
+            self._stats = TranslationStats() if timings else None
+            self._compact = compact
+            self._bitsets = bitsets
+            self._fkey_targets = fkey_targets
+            self._reset()
         else:
             raise TypeError('Translator takes an iterable of Relations as input.')
 
+    def _reset(self):
+        ''' clear the result of translation '''
+
+        self._core_relations = self._comp_relations = None
+        self._ISA_relations  = self._IDD_relations  = None
+        self._relationships  = None
+        self._relationship_origins = None
+        self._entities       = None
+        self._refed_key_index = None
+        self._referencing_index = self._attribute_index = None
+        self._fkey_target_index = None
+        self._identifier_index = self._identifier_rank = None
+        self._identifier_position = None
+        self._cache_hit = False
+        # the JSON is known but not the ER model it is made of,
+        # (entity fragments, relationship fragments) of it
+        self._json_only = False
+        self._json_fragments = None
+
+        self._entity_json       = None
+        self._relationship_json = None
+        # JSON of each entity by name and of each relationship
+        self._entity_fragments       = {}
+        self._relationship_fragments = {}
+        self._unassigned_relations = []
+
+    @phase('find_core_relations')
     def _find_core_relations(self):
         ''' find the core relations '''
 
@@ -69,16 +101,7 @@ class Translator(object):
                 # condition (b) satisfied automaticaly since E-type relation
 
                 # condition (c)
-                pkey = R.pkey
-                passed = True
-                for R1 in self._relations.values():
-                    if R1.fkeys is not None:
-                        for fk_name, fk in R1.fkeys.items():
-                            refed_key = fk.refed_key 
-                            if refed_key != pkey and refed_key.issubset(pkey):
-                                # proper subset
-                                passed = False
-                                break
+                passed = not self._has_proper_refed_subkey(R.pkey)
                 if passed:
                     # all conditions satisfied
                     self._core_relations.update({name: R})
@@ -91,6 +114,118 @@ class Translator(object):
             pass
 
 
+    @phase('index_refed_keys')
+    def _index_refed_keys(self):
+        ''' index the keys referenced by any IND '''
+
+        # _refed_key_index is a dict consists of k-v pair
+        # attribute -> set of refed keys whose smallest attribute it is
+        # so each refed key is indexed under exactly one attribute
+        self._refed_key_index = {}
+        # the indexes of apply, built from the relations when it needs them
+        self._referencing_index = self._attribute_index = None
+
+        for R in self._relations.values():
+            if R.fkeys is None:
+                continue
+            for fk in R.fkeys.values():
+                refed_key = fk.refed_key
+                try:
+                    self._refed_key_index[min(refed_key)].add(refed_key)
+                except KeyError:
+                    self._refed_key_index[min(refed_key)] = set([refed_key])
+
+    @phase('index_fkey_targets')
+    def _index_fkey_targets(self):
+        ''' index the foreign keys of E-type relations by the relation they reference '''
+
+        # _fkey_target_index is a dict consists of k-v pair
+        # (referencing relation, referenced relation) -> tuple of the foreign
+        # keys of the first referencing the second, in the order of its fkeys
+        # compact keeps no index, see _fkeys_to
+        self._fkey_target_index = {}
+        if self._compact:
+            return
+
+        for name, R in self._E_relations.items():
+            if R.fkeys is None:
+                continue
+            for fk in R.fkeys.values():
+                target = (name, fk.refed_relation)
+                self._fkey_target_index[target] = self._fkey_target_index.get(target, ()) + (fk,)
+
+    def _index_references(self, relations, add=True):
+        ''' add relations to the indexes apply looks relations up in, or
+            remove them from those if not add, keeping _refed_key_index
+            current
+
+            Return the set of refed keys which become referenced by an IND,
+            or stop being referenced, as relations are added or removed.
+        '''
+
+        # _referencing_index is a dict consists of k-v pair
+        # refed key -> names of the relations with an fkey referencing it
+        # _attribute_index is a dict consists of k-v pair
+        # attribute -> names of the relations having it
+        if self._referencing_index is None:
+            self._referencing_index, self._attribute_index = {}, {}
+
+        toggled = set([])
+        for R in relations:
+            for attr in R.attributes:
+                if add:
+                    self._attribute_index.setdefault(attr, set([])).add(R.name)
+                else:
+                    names = self._attribute_index[attr]
+                    names.discard(R.name)
+                    if not names:
+                        del self._attribute_index[attr]
+
+            if R.fkeys is None:
+                continue
+            for fk in R.fkeys.values():
+                refed_key = fk.refed_key
+                names = self._referencing_index.get(refed_key)
+                if add:
+                    if names is None:
+                        names = self._referencing_index[refed_key] = set([])
+                        self._refed_key_index.setdefault(min(refed_key), set([])).add(refed_key)
+                        toggled.symmetric_difference_update([refed_key])
+                    names.add(R.name)
+                elif names is not None and R.name in names:
+                    names.discard(R.name)
+                    if not names:
+                        del self._referencing_index[refed_key]
+                        refed_keys = self._refed_key_index[min(refed_key)]
+                        refed_keys.discard(refed_key)
+                        if not refed_keys:
+                            del self._refed_key_index[min(refed_key)]
+                        toggled.symmetric_difference_update([refed_key])
+        return toggled
+
+    def _fkeys_to(self, rname, cname):
+        ''' the foreign keys of relation rname referencing relation cname '''
+        if self._compact:
+            # a relation has a few fkeys, built from its tuple when asked for
+            R = self._E_relations.get(rname)
+            if R is None or R.fkeys is None:
+                return ()
+            return tuple(fk for fk in R.fkeys.values() if fk.refed_relation == cname)
+        return self._fkey_target_index.get((rname, cname), ())
+
+    def _has_proper_refed_subkey(self, key):
+        ''' whether some key referenced by an IND is a proper subset of key '''
+
+        # a subset of key must be indexed under one of the attributes of key
+        for attr in key:
+            for refed_key in self._refed_key_index.get(attr, ()):
+                if refed_key != key and refed_key.issubset(key):
+                    return True
+        return False
+
+
+
+    @phase('find_comp_relations')
     def _find_comp_relations(self):
         ''' find the component relations of each core relation '''
 
@@ -98,10 +233,12 @@ class Translator(object):
         # name of core relations -> entry(name of comp relation, cardinality)
         self._comp_relations = {}
 
-        for cname, R in self._core_relations.items():
+        # in name order, so the match kept does not depend on the order of
+        # the schema (or of a component translated alone)
+        for cname, R in sorted(self._core_relations.items()):
             if R.refed_by is None:
                 continue
-            for rname in R.refed_by:
+            for rname in sorted(R.refed_by):
                 # for each R1 by the name of rname referencing to R
                 # (1) R1 references R satisfied
                 # (2) and (3) baisically ensure R1 not qualified to be 
@@ -120,21 +257,25 @@ class Translator(object):
                 #   (i)   part of the key of R1, or
                 #   (ii)  a non prime of R1, or 
                 #   (iii) the key of R1
-                fkey = R1.fkeys.keys()[0] # the only one foreign key which references R
+                fkeys = self._fkeys_to(rname, cname)
+                if not fkeys:
+                    continue
+                fk = fkeys[0]
+                if len(fkeys) > 1:
+                    # the foreign key which references the pkey of R
+                    fk = next((fk for fk in fkeys if fk.refed_key == R.pkey), fk)
+                fkey = fk.key
                 nonprimes = R1.non_primes
                 if fkey.issubset(nonprimes):
                     # (ii) no need to be just one attribute
                     # this is a 1:m component relation
                     # since the attributes other than fkey -> fkey(pkey of R)
                     entry = (rname, Cardinality.one2many)
-                    try:
-                        self._comp_relations[cname].add(entry)
-                    except KeyError:
-                        self._comp_relations[cname] = set([entry])
+                    self._add_comp_relation(cname, entry)
                     self._E_relations_left.remove(rname)
                     continue
 
-                for k in R1.keys:
+                for k in sorted(R1.keys, key=sorted):
                     # (i) and (iii)
                     if fkey.issubset(k):
                         if fkey == k:
@@ -153,14 +294,23 @@ class Translator(object):
                             # the existence of nonprime qualifies R
                             # as a independent entity
                             continue
-                        try:
-                            self._comp_relations[cname].add(entry)
-                        except KeyError:
-                            self._comp_relations[cname] = set([entry])
+                        self._add_comp_relation(cname, entry)
                         self._E_relations_left.remove(rname)
                         break
 
 
+    def _add_comp_relation(self, cname, entry):
+        ''' add entry to the set of comp relations of cname, a tuple if compact '''
+        entries = self._comp_relations.get(cname)
+        if self._compact:
+            # a core relation has a few, each found once
+            self._comp_relations[cname] = (entries or ()) + (entry,)
+        elif entries is None:
+            self._comp_relations[cname] = set([entry])
+        else:
+            entries.add(entry)
+
+    @phase('find_IDD_relations')
     def _find_IDD_relations(self):
         ''' find ID-dependent relations '''
 
@@ -168,8 +318,11 @@ class Translator(object):
         # dependent relation -> core relation 
         self._IDD_relations = {}
 
-        for cname, R0 in self._core_relations.items():
-            for rname in R0.refed_by:
+        # in name order, as _find_comp_relations
+        for cname, R0 in sorted(self._core_relations.items()):
+            if R0.refed_by is None:
+                continue
+            for rname in sorted(R0.refed_by):
                 
                 # (2) R contains more than one disjoint foreign keys
                 if rname not in self._E_relations:
@@ -182,12 +335,14 @@ class Translator(object):
                 # k0, k are primary keys of R0 and R
                 k0 = R0.pkey 
                 k  = R.pkey 
-                # k should be a proper subset of k0
-                if (k0.issubset(k) and k0 != k) and (k0 in R.fkeys) \
-                   and (R.fkeys[k0].refed_key == k0 and R.fkeys[k0].refed_relation == cname):
-                    pass
+                for fk in self._fkeys_to(rname, cname):
+                    if fk.key == k0 and fk.refed_key == k0:
+                        break
                 else:
                     continue
+                # k should be a proper subset of k0
+                if not (k0.issubset(k) and k0 != k):
+                    continue
 
                 # (3) There exists R1 references to R, or
                 #       R has a non-prime attribute
@@ -207,26 +362,133 @@ class Translator(object):
                     self._E_relations_left.remove(rname)
 
 
+    @phase('find_ISA_relations')
     def _find_ISA_relations(self):
         ''' find the ISA relations '''
 
         # _ISA_relations is a dict with k-v pair
-        # R1 -> R, where R1 ISA R
+        # R1 -> [R, ...], where R1 ISA R, the edges of the hierarchy
         self._ISA_relations = {}
         
         # if keys K1 of R1 and K2 of R2 satisfies
         #   R1[K1] <= R2[K2], then R1 ISA R2 (both R1 and R2 are core relatons)
-        for name, R1 in self._core_relations.items():
-            for k in R1.keys:
+        # found in name order, see _isa_hierarchy
+        edges = []
+        for name, R1 in sorted(self._core_relations.items()):
+            for k in sorted(R1.keys, key=sorted):
                 # for each key of R1
                 if R1.fkeys is not None and k in R1.fkeys:
                     rkey = R1.fkeys[k].refed_key
                     rrel = R1.fkeys[k].refed_relation
                     if rrel in self._core_relations and \
                        rkey in self._core_relations[rrel].keys:
-                        self._ISA_relations[name] = rrel
+                        edges.append((name, rrel))
+
+        for name, rrel in self._isa_hierarchy(edges):
+            self._ISA_relations.setdefault(name, []).append(rrel)
+
+    @staticmethod
+    def _isa_hierarchy(edges):
+        ''' The edges of the specialization hierarchy of the ISA edges
+
+            edges is a list of (R1, R) where R1 ISA R, in the order found.
+            Relations on a cycle are the same type: the cycle is collapsed,
+            each of them but the first found becomes a subtype of the first.
+            Between the collapsed types only the edges not implied by the
+            others are kept (the transitive reduction), one per pair of
+            types. Returns the (R1, R) kept, grouped by R1 in the order of
+            edges. Linear in the edges, except that a type with several
+            supertypes visits all its ancestors.
+        '''
+
+        subtypes, supertypes = [], {} # R1 -> [R, ...] without repeats
+        for name, rrel in edges:
+            if name == rrel:
+                continue
+            if name not in supertypes:
+                subtypes.append(name)
+                supertypes[name] = []
+            if rrel not in supertypes[name]:
+                supertypes[name].append(rrel)
+
+        # strongly connected components (Tarjan's, without recursion)
+        component, index, low = {}, {}, {}
+        on_stack, stack, count = set([]), [], 0
+        for root in subtypes:
+            if root in index:
+                continue
+            index[root] = low[root] = count
+            count += 1
+            stack.append(root)
+            on_stack.add(root)
+            path = [(root, iter(supertypes.get(root, ())))]
+            while path:
+                node, successors = path[-1]
+                for succ in successors:
+                    if succ not in index:
+                        index[succ] = low[succ] = count
+                        count += 1
+                        stack.append(succ)
+                        on_stack.add(succ)
+                        path.append((succ, iter(supertypes.get(succ, ()))))
+                        break
+                    elif succ in on_stack:
+                        low[node] = min(low[node], index[succ])
+                else:
+                    path.pop()
+                    if path:
+                        low[path[-1][0]] = min(low[path[-1][0]], low[node])
+                    if low[node] == index[node]:
+                        # node is the root of a component, named by node
+                        while True:
+                            member = stack.pop()
+                            on_stack.remove(member)
+                            component[member] = node
+                            if member == node:
+                                break
+
+        # the first relation found of each component stands for it
+        first = {}
+        for name in subtypes:
+            first.setdefault(component[name], name)
+
+        # the edges between components, the first found of each pair
+        parents, chosen = {}, {}
+        for name in subtypes:
+            for rrel in supertypes[name]:
+                pair = (component[name], component[rrel])
+                if pair[0] != pair[1] and pair not in chosen:
+                    chosen[pair] = (name, rrel)
+                    parents.setdefault(pair[0], []).append(pair[1])
+
+        # an edge to a parent is implied if the parent is also an ancestor
+        # through another parent
+        implied = set([])
+        for comp, direct in parents.items():
+            if len(direct) < 2:
+                continue
+            seen  = set([])
+            above = [p for parent in direct for p in parents.get(parent, ())]
+            while above:
+                ancestor = above.pop()
+                if ancestor not in seen:
+                    seen.add(ancestor)
+                    above.extend(parents.get(ancestor, ()))
+            implied.update((comp, parent) for parent in direct if parent in seen)
+
+        hierarchy = []
+        for name in subtypes:
+            comp = component[name]
+            if first.get(comp, name) != name:
+                hierarchy.append((name, first[comp]))
+            for rrel in supertypes[name]:
+                pair = (comp, component[rrel])
+                if chosen.get(pair) == (name, rrel) and pair not in implied:
+                    hierarchy.append((name, rrel))
+        return hierarchy
     
 
+    @phase('identify_relationships')
     def _identify_relationships(self):
         ''' Identify relationships in relations
             
@@ -259,31 +521,40 @@ class Translator(object):
         def examine_pkey(pkey, E_fkeys, R):
             ''' examine pkey, partition pkey into those in E_fkeys and others '''
 
-            idr_in_pkey ={fk: R.fkeys[fk].refed_key for fk in E_fkeys if fk.issubset(pkey)}
+            if self._is_masked(R):
+                pkey_mask = R.pkey_mask
+                idr_in_pkey ={fk: R.fkeys[fk].refed_key for fk in E_fkeys \
+                                if not R.fkeys[fk].key_mask & ~pkey_mask}
+            else:
+                idr_in_pkey ={fk: R.fkeys[fk].refed_key for fk in E_fkeys if fk.issubset(pkey)}
             otr_attr = pkey.difference(set([a for fk in idr_in_pkey for a in fk]))
             return idr_in_pkey, otr_attr
 
         # The following assume all identifiers are disjoint
         # this assumption would be a probem if exists relations referencing to IDD entites
-        # find all Identifiers of Entitnies 
         # relaxed universal assumption, all identifiers are unique
-        all_identifiers = {ent.identifier.elements: name for name, ent in self._entities.items()}
+        # an identifier shared by Entities (e.g. ISA) stands for one of
+        # them, see _identified_entity
+        idr_index = self._identifier_index
 
         # unassigned_attributes
         unassigned_attributes = {}
 
-        for name, R in self._R_relations.items():
+        for name, R in self._R_relations.iteritems():
             # find the E_fkeys of relation R
             pkey = R.pkey
-            E_fkeys = [fk_name for fk_name, fk  in R.fkeys.items() if fk.refed_key in all_identifiers]
-            dsj_fkey_count = self._count_disjoint_keys(E_fkeys)
+            E_fkeys = [fk_name for fk_name, fk  in R.fkeys.items() if fk.refed_key in idr_index]
+            if self._is_masked(R):
+                dsj_fkey_count = count_disjoint_masks([R.fkeys[fk].key_mask for fk in E_fkeys], E_fkeys)
+            else:
+                dsj_fkey_count = count_disjoint_keys(E_fkeys)
 
             # 1) more than one fkeys referencing Entitites
             if dsj_fkey_count > 1:
                 idr_in_pkey, otr_attr = examine_pkey(pkey, E_fkeys, R) 
                 if not idr_in_pkey:
                     # pkey has NO E_fkey
-                    R_identifier = frozenset([npa for npa in R.non_primes if frozenset([npa]) in all_identifiers])
+                    R_identifier = frozenset([npa for npa in R.non_primes if frozenset([npa]) in idr_index])
                     otr_non_primes = R.non_primes.difference(R_identifier)
                     if not otr_non_primes:
                         unassigned_attributes.update({R_identifer: pkey})
@@ -291,34 +562,34 @@ class Translator(object):
                 elif not otr_attr:
                     # 2) only E_fkeys
                     rel = Relationship(name, RelationshipType.regular, frozenset(pkey))
-                    for idr, E_name in all_identifiers.items():
-                        if idr in idr_in_pkey.values():
-                            rel.add_participating_entity(E_name, 'm')
+                    for E_name in self._identified_entities(R, idr_in_pkey):
+                        rel.add_participating_entity(E_name, 'm')
 
                     for npa in R.non_primes:
                         key = frozenset([npa])
-                        if key in all_identifiers:
-                            rel.add_participating_entity(all_identifiers[key], '1')
+                        if key in idr_index:
+                            fk = R.fkeys.get(key)
+                            E_name = self._identified_entity(key, fk.refed_relation if fk else None)
+                            rel.add_participating_entity(E_name, '1')
                         else:
                             attr = Attribute(npa, key, Cardinality.many2one)
                             rel.add_attribute(attr)
 
-                    self._add_relationship(rel, RelationshipType.regular)
+                    self._add_relationship(rel, RelationshipType.regular, name)
 
                 else:
                     # 3) pkey has other attributes
                     if R.attributes == pkey:
                         # all key relation
                         rel = Relationship(name, RelationshipType.regular, frozenset(pkey))
-                        for idr, E_name in all_identifiers.items():
-                            if idr in idr_in_pkey.values():
-                                rel.add_participating_entity(E_name, 'm')
+                        for E_name in self._identified_entities(R, idr_in_pkey):
+                            rel.add_participating_entity(E_name, 'm')
                         for npa in otr_attr:
                             key = frozenset([npa])
                             attr = Attribute(npa, key, Cardinality.many2many)
                             rel.add_attribute(attr)
 
-                        self._add_relationship(rel, RelationshipType.regular)
+                        self._add_relationship(rel, RelationshipType.regular, name)
                     else:
                         self._unassigned_relations.append(R)
 
@@ -326,6 +597,7 @@ class Translator(object):
         # try to comibine with other E_relations left
         self._combine_relationship()
 
+    @phase('combine_relationship')
     def _combine_relationship(self):
         ''' Add attributes to relationship if exist '''
 
@@ -336,11 +608,14 @@ class Translator(object):
                 attr = Attribute(attr_name, frozenset([attr_name]), card)
                 rel.add_attribute(attr)
 
-        # a dict of regular relationships
-        rel_dict = {rel.name: rel for rel in self._relationships if rel.relationship_type == RelationshipType.regular}
+        # a dict of the regular relationships by the R-type relation they are
+        # found from, a name may be that of other relationships as well
+        rel_dict = {origin: rel for rel, origin in izip(self._relationships or (), self._relationship_origins or ()) \
+                        if rel.relationship_type == RelationshipType.regular and origin in self._R_relations}
 
         # all the relations in _E_relations_left would have one fkey not referening to entity
-        for rname in self._E_relations_left:
+        # in name order, an attribute added twice keeps the last
+        for rname in sorted(self._E_relations_left):
             # test whether it could be combined with existing regular relationship
 
             R = self._E_relations[rname]
@@ -369,6 +644,7 @@ class Translator(object):
                     continue
                         
 
+    @phase('partition_relations')
     def _partition_relations(self):
         ''' Partition relations to E-type or R-type
 
@@ -381,13 +657,29 @@ class Translator(object):
                 All the Relationships would translated from this type
         '''
 
-        self._E_relations = {name: R for name, R in self._relations.items() \
-                                if R.num_disjoint_fkeys <= 1}
-        self._R_relations = {name: R for name, R in self._relations.items() \
-                                if R.num_disjoint_fkeys >  1}
+        self._E_relations, self._R_relations = {}, {}
+        for name, R in self._relations.items():
+            if R.num_disjoint_fkeys <= 1:
+                self._E_relations[name] = R
+            else:
+                self._R_relations[name] = R
 
         self._E_relations_left = set([name for name in self._E_relations])
 
+        if self._bitsets:
+            self._encode_attributes()
+
+    @phase('encode_attributes')
+    def _encode_attributes(self):
+        ''' encode the attribute sets of the R-type relations as int masks,
+            those _identify_relationships tests, unless already encoded
+            (e.g. by an earlier translation of a part of the schema)
+        '''
+        AttributeTable().encode(R for R in self._R_relations.values() if R.layout is None)
+
+    def _is_masked(self, R):
+        ''' whether the attribute sets of R are tested as masks '''
+        return self._bitsets and R.layout is not None
 
     def _add_entity(self, relation, Etype):
         ''' Add entity '''
@@ -415,31 +707,226 @@ class Translator(object):
             for npa in relation.non_primes:
                 attr = Attribute(npa, frozenset([npa]), Cardinality.many2one)
                 entity.add_attribute(attr)
+            if self._compact:
+                entity.compact()
 
         if self._entities is None:
             self._entities = {relation.name: entity}
         else:
             self._entities[relation.name] = entity
 
-    def _add_relationship(self, rel, Rtype):
-        ''' Add relationship to _relationship '''
+    def _add_relationship(self, rel, Rtype, origin=None):
+        ''' Add relationship to _relationship
+            origin is the name of the relation the relationship is found from
+        '''
 
         if not isinstance(rel, Relationship):
             raise ValueError("Input need to be an instance of Relationship")
         if Rtype not in RelationshipType.valid_relationship_type:
             raise ValueError("Invalid Relationship type: {}".format(Rtype))
         
+        if self._compact:
+            rel.compact()
         if self._relationships is None:
             self._relationships = [rel]
+            self._relationship_origins = [origin]
         else:
             self._relationships.append(rel)
+            self._relationship_origins.append(origin)
+
+    @staticmethod
+    def _relationship_key(rel, origin):
+        ''' the output order of a relationship: by type, name, participating
+            entities and the relation it is found from
+        '''
+        return (rel.relationship_type, rel.name, sorted(rel.entities.items()), origin)
+
+    def _order_relationships(self):
+        ''' put the relationships in output order, see _relationship_key
+
+            They are sorted by type and name first, only those of the same
+            type and name (e.g. the ISA ones) by the rest of their key, so
+            the keys of all the relationships are not built at once: by name,
+            then by type as the sort is stable.
+        '''
+
+        if self._relationships is None:
+            return
+        rels, origins = self._relationships, self._relationship_origins
+        names = [rel.name for rel in rels]
+        order = sorted(xrange(len(rels)), key=names.__getitem__)
+        order.sort(key=lambda i: rels[i].relationship_type)
+        type_name = lambda i: (rels[i].relationship_type, names[i])
+        groups, order = order, []
+        for _, group in groupby(groups, type_name):
+            group = list(group)
+            if len(group) > 1:
+                group.sort(key=lambda i: self._relationship_key(rels[i], origins[i]))
+            order.extend(group)
+        self._relationships = [rels[i] for i in order]
+        self._relationship_origins = [origins[i] for i in order]
+
+    def _ordered_entities(self):
+        ''' the Entities in output order, by name '''
+        return [self._entities[name] for name in sorted(self._entities)]
+
+    @staticmethod
+    def _ordered_attributes(attributes):
+        ''' the values of attributes, a dict of elements -> Attribute, in
+            output order, by their sorted elements
+        '''
+        return [attributes[elements] for elements in sorted(attributes, key=sorted)]
+
+
+    @phase('index_identifiers')
+    def _index_identifiers(self, identifiers=None, ISA_relations=None, positions=None):
+        ''' index the Entities by their identifiers
+            identifiers is a list of (name, identifier elements) of the
+            Entities in order, those of _entities by default, and
+            ISA_relations the ISA hierarchy of the Entities, _ISA_relations
+            by default, positions those of _entity_positions if known
+        '''
+
+        # _identifier_index is a dict consists of k-v pair
+        # identifier elements -> names of Entities with that identifier,
+        #   see _rank_entities
+        # _identifier_rank is the position of each identifier in the index
+        # _identifier_position is the position of each identifier when sorted
+        #   by length, for the case of IDD entity, which would contain other
+        #   identifier of entity
+        self._identifier_index = {}
+
+        if identifiers is None:
+            identifiers = ((name, ent.identifier.elements) for name, ent in self._entities.iteritems())
+        if ISA_relations is None:
+            ISA_relations = self._ISA_relations or {}
+        if positions is None and not self._fkey_targets:
+            positions = self._entity_positions()
+
+        entity_idr = []
+        for name, idr in identifiers:
+            try:
+                self._identifier_index[idr].append(name)
+            except KeyError:
+                self._identifier_index[idr] = [name]
+                entity_idr.append(idr)
+
+        # both sized for the identifiers at once rather than grown, they are
+        # only looked up
+        self._identifier_rank = dict.fromkeys(self._identifier_index)
+        self._identifier_position = dict.fromkeys(self._identifier_index)
+        for rank, idr in enumerate(self._identifier_index):
+            self._identifier_rank[idr] = rank
+            self._identifier_index[idr] = self._rank_entities(self._identifier_index[idr],
+                                                              ISA_relations, positions)
+
+        for pos, idr in enumerate(sorted(entity_idr, key=len, reverse=True)):
+            self._identifier_position[idr] = pos
+
+    def _entity_positions(self, E_relations=None, core_relations=None, IDD_relations=None):
+        ''' dict of the name of each Entity -> its position in the _entities
+            of a translation in one process, of the classification of
+            _E_relations, _core_relations and _IDD_relations by default
+
+            The first version resolved an identifier shared by Entities by
+            the order of its dicts, so they are filled again in the order the
+            translation fills them: the E-type relations in the order the
+            relations were given (apply gives the added ones last), the core
+            relations in the order of those, then the ID-dependent ones in
+            the order of their core relation and of its refed_by. The
+            positions are the same however the schema was translated, in
+            processes or by apply.
+        '''
+
+        E_relations    = self._E_relations if E_relations is None else E_relations
+        core_relations = self._core_relations if core_relations is None else core_relations
+        IDD_relations  = self._IDD_relations if IDD_relations is None else IDD_relations
+
+        # each dict as large as the schema is dropped once the next one is
+        # filled from it
+        E_order = dict((name, None) for name in self._relation_order)
+        E_order = dict((name, None) for name in E_order if name in E_relations)
+        core = {}
+        for name in E_order:
+            if name in core_relations and name not in IDD_relations:
+                # by update, which grows a dict unlike setting an item
+                core.update({name: None})
+        E_order = None
+        for cname in core.keys():
+            for rname in self._relations[cname].refed_by or ():
+                if IDD_relations.get(rname) == cname:
+                    core[rname] = None
+        entities = dict((name, None) for name in core)
+        return dict((name, pos) for pos, name in enumerate(entities))
+
+    def _rank_entities(self, names, ISA_relations, positions):
+        ''' names of the Entities sharing an identifier, in positions, see
+            _entity_positions, or with fkey_targets the roots of ISA
+            hierarchies first, then by name
+
+            The order does not depend on the order the Entities were found
+            in, so an identifier resolves the same way however the schema
+            was translated.
+        '''
+        if self._fkey_targets:
+            return sorted(names, key=lambda name: (name in ISA_relations, name))
+        return sorted(names, key=positions.get)
+
+    def _identified_entity(self, idr, target=None, first=False):
+        ''' name of the Entity identified by idr
+
+            An identifier shared by Entities stands for the last of them in
+            the order of _entity_positions, or the first if first, e.g. for
+            a mixed relation, as in the first version. With fkey_targets it
+            stands for target, the relation an fkey references, if it is one
+            of them, otherwise for the root of their ISA hierarchy, never a
+            subtype.
+        '''
+
+        names = self._identifier_index[idr]
+        if not self._fkey_targets:
+            return names[0] if first else names[-1]
+        if target is not None and len(names) > 1 and target in names:
+            return target
+        return names[0]
+
+    def _identified_entities(self, R, idr_in_fkeys):
+        ''' names of the Entities referenced by the fkeys of R in
+            idr_in_fkeys, a dict of fkey -> identifier, in index order
+        '''
+
+        rank  = self._identifier_rank
+        found = sorted((rank[idr], fk) for fk, idr in idr_in_fkeys.items() if idr in rank)
+        names = []
+        for _, fk in found:
+            name = self._identified_entity(idr_in_fkeys[fk], R.fkeys[fk].refed_relation)
+            if name not in names:
+                names.append(name)
+        return names
 
 
     def _identify_entities(self):
         ''' Identify Entities in ER '''
 
+        self._build_entities()
+
+        self._index_identifiers()
+
+        self._identify_mixed_relations()
+
+    @phase('build_entities')
+    def _build_entities(self):
+        ''' Build the Entities of core relations with their component relations '''
+
         # STEP 1: find core relations
         self._find_core_relations()
+        if self._compact:
+            # nothing else looks the refed keys up, apply indexes them again,
+            # see _index_references
+            self._refed_key_index = {}
+
+        # the passes below look up the fkeys referencing a relation
+        self._index_fkey_targets()
 
         # STEP 2: find IDD relations
         self._find_IDD_relations()
@@ -449,6 +936,7 @@ class Translator(object):
 
         # STEP 4: find ISA relations
         self._find_ISA_relations()
+        self._fkey_target_index = None
 
         # Identify Entities
         # each core relation would result in an Entity
@@ -464,13 +952,13 @@ class Translator(object):
                 rel = Relationship('ID', RelationshipType.IDD)
                 rel.add_participating_entity(cname, '1')
                 rel.add_participating_entity(dname, 'm')
-                self._add_relationship(rel, RelationshipType.IDD)
+                self._add_relationship(rel, RelationshipType.IDD, cname)
 
 
         # Incorporate each component relation
         for cname, comp in self._comp_relations.items():
 
-            for comp_name, comp_card in comp:
+            for comp_name, comp_card in sorted(comp):
                 R = self._E_relations[comp_name]
                 identifier = self._entities[cname].identifier
 
@@ -520,27 +1008,23 @@ class Translator(object):
 
 
         # Add correspinding ISA Relationship
-        # A ISA B
-        for RA1, RB1 in self._ISA_relations.items():
-            for RA2, RB2 in self._ISA_relations.items():
-                if RA1 == RB2 and RA2 == RB1:
-                    # TODO: combine together
-                    continue
-            # add relationship
-            rel = Relationship('ISA', RelationshipType.ISA)
-            rel.add_participating_entity(RA1, 'm')
-            rel.add_participating_entity(RB1, '1')
-            self._add_relationship(rel, RelationshipType.ISA)
-
-        # Find the case of mix enttity and relationship relation
-        # that is the nonprimes of a core Entity R have other
-        # identifiers of Entities
-
-        # all the entity identifiers
-        entity_idr = [ent.identifier.elements for ent in self._entities.values()]
-        # sort the entity_idr by lenght
-        # this is for the case of IDD entity, which would contain other identifier of entity
-        entity_idr = sorted(entity_idr, key=len, reverse=True)
+        # A ISA B, one for each edge of the hierarchy
+        for RA1, RBs in self._ISA_relations.items():
+            for RB1 in RBs:
+                rel = Relationship('ISA', RelationshipType.ISA)
+                rel.add_participating_entity(RA1, 'm')
+                rel.add_participating_entity(RB1, '1')
+                self._add_relationship(rel, RelationshipType.ISA, RA1)
+
+    @phase('identify_mixed_relations')
+    def _identify_mixed_relations(self):
+        ''' Find the case of mix enttity and relationship relation
+            that is the nonprimes of a core Entity R have other
+            identifiers of Entities
+        '''
+
+        idr_position = self._identifier_position
+
         for cname, R in self._core_relations.items():
             # the keys refed by non prime fkeys
             nonprimes = R.non_primes
@@ -549,97 +1033,691 @@ class Translator(object):
             else:
                 continue
             if np_refed_keys:
-                for idr in entity_idr:
-                    if idr in np_refed_keys:
-                        # R is a mix of entity and another binary relationship
-                        # 1) exclude the idr from R
-                        # 2) add corresponding relationship
-
-                        # exclude idr from R
-                        ent = self._entities[cname]
-                        ent.remove_attribute(np_refed_keys[idr])
-                        # add corresponding relationship
-                        for ent_name, ent in self._entities.items():
-                            # find the name of the other entity
-                            if ent.identifier.elements == idr:
-                                break
-                        rel_name = '{}_{}'.format(cname, ent_name)
-                        rel = Relationship(rel_name, RelationshipType.regular)
-                        rel.add_participating_entity(cname, 'm')
-                        rel.add_participating_entity(ent_name, '1')
-                        self._add_relationship(rel, RelationshipType.regular)
+                # the identifiers refed, longest first
+                refed_idrs = [idr for idr in np_refed_keys if idr in idr_position]
+                refed_idrs.sort(key=idr_position.get)
+                for idr in refed_idrs:
+                    # R is a mix of entity and another binary relationship
+                    # 1) exclude the idr from R
+                    # 2) add corresponding relationship, once per idr
+                    ent_name = self._identified_entity(idr, R.fkeys[np_refed_keys[idr]].refed_relation,
+                                                       first=True)
+
+                    # exclude idr from R
+                    ent = self._entities[cname]
+                    ent.remove_attribute(np_refed_keys[idr])
+                    # add corresponding relationship
+                    rel_name = '{}_{}'.format(cname, ent_name)
+                    rel = Relationship(rel_name, RelationshipType.regular)
+                    rel.add_participating_entity(cname, 'm')
+                    rel.add_participating_entity(ent_name, '1')
+                    self._add_relationship(rel, RelationshipType.regular, cname)
+
+    @staticmethod
+    def _neighbours(R):
+        ''' names of the relations R references or is referenced by '''
+        names = set([])
+        if R.fkeys is not None:
+            names.update(fk.refed_relation for fk in R.fkeys.values())
+        if R.refed_by is not None:
+            names.update(R.refed_by)
+        return names
+
+    def _component_closure(self, names):
+        ''' names of all relations connected to names through INDs '''
+        closure = set([])
+        stack = [name for name in names if name in self._relations]
+        while stack:
+            name = stack.pop()
+            if name in closure:
+                continue
+            closure.add(name)
+            stack.extend(n for n in self._neighbours(self._relations[name]) \
+                            if n in self._relations and n not in closure)
+        return closure
+
+    def _translate_subset(self, names):
+        ''' Build the Entities of the relations of names with a sub-Translator
+
+            names must be closed under INDs (a union of components). The
+            refed keys of the whole schema are used for the core relations.
+        '''
+        sub = Translator([self._relations[name] for name in names], timings=self._stats is not None,
+                         compact=self._compact, bitsets=self._bitsets, fkey_targets=self._fkey_targets)
+        sub._refed_key_index = self._refed_key_index
+        sub._entities = {}
+        sub._relationships, sub._relationship_origins = [], []
+        sub._partition_relations()
+        sub._build_entities()
+        return sub
+
+    def _merge_subset(self, sub, dropped):
+        ''' Replace the results of the relations of dropped by those of sub '''
+
+        def merged(results, sub_results):
+            # in place, the results of the other relations are not copied
+            results = {} if results is None else results
+            for name in dropped:
+                results.pop(name, None)
+            results.update(sub_results)
+            return results
+
+        self._entities       = merged(self._entities, sub._entities)
+        self._core_relations = merged(self._core_relations, sub._core_relations)
+        self._comp_relations = merged(self._comp_relations, sub._comp_relations)
+        self._IDD_relations  = merged(self._IDD_relations, sub._IDD_relations)
+        self._ISA_relations  = merged(self._ISA_relations, sub._ISA_relations)
+        self._E_relations    = merged(self._E_relations, sub._E_relations)
+        self._R_relations    = merged(self._R_relations, sub._R_relations)
+        self._E_relations_left.difference_update(dropped)
+        self._E_relations_left.update(sub._E_relations_left)
+        self._unassigned_relations = [R for R in self._unassigned_relations if R.name not in dropped]
+        self._unassigned_relations.extend(sub._unassigned_relations)
+
+        kept = [(rel, origin) for rel, origin in \
+                    zip(self._relationships or [], self._relationship_origins or []) \
+                    if origin not in dropped]
+        kept.extend(zip(sub._relationships, sub._relationship_origins))
+        self._relationships = [rel for rel, origin in kept]
+        self._relationship_origins = [origin for rel, origin in kept]
+
+        # the JSON of everything else is kept
+        for name in dropped:
+            self._entity_fragments.pop(name, None)
+        self._relationship_fragments = dict((rel, self._relationship_fragments[rel]) \
+            for rel in self._relationships if rel in self._relationship_fragments)
+        self._entity_json = self._relationship_json = None
+
+    def apply(self, added=(), removed=(), changed=()):
+        ''' Re-translate after an edit of the schema
+
+            added and changed are Relations, removed are names of relations.
+            The edited schema must be consistent as read_schema would build
+            it, i.e. a relation whose fkeys or refed_by change is in changed
+            (Translator.diff finds them).
+
+            Only the relations whose translation may change are translated
+            again: the IND-graph components of the edited relations and of
+            their old neighbours, plus
+            (1) the components of relations whose pkey properly contains a
+                refed key the edit adds or drops (core condition (c)), and
+            (2) the components of relations that refer, by an fkey or a
+                non-prime attribute, to an identifier whose Entity changes.
+            Everything else a component's translation reads is inside the
+            component, so the result equals a full translate() of the edited
+            schema, up to the order of the JSON arrays. The relations of (1)
+            and (2) are looked up in indexes the first apply builds and each
+            one updates for the edited relations only; by default the order
+            of the Entities sharing an identifier is found again for all of
+            them, see _entity_positions.
+
+            Return the set of names of the relations translated again.
+        '''
+
+        added, changed = list(added), list(changed)
+        edited = set(removed)
+        edited.update(R.name for R in added + changed)
+
+        patch = self._entities is not None and not self._json_only
+        if patch and self._referencing_index is None:
+            # once, later edits keep the indexes current
+            self._index_references(self._relations.values())
+
+        # the neighbours before the edit are affected as well
+        seeds = set(edited)
+        old = [self._relations[name] for name in edited if name in self._relations]
+        for R in old:
+            seeds.update(self._neighbours(R))
+
+        for name in removed:
+            self._relations.pop(name, None)
+        for R in added + changed:
+            self._relations[R.name] = R
+            seeds.update(self._neighbours(R))
+        # as if the added relations were given after the others
+        self._relation_order = [name for name in self._relation_order if name in self._relations]
+        given = set(self._relation_order)
+        self._relation_order.extend(R.name for R in added if R.name not in given)
+
+        if not patch:
+            # no translation to patch
+            self._reset()
+            self.translate()
+            return set(self._relations)
+
+        # (1) refed keys added or dropped, the indexes updated for the
+        # edited relations only
+        refed_keys = self._index_references(old, add=False)
+        refed_keys.symmetric_difference_update(self._index_references(added + changed))
+        for key in refed_keys:
+            names = [self._attribute_index.get(attr, set([])) for attr in key]
+            names = set.intersection(*sorted(names, key=len))
+            seeds.update(name for name in names \
+                            if self._relations[name].pkey is not None and \
+                               key < self._relations[name].pkey)
+
+        affected = self._component_closure(seeds)
+        old_entities = self._entities
+        old_identifiers = self._identifier_index
+
+        while True:
+            sub = self._translate_subset(affected)
+
+            # (2) identifiers whose Entity changes
+            identifiers = set(old_entities[name].identifier.elements \
+                                for name in affected | edited if name in old_entities)
+            identifiers.update(ent.identifier.elements for ent in sub._entities.values())
+            new_identifiers = {}
+            for name, ent in old_entities.items():
+                if name not in affected and name not in edited:
+                    new_identifiers.setdefault(ent.identifier.elements, []).append(name)
+            for name, ent in sub._entities.items():
+                new_identifiers.setdefault(ent.identifier.elements, []).append(name)
+
+            def merged(results, sub_results):
+                results = dict((k, v) for k, v in results.items() \
+                                if k not in affected and k not in edited)
+                results.update(sub_results)
+                return results
+
+            ISA_relations = merged(self._ISA_relations, sub._ISA_relations)
+            positions = None
+            if not self._fkey_targets:
+                # any Entity added or dropped may reorder the others
+                positions = self._entity_positions(merged(self._E_relations, sub._E_relations),
+                                                   merged(self._core_relations, sub._core_relations),
+                                                   merged(self._IDD_relations, sub._IDD_relations))
+                identifiers.update(idr for idr, names in old_identifiers.items() if len(names) > 1)
+                identifiers.update(idr for idr, names in new_identifiers.items() if len(names) > 1)
+            changed_idrs = set(idr for idr in identifiers if old_identifiers.get(idr, []) != \
+                                self._rank_entities(new_identifiers.get(idr, []), ISA_relations, positions))
+
+            # the relations referencing them, or having them as an attribute
+            dependents = set([])
+            for idr in changed_idrs:
+                dependents.update(self._referencing_index.get(idr, ()))
+                if len(idr) == 1:
+                    dependents.update(self._attribute_index.get(min(idr), ()))
+            dependents.difference_update(affected)
+            if not dependents:
+                break
+            affected |= self._component_closure(dependents)
+
+        self._merge_subset(sub, affected | edited)
+
+        # relationships and mixed relations see the identifiers of all Entities
+        self._index_identifiers(positions=positions)
+        sub._identifier_index    = self._identifier_index
+        sub._identifier_rank     = self._identifier_rank
+        sub._identifier_position = self._identifier_position
+        sub._identify_mixed_relations()
+        sub._identify_relationships()
+        self._merge_subset(sub, affected | edited)
+        self._order_relationships()
+        if self._stats is not None:
+            self._stats.merge(sub._stats)
+
+        if self._cache is not None:
+            self._cache.put(self._cache.digest(self._relations.values(), [self._fkey_targets]),
+                            self._entity_fragment_list(), self._relationship_fragment_list())
+
+        return affected
+
+    @staticmethod
+    def diff(old_relations, new_relations):
+        ''' Return (added, removed, changed) of two dicts of name -> Relation
+            as taken by apply
+        '''
+        added   = [R for name, R in new_relations.items() if name not in old_relations]
+        removed = [name for name in old_relations if name not in new_relations]
+        changed = [R for name, R in new_relations.items() if name in old_relations and \
+                    relation_signature(R) != relation_signature(old_relations[name])]
+        return added, removed, changed
+
+    def _components(self):
+        ''' the IND-graph components of the schema, largest first '''
+
+        # union-find of the relations, joined by every IND
+        root = dict((name, name) for name in self._relations)
+
+        def find(name):
+            top = name
+            while root[top] != top:
+                top = root[top]
+            while root[name] != top:
+                root[name], name = top, root[name]
+            return top
+
+        for name, R in self._relations.items():
+            if R.fkeys is None:
+                continue
+            for fk in R.fkeys.values():
+                if fk.refed_relation in root:
+                    a, b = find(name), find(fk.refed_relation)
+                    if a != b:
+                        root[a] = b
+
+        components = {}
+        for name in self._relations:
+            components.setdefault(find(name), set([])).add(name)
+        return sorted(components.values(), key=len, reverse=True)
+
+    @staticmethod
+    def _balance(components, count):
+        ''' split components, largest first, into at most count groups
+            of about the same number of relations
+        '''
+        groups = [[] for _ in range(count)]
+        sizes  = [0] * count
+        for component in components:
+            i = sizes.index(min(sizes))
+            groups[i].append(component)
+            sizes[i] += len(component)
+        return [group for group in groups if group]
+
+    @staticmethod
+    def _receive(conn):
+        ''' receive a message of a worker, raise the exception it failed with '''
+        message = conn.recv()
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+    def _serve_components(self, group, conn):
+        ''' Translate the components of group in a worker process
+
+            The worker is forked by _translate_components once the relations
+            are partitioned, and talks to it over conn:
+            (1) sends the core, IDD, comp and ISA relations, the E-type
+                relations left and the identifier of each Entity
+            (2) receives the identifier index of the whole schema
+            (3) sends the Entities and the Relationships, with the relation
+                each Relationship is found from, their JSON, the unassigned
+                relations and the TranslationStats of the worker (None
+                without timings)
+        '''
+        try:
+            subs = [self._translate_subset(names) for names in group]
+
+            core, IDD, comp, ISA, left, identifiers = set([]), {}, {}, {}, set([]), {}
+            for sub in subs:
+                core.update(sub._core_relations)
+                IDD.update(sub._IDD_relations)
+                comp.update(sub._comp_relations)
+                ISA.update(sub._ISA_relations)
+                left.update(sub._E_relations_left)
+                identifiers.update((name, ent.identifier.elements) for name, ent in sub._entities.items())
+            conn.send((core, IDD, comp, ISA, left, identifiers))
+
+            idr_index, idr_rank, idr_position = cPickle.loads(conn.recv_bytes())
+
+            entities, relationships, unassigned = {}, [], []
+            entity_fragments, relationship_fragments = {}, []
+            stats = TranslationStats() if self._stats is not None else None
+            for sub in subs:
+                sub._identifier_index    = idr_index
+                sub._identifier_rank     = idr_rank
+                sub._identifier_position = idr_position
+                sub._identify_mixed_relations()
+                sub._identify_relationships()
+
+                # the JSON is encoded here too, in parallel
+                for name, ent in sub._entities.items():
+                    entities[name] = ent
+                    entity_fragments[name] = sub._entity_fragment(ent)
+                for rel, origin in zip(sub._relationships, sub._relationship_origins):
+                    relationships.append((rel, origin))
+                    relationship_fragments.append(sub._relationship_fragment(rel))
+                unassigned.extend(R.name for R in sub._unassigned_relations)
+                if stats is not None:
+                    stats.merge(sub._stats)
+
+            conn.send((entities, relationships, entity_fragments, relationship_fragments,
+                       unassigned, stats))
+
+        except Exception as e:
+            try:
+                conn.send(e)
+            except Exception:
+                conn.send(RuntimeError(traceback.format_exc()))
+        finally:
+            conn.close()
+
+    @phase('translate_components')
+    def _translate_components(self):
+        ''' Translate the IND-graph components of the schema in worker processes
+
+            A component is translated the same whether alone or not, except
+            for the identifiers, which are looked up among all Entities.
+            Each worker builds the Entities of its components, the identifier
+            index of all of them is sent back to the workers, which then find
+            the Relationships. The results of the workers are merged in name
+            order, as the passes visit the relations, so the ER model and the
+            JSON are the same as those of the serial translation. The phases
+            timed in the workers are added to stats, so with timings the
+            phases add up to more than the wall time of translate_components.
+
+            Return False, with nothing translated, if the schema has a single
+            component.
+        '''
+
+        components = self._components()
+        if len(components) < 2:
+            return False
+
+        workers = []
+        try:
+            for group in self._balance(components, self._processes):
+                conn, worker_conn = Pipe()
+                worker = Process(target=self._serve_components, args=(group, worker_conn))
+                worker.daemon = True
+                worker.start()
+                worker_conn.close()
+                workers.append((worker, conn))
+
+            core, IDD, comp, ISA, left, identifiers = set([]), {}, {}, {}, set([]), {}
+            for worker, conn in workers:
+                w_core, w_IDD, w_comp, w_ISA, w_left, w_identifiers = self._receive(conn)
+                core.update(w_core)
+                IDD.update(w_IDD)
+                comp.update(w_comp)
+                ISA.update(w_ISA)
+                left.update(w_left)
+                identifiers.update(w_identifiers)
+
+            self._core_relations = dict((name, self._relations[name]) for name in sorted(core))
+            self._IDD_relations  = dict(sorted(IDD.items()))
+            self._comp_relations = dict(sorted(comp.items()))
+            self._ISA_relations  = dict(sorted(ISA.items()))
+            self._index_identifiers(sorted(identifiers.items()))
+            # pickled once for all workers
+            index = cPickle.dumps((self._identifier_index, self._identifier_rank,
+                                   self._identifier_position), cPickle.HIGHEST_PROTOCOL)
+            for worker, conn in workers:
+                conn.send_bytes(index)
+
+            entities, relationships, unassigned = {}, [], set([])
+            for worker, conn in workers:
+                w_entities, w_relationships, w_entity_fragments, w_relationship_fragments, \
+                    w_unassigned, w_stats = self._receive(conn)
+                entities.update(w_entities)
+                self._entity_fragments.update(w_entity_fragments)
+                for (rel, origin), fragment in zip(w_relationships, w_relationship_fragments):
+                    relationships.append((rel, origin))
+                    self._relationship_fragments[rel] = fragment
+                unassigned.update(w_unassigned)
+                if w_stats is not None:
+                    self._stats.merge(w_stats)
+
+            for worker, conn in workers:
+                worker.join()
+        except:
+            for worker, conn in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+            raise
+
+        self._entities = dict((name, entities[name]) for name in sorted(entities))
+        self._relationships = [rel for rel, origin in relationships]
+        self._relationship_origins = [origin for rel, origin in relationships]
+        self._E_relations_left.intersection_update(left)
+        self._unassigned_relations = [self._R_relations[name] for name in sorted(unassigned)]
+
+        return True
 
     def translate(self):
         ''' traslate Relations to ER model'''
 
+        if self._cache is not None:
+            digest = self._cache.digest(self._relations.values(), [self._fkey_targets])
+            cached = self._cache.get(digest)
+            if cached is not None:
+                # only the JSON is restored, not the intermediate ER model
+                self._json_fragments = cached
+                self._cache_hit = True
+                self._json_only = True
+                return
+
+        if self._compact:
+            names = NameTable()
+            for R in self._relations.values():
+                R.compact(names)
+
+        # index refed keys once per translation
+        self._index_refed_keys()
+
         # partition relations
         self._partition_relations()
-    
-        # Identify Entities 
-        self._identify_entities()
 
-        # Identity Relationships
-        self._identify_relationships()
+        if self._processes <= 1 or not self._translate_components():
+            # Identify Entities 
+            self._identify_entities()
+
+            # Identity Relationships
+            self._identify_relationships()
+
+        self._order_relationships()
+
+        if self._cache is not None:
+            # the fragments are shared with the cache, not joined
+            self._cache.put(digest, self._entity_fragment_list(), self._relationship_fragment_list())
 
 
     @property
     def entity_json(self):
-        ''' JSON representation of entities '''
+        ''' JSON representation of entities, by name '''
 
-        if self._entities is None:
+        if self._entities is None and not self._json_only:
             self.translate()
     
-        if self._entities is not None and self._entity_json is None:
+        if self._entity_json is None:
 
-            entities = []
-            for ent in self._entities.values():
-                ent_dict   = {'name': ent.name, 'type': repr_entity_type(ent.entity_type)}
+            # the same as json.dumps of the list of entities
+            fragments = self._entity_fragment_list()
+            if fragments is not None:
+                self._entity_json = '[' + ', '.join(fragments) + ']'
 
-                identifier = ent.identifier.to_dict()
-                ent_dict.update({'identifier': identifier})
+        return self._entity_json
 
-                attributes = [attr.to_dict() for attr in ent.attributes.values()]
-                ent_dict.update({'attributes': attributes})
-                entities.append(ent_dict)
-            
-            self._entity_json = json.dumps(entities)
+    def _entity_fragment_list(self):
+        ''' the JSON fragments of the entities in output order, None if there
+            is no translation
+        '''
 
-        return self._entity_json
+        if self._json_only:
+            return self._json_fragments[0]
+        if self._entities is None:
+            return None
+        return [self._entity_fragment(ent) for ent in self._ordered_entities()]
+
+    def _entity_fragment(self, ent):
+        ''' JSON representation of a single entity, kept until ent changes '''
+
+        if ent.name not in self._entity_fragments:
+            self._entity_fragments[ent.name] = self._encode_entity(ent)
+        return self._entity_fragments[ent.name]
+
+    @staticmethod
+    def _encode_entity(ent):
+        ''' JSON representation of a single entity '''
+        return json.dumps(Translator._entity_dict(ent))
+
+    @staticmethod
+    def _entity_dict(ent):
+        ''' dict representation of a single entity '''
+
+        ent_dict   = {'name': ent.name, 'type': repr_entity_type(ent.entity_type)}
+
+        identifier = ent.identifier.to_dict()
+        ent_dict.update({'identifier': identifier})
+
+        attributes = [attr.to_dict() for attr in Translator._ordered_attributes(ent.attributes)]
+        ent_dict.update({'attributes': attributes})
+
+        return ent_dict
 
     @property
     def relationship_json(self):
-        ''' JSON representation of relatonships '''
+        ''' JSON representation of relatonships, see _relationship_key '''
 
-        if self._entities is None:
+        if self._entities is None and not self._json_only:
+            self.translate()
+
+        if self._relationship_json is None:
+
+            # the same as json.dumps of the list of relationships
+            fragments = self._relationship_fragment_list()
+            if fragments is not None:
+                self._relationship_json = '[' + ', '.join(fragments) + ']'
+
+        return self._relationship_json
+
+    def _relationship_fragment_list(self):
+        ''' the JSON fragments of the relationships in output order, as
+            _entity_fragment_list
+        '''
+
+        if self._json_only:
+            return self._json_fragments[1]
+        if self._relationships is None:
+            return None
+        return [self._relationship_fragment(rel) for rel in self._relationships]
+
+    def _relationship_fragment(self, rel):
+        ''' JSON representation of a single relationship, kept until rel changes '''
+
+        if rel not in self._relationship_fragments:
+            self._relationship_fragments[rel] = self._encode_relationship(rel)
+        return self._relationship_fragments[rel]
+
+    @staticmethod
+    def _encode_relationship(rel):
+        ''' JSON representation of a single relationship '''
+        return json.dumps(Translator._relationship_dict(rel))
+
+    @staticmethod
+    def _relationship_dict(rel):
+        ''' dict representation of a single relationship '''
+
+        rel_dict = {'name': rel.name, 'type': repr_relationship_type(rel.relationship_type)}
+        # TODO
+        '''
+        if rel.relationship_type != RelationshipType.regular:
+            ent_names = rel.entities.keys()
+            first = entity_names[0]
+
+        else:
+            entities
+        '''
+        pat_entities = [{'name': ent, 'cardinality': card} for ent, card in sorted(rel.entities.items())]
+        rel_dict.update({'participating_entities': pat_entities})
+
+        if rel.attributes:
+            attributes = [attr.to_dict() for attr in Translator._ordered_attributes(rel.attributes)]
+            rel_dict.update({'attributes': attributes})
+
+        return rel_dict
+
+    def entity_dicts(self):
+        ''' the entities of entity_json as dicts, one at a time '''
+
+        if self._entities is None and not self._json_only:
             self.translate()
 
-        if self._relationships is not None and self._relationship_json is None:
+        if self._entities is not None and not self._json_only:
+            for ent in self._ordered_entities():
+                yield self._entity_dict(ent)
+        elif self._json_only:
+            for fragment in self._json_fragments[0]:
+                yield json.loads(fragment)
+
+    def relationship_dicts(self):
+        ''' the relationships of relationship_json as dicts, one at a time '''
+
+        if self._entities is None and not self._json_only:
+            self.translate()
 
-            relationships = []
+        if self._relationships is not None and not self._json_only:
             for rel in self._relationships:
-                rel_dict = {'name': rel.name, 'type': repr_relationship_type(rel.relationship_type)}
-                # TODO
-                '''
-                if rel.relationship_type != RelationshipType.regular:
-                    ent_names = rel.entities.keys()
-                    first = entity_names[0]
+                yield self._relationship_dict(rel)
+        elif self._json_only:
+            for fragment in self._json_fragments[1]:
+                yield json.loads(fragment)
 
-                else:
-                    entities
-                '''
-                pat_entities = [{'name': ent, 'cardinality': card} for ent, card in rel.entities.items()]
-                rel_dict.update({'participating_entities': pat_entities})
+    @staticmethod
+    def _write_array(outf, fragments):
+        ''' write the JSON array of fragments to outf, one at a time '''
+        outf.write('[')
+        for i, fragment in enumerate(fragments):
+            if i:
+                outf.write(', ')
+            outf.write(fragment)
+        outf.write(']')
+
+    def write_entity_json(self, outf):
+        ''' Write entity_json to the file object outf
+
+            The entities are encoded one at a time, without building the
+            whole JSON in memory, unless it is already there. An empty list
+            is written if there is no entity.
+        '''
 
-                if rel.attributes:
-                    attributes = [attr.to_dict() for attr in rel.attributes.values()]
-                    rel_dict.update({'attributes': attributes})
+        if self._entities is None and not self._json_only:
+            self.translate()
 
-                relationships.append(rel_dict)
+        if self._entity_json is not None:
+            outf.write(self._entity_json)
+        elif self._json_only:
+            self._write_array(outf, self._json_fragments[0])
+        elif self._entities is None:
+            outf.write('[]')
+        else:
+            fragments = self._entity_fragments
+            self._write_array(outf, (fragments[ent.name] if ent.name in fragments else self._encode_entity(ent) \
+                                        for ent in self._ordered_entities()))
 
-            self._relationship_json = json.dumps(relationships)
+    def write_relationship_json(self, outf):
+        ''' Write relationship_json to the file object outf, as write_entity_json '''
 
-        return self._relationship_json
+        if self._entities is None and not self._json_only:
+            self.translate()
+
+        if self._relationship_json is not None:
+            outf.write(self._relationship_json)
+        elif self._json_only:
+            self._write_array(outf, self._json_fragments[1])
+        elif self._relationships is None:
+            outf.write('[]')
+        else:
+            fragments = self._relationship_fragments
+            self._write_array(outf, (fragments[rel] if rel in fragments else self._encode_relationship(rel) \
+                                        for rel in self._relationships))
+
+
+    @property
+    def peak_memory(self):
+        ''' Peak resident memory of the process in bytes, None if unknown '''
+        return peak_memory()
+
+    @property
+    def from_cache(self):
+        ''' whether the JSON was served from the cache '''
+        return self._cache_hit
 
+    @property
+    def stats(self):
+        ''' TranslationStats of the phases of the translations, None unless
+            the Translator was made with timings
+        '''
+        return self._stats
+
+    @property
+    def has_model(self):
+        ''' whether the ER model is available, not only its JSON
+            (not after a cache hit)
+        '''
+        return self._entities is not None and not self._json_only
 
     @property
     def core_relations(self):
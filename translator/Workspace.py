@@ -0,0 +1,108 @@
+#!/usr/bin/python
+
+import os
+import re
+import time
+import shutil
+
+# upload IDs are 32 hex digits, as upload/upload_file.php makes them,
+# so an ID can never name a path outside of the workspace roots
+UPLOAD_ID_RE = re.compile(r'[0-9a-f]{32}\Z')
+
+# workspaces not used for this many seconds are removed
+WORKSPACE_TTL = 24 * 3600
+
+# the name of the uploaded schema in its workspace
+SCHEMA_FILE = 'database.txt'
+
+
+def valid_upload_id(upload_id):
+    ''' whether upload_id is an upload ID '''
+    return upload_id is not None and UPLOAD_ID_RE.match(upload_id) is not None
+
+
+class Workspace(object):
+    ''' The files of the translation of one upload
+
+        The schema uploaded is kept in upload_root/<upload ID>/ and the JSON
+        of its translation is written to render_root/<upload ID>/, where the
+        renderer finds it given the ID. Requests for different uploads share
+        no file, so they can be translated at the same time.
+    '''
+
+    def __init__(self, upload_id, upload_root, render_root):
+        if not valid_upload_id(upload_id):
+            raise ValueError('Invalid upload ID: {}'.format(upload_id))
+        self._upload_id  = upload_id
+        self._input_dir  = os.path.join(upload_root, upload_id)
+        self._output_dir = os.path.join(render_root, upload_id)
+
+    @property
+    def upload_id(self):
+        return self._upload_id
+
+    @property
+    def input_dir(self):
+        return self._input_dir
+
+    @property
+    def output_dir(self):
+        ''' directory the translation is written to '''
+        return self._output_dir
+
+    @property
+    def schema_file(self):
+        ''' the schema uploaded '''
+        return os.path.join(self._input_dir, SCHEMA_FILE)
+
+    def create(self):
+        ''' Make the directories of the workspace and mark it as used '''
+        for dirname in (self._input_dir, self._output_dir):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                if not os.path.isdir(dirname):
+                    raise
+        self.touch()
+
+    def touch(self):
+        ''' Mark the workspace as used now, it is evicted WORKSPACE_TTL later '''
+        for dirname in (self._input_dir, self._output_dir):
+            if os.path.isdir(dirname):
+                os.utime(dirname, None)
+
+    def last_used(self):
+        ''' time the workspace was last used, None if it does not exist '''
+        times = [os.stat(dirname).st_mtime for dirname in (self._input_dir, self._output_dir) \
+                    if os.path.isdir(dirname)]
+        return max(times) if times else None
+
+    def remove(self):
+        ''' Remove the workspace and all its files '''
+        for dirname in (self._input_dir, self._output_dir):
+            shutil.rmtree(dirname, ignore_errors=True)
+
+
+def evict_workspaces(upload_root, render_root, ttl=WORKSPACE_TTL, now=None):
+    ''' Remove the workspaces not used for ttl seconds, return their IDs
+
+        Only the directories named by an upload ID are looked at, the other
+        files of upload_root and render_root are left alone.
+    '''
+
+    now = time.time() if now is None else now
+    upload_ids = set()
+    for root in (upload_root, render_root):
+        try:
+            upload_ids.update(name for name in os.listdir(root) if valid_upload_id(name))
+        except OSError:
+            pass
+
+    evicted = []
+    for upload_id in sorted(upload_ids):
+        workspace = Workspace(upload_id, upload_root, render_root)
+        last_used = workspace.last_used()
+        if last_used is not None and now - last_used > ttl:
+            workspace.remove()
+            evicted.append(upload_id)
+    return evicted
@@ -0,0 +1,290 @@
+#!/usr/bin/python
+
+import os
+import sys
+import glob
+import json
+import fnmatch
+import time
+import hashlib
+import argparse
+
+from multiprocessing import Pool
+
+from SchemaValidator import read_validated_schema
+from Translator import Translator
+from OutputWriter import write_translation, write_bundle
+
+# the name of the resume log kept in the output directory
+STATE_FILE = '.translate_state'
+
+ENTITY_OUTFILE       = 'entity_json.txt'
+RELATIONSHIP_OUTFILE = 'relationship_json.txt'
+BUNDLE_OUTFILE       = 'erd_bundle.json'
+
+GLOB_CHARS = '*?['
+
+
+def file_digest(path):
+    ''' sha1 of the content of path '''
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as inf:
+        for block in iter(lambda: inf.read(1 << 16), ''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def glob_root(pattern):
+    ''' the directory of pattern before its first glob component '''
+    parts = []
+    for part in os.path.normpath(pattern).split(os.sep):
+        if any(c in part for c in GLOB_CHARS):
+            break
+        parts.append(part)
+    else:
+        # not a glob, the file itself
+        parts = parts[:-1]
+    return os.sep.join(parts) or os.curdir
+
+def schema_key(root, relpath):
+    ''' the path of a schema under root as a relative path of the output tree
+
+        The input root is kept, so schemas of the same relative path under
+        two inputs do not meet, and so is the extension, so x.txt and x.sql
+        do not either. Absolute roots lose their leading separator and a
+        parent directory component becomes '__'.
+    '''
+    path  = os.path.normpath(os.path.join(root, relpath))
+    path  = os.path.splitdrive(path)[1].lstrip(os.sep + (os.altsep or ''))
+    parts = ['__' if part == os.pardir else part for part in path.split(os.sep)]
+    return os.path.join(*parts)
+
+def find_schemas(inputs, pattern):
+    ''' Return a list of (path, key) of the schema files of inputs
+
+        An input is a directory, searched recursively for files matching
+        pattern, or a glob of files. The key is the path of the file under
+        the directory or the glob's leading directory, that directory
+        included (see schema_key), and is mirrored in the output tree.
+        A file found by two inputs is translated once.
+    '''
+    schemas, seen = [], set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for dirpath, dirnames, filenames in os.walk(item):
+                dirnames.sort()
+                for filename in sorted(fnmatch.filter(filenames, pattern)):
+                    path = os.path.join(dirpath, filename)
+                    key  = schema_key(item, os.path.relpath(path, item))
+                    if key not in seen:
+                        seen.add(key)
+                        schemas.append((path, key))
+        else:
+            root = glob_root(item)
+            for path in sorted(glob.glob(item)):
+                key = schema_key(root, os.path.relpath(path, root))
+                if os.path.isfile(path) and key not in seen:
+                    seen.add(key)
+                    schemas.append((path, key))
+    return schemas
+
+def output_dir(output_root, key):
+    ''' the directory of the outputs of the schema of key '''
+    return os.path.join(output_root, key)
+
+def has_outputs(outdir, bundle):
+    ''' whether all the outputs are in outdir '''
+    outfiles = [ENTITY_OUTFILE, RELATIONSHIP_OUTFILE] + ([BUNDLE_OUTFILE] if bundle else [])
+    return all(os.path.exists(os.path.join(outdir, outfile)) for outfile in outfiles)
+
+
+def translate_file(task):
+    ''' Translate one schema file, run in the worker processes
+
+        task is (path, key, outdir, sha1, bundle), sha1 is the digest of
+        the last translation of path or None, bundle whether to write the
+        bundle too. Returns a dict of the result.
+    '''
+    path, key, outdir, last_sha1, bundle = task
+    start  = time.time()
+    result = {'path': key}
+    try:
+        stat = os.stat(path)
+        result.update({'mtime': stat.st_mtime, 'size': stat.st_size})
+        result['sha1'] = file_digest(path)
+        if result['sha1'] == last_sha1 and has_outputs(outdir, bundle):
+            # touched but not changed, and the outputs are still there
+            result['status'] = 'unchanged'
+            return result
+
+        # the lines skipped are counted, not printed
+        relations, diagnostics = read_validated_schema(path)
+
+        translator = Translator(relations.values())
+        translator.translate()
+
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir)
+        write_translation(translator, os.path.join(outdir, ENTITY_OUTFILE),
+                          os.path.join(outdir, RELATIONSHIP_OUTFILE))
+        if bundle:
+            write_bundle(translator, os.path.join(outdir, BUNDLE_OUTFILE))
+
+        result.update({'status': 'ok', 'relations': len(relations),
+                       'warnings': len(diagnostics)})
+    except Exception as e:
+        result.update({'status': 'failed', 'error': '{}: {}'.format(type(e).__name__, e)})
+    finally:
+        result['seconds'] = time.time() - start
+    return result
+
+
+class BatchState(object):
+    ''' The record of the schema files translated into an output tree
+
+        Kept as a log of JSON lines, one per file translated, so a run
+        interrupted at any point resumes with the files not yet logged.
+        The last line of a file wins.
+    '''
+
+    def __init__(self, path):
+        self._path    = path
+        self._records = {}
+        if os.path.exists(path):
+            with open(path) as inf:
+                for line in inf:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a line cut short by an interruption
+                        continue
+                    self._records[record['path']] = record
+        self._log = None
+
+    def is_current(self, path, key, outdir):
+        ''' whether the outputs of path are those of its content '''
+        record = self._records.get(key)
+        if record is None or record.get('status') != 'ok':
+            return False
+        stat = os.stat(path)
+        return stat.st_mtime == record['mtime'] and stat.st_size == record['size']
+
+    def last_digest(self, key):
+        ''' sha1 of the last successful translation of the schema of key '''
+        record = self._records.get(key)
+        if record is None or record.get('status') != 'ok':
+            return None
+        return record['sha1']
+
+    def record(self, result):
+        ''' log the result of translate_file '''
+        if result['status'] == 'unchanged':
+            # the outputs are still those of the recorded translation
+            result = dict(self._records[result['path']], mtime=result['mtime'], size=result['size'])
+        elif result['status'] != 'ok':
+            return
+        self._records[result['path']] = result
+
+        if self._log is None:
+            self._log = open(self._path, 'a')
+        self._log.write(json.dumps(result) + '\n')
+        self._log.flush()
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+def print_report(results, skipped, seconds, max_failures=20):
+    ''' print throughput and failures of a batch '''
+
+    done      = [r for r in results if r['status'] == 'ok']
+    unchanged = [r for r in results if r['status'] == 'unchanged']
+    failed    = [r for r in results if r['status'] == 'failed']
+    relations = sum(r['relations'] for r in done)
+
+    print('Translated {} files ({} relations), {} unchanged, {} failed in {:.2f}s'.format(
+                len(done), relations, len(unchanged) + skipped, len(failed), seconds))
+    if done and seconds > 0:
+        print('Throughput: {:.1f} files/s, {:.0f} relations/s'.format(
+                    len(done) / seconds, relations / seconds))
+    if done:
+        slowest = max(done, key=lambda r: r['seconds'])
+        print('Slowest: {} ({:.2f}s)'.format(slowest['path'], slowest['seconds']))
+    warnings = sum(r['warnings'] for r in done)
+    if warnings:
+        print('Schema diagnostics: {}, see translate.py -k'.format(warnings))
+    if failed:
+        print('Failures:')
+        for r in failed[:max_failures]:
+            print('    {}: {}'.format(r['path'], r['error']))
+        if len(failed) > max_failures:
+            print('    ... and {} more'.format(len(failed) - max_failures))
+
+
+def parse_arguments():
+    ''' parse command line arguments '''
+
+    parser = argparse.ArgumentParser(
+                description=
+                '''
+                Translate many schema files, writing the JSON of each to a
+                mirrored output tree. Files translated before and not changed
+                since are skipped, so an interrupted batch resumes where it
+                stopped.
+                ''')
+    parser.add_argument('inputs', nargs='+',
+                        help='directories of schema files or globs of them (quote the glob)')
+    parser.add_argument('-o', '--output_dir', help='root of the output tree', required=True)
+    parser.add_argument('-p', '--pattern',
+                        help='filename pattern of schema files in directories', default='*.txt')
+    parser.add_argument('-w', '--workers', help='number of translation processes',
+                        type=int, default=None)
+    parser.add_argument('-f', '--force', help='translate unchanged files again', action="store_true")
+    parser.add_argument('-b', '--bundle', help='also write the compact bundle of each schema',
+                        action="store_true")
+
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == '__main__':
+
+    args  = parse_arguments()
+    start = time.time()
+
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    state = BatchState(os.path.join(args.output_dir, STATE_FILE))
+
+    tasks, skipped = [], 0
+    for path, key in find_schemas(args.inputs, args.pattern):
+        outdir = output_dir(args.output_dir, key)
+        if args.force or not has_outputs(outdir, args.bundle):
+            last_sha1 = None
+        elif state.is_current(path, key, outdir):
+            skipped += 1
+            continue
+        else:
+            last_sha1 = state.last_digest(key)
+        tasks.append((path, key, outdir, last_sha1, args.bundle))
+
+    print('{} schema files to translate, {} up to date'.format(len(tasks), skipped))
+
+    results = []
+    pool = Pool(args.workers)
+    try:
+        # small chunks keep the log close to the work done
+        for result in pool.imap_unordered(translate_file, tasks, chunksize=4):
+            results.append(result)
+            state.record(result)
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        print('Interrupted, run again to resume.')
+    finally:
+        pool.join()
+        state.close()
+
+    print_report(results, skipped, time.time() - start)
+    sys.exit(1 if any(r['status'] == 'failed' for r in results) else 0)
@@ -0,0 +1,263 @@
+#!/usr/bin/python
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import StringIO
+import subprocess
+
+from ClassDfn import NameTable
+from SchemaParser import read_schema
+from SchemaGenerator import SchemaGenerator
+from Translator import Translator
+from TranslationStats import TranslationStats
+
+# version of the results file format
+RESULTS_VERSION = 2
+
+# the peak memory of a translation is at least this many times less in
+# low-memory mode, for generated schemas of MEMORY_TARGET_RELATIONS
+# relations or more
+MEMORY_TARGET = 3.0
+MEMORY_TARGET_RELATIONS = 100000
+
+# the phases of a translation in the order they run, see TranslationStats
+PHASES = ['read_inputs',
+          'index_refed_keys',
+          'partition_relations',
+          'encode_attributes',
+          'find_core_relations',
+          'index_fkey_targets',
+          'find_IDD_relations',
+          'find_comp_relations',
+          'find_ISA_relations',
+          'build_entities',
+          'index_identifiers',
+          'identify_mixed_relations',
+          'identify_relationships',
+          'combine_relationship',
+          'entity_json',
+          'relationship_json']
+
+
+def time_translation(schema_file, processes=1, bitsets=False):
+    ''' Read and translate schema_file in processes, return (relations, times
+        of the phases); times['wall'] is the wall time of the translation,
+        less than the phases together when worker processes ran
+    '''
+
+    reading = TranslationStats()
+
+    # keep the messages of skipped lines out of the report
+    stdout, sys.stdout = sys.stdout, StringIO.StringIO()
+    try:
+        relations = reading.time('read_inputs', read_schema, schema_file)
+    finally:
+        sys.stdout = stdout
+
+    start = time.time()
+    translator = Translator(relations.values(), timings=True, processes=processes, bitsets=bitsets)
+    translator.translate()
+
+    stats = translator.stats
+    for phase in ('entity_json', 'relationship_json'):
+        stats.time(phase, getattr, translator, phase)
+
+    times = dict((phase, stats.seconds(phase)) for phase in PHASES)
+    times['read_inputs'] = reading.seconds('read_inputs')
+    times['wall'] = time.time() - start
+    return len(relations), times
+
+def translation_peak(schema_file, compact=False):
+    ''' Read and translate schema_file and write its JSON, in low-memory
+        mode if compact, return the peak memory of the process in bytes
+    '''
+
+    stdout, sys.stdout = sys.stdout, StringIO.StringIO()
+    try:
+        relations = read_schema(schema_file, NameTable() if compact else None)
+    finally:
+        sys.stdout = stdout
+
+    translator = Translator(relations.values(), compact=compact)
+    translator.translate()
+    with open(os.devnull, 'w') as outf:
+        translator.write_entity_json(outf)
+        translator.write_relationship_json(outf)
+    return translator.peak_memory
+
+def measure_memory(schema_file):
+    ''' Peak memory in bytes of translation_peak of schema_file in a
+        process of its own, {'plain': ..., 'compact': ..., 'ratio': plain / compact}
+    '''
+
+    memory = {}
+    for mode in ('plain', 'compact'):
+        code = 'import sys; sys.path.insert(0, {!r}); import benchmark; ' \
+               'print(benchmark.translation_peak({!r}, {!r}))'.format(
+                   os.path.dirname(os.path.abspath(__file__)), schema_file, mode == 'compact')
+        memory[mode] = int(subprocess.check_output([sys.executable, '-c', code]))
+    memory['ratio'] = float(memory['plain']) / memory['compact']
+    return memory
+
+def run_benchmark(name, schema_file, repeat, params=None, processes=1, bitsets=False):
+    ''' Best and mean time of each phase over repeat translations '''
+
+    samples = []
+    for i in range(repeat):
+        relations, times = time_translation(schema_file, processes, bitsets)
+        samples.append(times)
+
+    best = dict((phase, min(s[phase] for s in samples)) for phase in PHASES)
+    mean = dict((phase, sum(s[phase] for s in samples) / repeat) for phase in PHASES)
+    return {'name': name,
+            'params': params,
+            'relations': relations,
+            'processes': processes,
+            'best': best,
+            'mean': mean,
+            'total': min(sum(s[phase] for phase in PHASES) for s in samples),
+            'wall': min(s['wall'] + s['read_inputs'] for s in samples)}
+
+
+def print_run(run, baseline=None):
+    ''' print the phases of run, and the ratios to baseline if given '''
+
+    print('{} ({} relations)'.format(run['name'], run['relations']))
+    for phase in PHASES + ['total']:
+        seconds = run['total'] if phase == 'total' else run['best'][phase]
+        line = '    {:<28}{:>10.4f}s'.format(phase, seconds)
+        if baseline is not None:
+            old = baseline['total'] if phase == 'total' else baseline['best'].get(phase)
+            if old:
+                line += '{:>10.4f}s  x{:.2f}'.format(old, seconds / old)
+        print(line)
+    if run.get('processes', 1) > 1:
+        print('    {:<28}{:>10.4f}s  in {} processes'.format('wall', run['wall'], run['processes']))
+    if run.get('memory'):
+        memory = run['memory']
+        print('    {:<28}{:>10.1f}MB{:>10.1f}MB  x{:.2f} less compacted'.format(
+                'peak memory', memory['compact'] / 1048576.0, memory['plain'] / 1048576.0,
+                memory['ratio']))
+
+def compare(baseline_file, results):
+    ''' print results against the runs of the same name in baseline_file '''
+
+    with open(baseline_file) as inf:
+        baseline = json.load(inf)
+    old_runs = dict((run['name'], run) for run in baseline['runs'])
+
+    print('Compared with {} ({}), times new, old and new/old:'.format(baseline_file, baseline['date']))
+    for run in results['runs']:
+        if run['name'] in old_runs:
+            print_run(run, old_runs[run['name']])
+        else:
+            print_run(run)
+
+
+def parse_arguments():
+    ''' parse command line arguments '''
+
+    parser = argparse.ArgumentParser(
+                description=
+                '''
+                Time each phase of the translation of generated schemas and of
+                schema files, and save the results as JSON to compare with
+                other runs.
+                ''')
+    parser.add_argument('schema_files', nargs='*', help='schema files to benchmark too')
+    parser.add_argument('-n', '--relations',
+                        help='comma separated relation counts of the generated schemas, none if empty',
+                        default='1000,5000')
+    parser.add_argument('--width', help='non-prime attributes of an entity', type=int, default=2)
+    parser.add_argument('--ind_density', help='share of relationships with a third IND',
+                        type=float, default=0.3)
+    parser.add_argument('--idd_depth', help='length of ID-dependency chains', type=int, default=1)
+    parser.add_argument('--isa_depth', help='depth of ISA hierarchies', type=int, default=1)
+    parser.add_argument('--many2many', help='share of all-key m:m relationships',
+                        type=float, default=0.2)
+    parser.add_argument('--components', help='share of entities with a component relation',
+                        type=float, default=0.5)
+    parser.add_argument('--chains', help='share of entities with IDD chains and ISA hierarchies',
+                        type=float, default=0.25)
+    parser.add_argument('--seed', help='seed of the generated schemas', type=int, default=0)
+    parser.add_argument('-j', '--processes', help='worker processes of each translation',
+                        type=int, default=1)
+    parser.add_argument('--bitsets', help='translate with attribute bitsets', action="store_true")
+    parser.add_argument('-m', '--memory',
+                        help='also measure the peak memory of each schema in low-memory mode and '
+                             'plain, and fail if low-memory mode misses its target on the '
+                             'generated schemas of {} relations or more'.format(MEMORY_TARGET_RELATIONS),
+                        action="store_true")
+    parser.add_argument('-r', '--repeat', help='translations of each schema, the best is kept',
+                        type=int, default=3)
+    parser.add_argument('-o', '--output', help='file the results are saved to',
+                        default='benchmark_results.json')
+    parser.add_argument('-s', '--schema_dir', help='directory the generated schemas are kept in',
+                        default=None)
+    parser.add_argument('-c', '--compare', help='results file of an earlier run to compare with',
+                        default=None)
+
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == '__main__':
+
+    args = parse_arguments()
+
+    results = {'version': RESULTS_VERSION,
+               'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'repeat': args.repeat,
+               'bitsets': args.bitsets,
+               'runs': []}
+
+    for count in [int(n) for n in args.relations.split(',') if n]:
+        generator = SchemaGenerator(count, args.width, args.ind_density, args.idd_depth,
+                                    args.isa_depth, args.many2many, args.components,
+                                    args.chains, args.seed)
+        if args.schema_dir:
+            schema_file = os.path.join(args.schema_dir, 'generated-{}.txt'.format(count))
+        else:
+            fd, schema_file = tempfile.mkstemp(suffix='.txt')
+            os.close(fd)
+        try:
+            generator.write(schema_file)
+            results['runs'].append(run_benchmark('generated-{}'.format(count), schema_file,
+                                                 args.repeat, generator.params, args.processes,
+                                                 args.bitsets))
+            if args.memory:
+                results['runs'][-1]['memory'] = measure_memory(schema_file)
+        finally:
+            if not args.schema_dir:
+                os.remove(schema_file)
+
+    for schema_file in args.schema_files:
+        results['runs'].append(run_benchmark(schema_file, schema_file, args.repeat,
+                                             processes=args.processes, bitsets=args.bitsets))
+        if args.memory:
+            results['runs'][-1]['memory'] = measure_memory(schema_file)
+
+    with open(args.output, 'w') as outf:
+        json.dump(results, outf, indent=2, sort_keys=True)
+        outf.write('\n')
+
+    if args.compare:
+        compare(args.compare, results)
+    else:
+        for run in results['runs']:
+            print_run(run)
+    print('Results saved to {}'.format(args.output))
+
+    missed = [run['name'] for run in results['runs'] if run.get('memory') and run['params'] and \
+                run['relations'] >= MEMORY_TARGET_RELATIONS and run['memory']['ratio'] < MEMORY_TARGET]
+    if missed:
+        print('The peak memory in low-memory mode is not {:.0f}x less on {}'.format(
+                MEMORY_TARGET, ', '.join(missed)))
+        sys.exit(1)
@@ -0,0 +1,235 @@
+#!/usr/bin/python
+
+import re
+import time
+import json
+import urlparse
+import traceback
+import argparse
+import threading
+import collections
+
+from multiprocessing import Pool
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+
+from TranslationStats import percentile
+from JobQueue import JobQueue, JobWorkers, QueueFull, MAX_QUEUED, translate_job
+
+# number of recent requests kept for the latency percentiles
+LATENCY_WINDOW = 1000
+
+# /jobs/ID and /jobs/ID/result
+JOB_PATH_RE = re.compile(r'/jobs/(?P<id>[0-9a-f]{32})(?P<result>/result)?$')
+
+
+def translate_schema(text):
+    ''' Translate the schema text
+        Returns (entity_json, relationship_json, diagnostics as JSON), the
+        keys and INDs skipped are in the diagnostics, see translate_job
+    '''
+    return translate_job(text)
+
+
+class TranslatorApp(object):
+    ''' WSGI application translating schemas posted to /translate
+
+        POST /translate   schema text in the body, returns
+                          {"entities": [...], "relationships": [...],
+                           "diagnostics": [...]}
+        GET  /stats       request count and p50/p99 latency in ms, and the
+                          stats of the job queue
+
+        With a JobQueue, a schema is also translated as a job which the
+        request does not wait for:
+
+        POST /jobs?priority=N   schema text in the body, returns {"id": ...}
+                                at once, 503 if the queue is full
+        GET  /jobs/ID           the status of the job, see JobQueue.status
+        GET  /jobs/ID/result    {"entities": [...], "relationships": [...],
+                                 "diagnostics": [...]} once the job is done
+    '''
+
+    def __init__(self, workers=0, queue=None):
+        # translation runs in a pool of warm worker processes,
+        # or in the request thread if workers is 0
+        self._pool = Pool(workers) if workers > 0 else None
+        self._queue = queue
+        self._lock = threading.Lock()
+        self._requests  = 0
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def translate(self, text):
+        ''' Translate text in the worker pool '''
+        if self._pool is None:
+            return translate_schema(text)
+        return self._pool.apply(translate_schema, (text,))
+
+    def close(self):
+        ''' Stop the worker pool '''
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+
+    @property
+    def stats(self):
+        ''' dict of request count and latency percentiles in ms '''
+        with self._lock:
+            latencies = list(self._latencies)
+            requests  = self._requests
+        stats = {'requests': requests,
+                 'p50_ms': percentile(latencies, 50),
+                 'p99_ms': percentile(latencies, 99)}
+        if self._queue is not None:
+            stats['queue'] = self._queue.stats
+        return stats
+
+    def _record(self, start):
+        with self._lock:
+            self._requests += 1
+            self._latencies.append((time.time() - start) * 1000.0)
+
+    def _read_body(self, environ):
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        return environ['wsgi.input'].read(length) if length > 0 else ''
+
+    def _handle_translate(self, environ):
+        text = self._read_body(environ)
+        if not text.strip():
+            return '400 Bad Request', json.dumps({'error': 'empty schema'})
+
+        try:
+            entity_json, relationship_json, diagnostics = self.translate(text)
+        except Exception:
+            # the details are for the log, not for the client
+            traceback.print_exc(file=environ['wsgi.errors'])
+            return '500 Internal Server Error', json.dumps({'error': 'translation failed'})
+
+        # the translator output is already JSON, splice it in as is
+        body = '{"entities": ' + entity_json + ', "relationships": ' + relationship_json + \
+               ', "diagnostics": ' + diagnostics + '}'
+        return '200 OK', body
+
+    def _handle_submit(self, environ):
+        text = self._read_body(environ)
+        if not text.strip():
+            return '400 Bad Request', json.dumps({'error': 'empty schema'})
+        query = urlparse.parse_qs(environ.get('QUERY_STRING', ''))
+        try:
+            priority = int(query.get('priority', ['0'])[0])
+        except ValueError:
+            return '400 Bad Request', json.dumps({'error': 'priority is not an integer'})
+
+        try:
+            job_id = self._queue.submit(text, priority)
+        except QueueFull as e:
+            return '503 Service Unavailable', json.dumps({'error': str(e)})
+        return '202 Accepted', json.dumps({'id': job_id})
+
+    def _handle_job(self, job_id, result):
+        job = self._queue.status(job_id)
+        if job is None:
+            return '404 Not Found', json.dumps({'error': 'no job ' + job_id})
+        if not result:
+            return '200 OK', json.dumps(job)
+        if job['status'] != 'done':
+            return '409 Conflict', json.dumps(job)
+
+        entity_json, relationship_json, diagnostics = self._queue.result(job_id)
+        body = '{"entities": ' + entity_json + ', "relationships": ' + relationship_json + \
+               ', "diagnostics": ' + diagnostics + '}'
+        return '200 OK', body
+
+    def __call__(self, environ, start_response):
+        start  = time.time()
+        method = environ.get('REQUEST_METHOD')
+        path   = environ.get('PATH_INFO', '')
+
+        if path == '/translate' and method == 'POST':
+            status, body = self._handle_translate(environ)
+            self._record(start)
+        elif path == '/stats' and method == 'GET':
+            status, body = '200 OK', json.dumps(self.stats)
+        elif path == '/jobs' and method == 'POST' and self._queue is not None:
+            status, body = self._handle_submit(environ)
+        elif JOB_PATH_RE.match(path) and method == 'GET' and self._queue is not None:
+            match = JOB_PATH_RE.match(path)
+            status, body = self._handle_job(match.group('id'), match.group('result') is not None)
+        else:
+            status, body = '404 Not Found', json.dumps({'error': 'not found'})
+
+        headers = [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))]
+        if status.startswith('503'):
+            # the queue is full, the client may submit again later
+            headers.append(('Retry-After', '1'))
+        start_response(status, headers)
+        return [body]
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    ''' WSGIServer handling each request in its own thread '''
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    ''' Request handler logging only when verbose '''
+    verbose = False
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            WSGIRequestHandler.log_message(self, format, *args)
+
+
+def parse_arguments():
+    ''' parse command line arguments '''
+
+    parser = argparse.ArgumentParser(
+                description=
+                '''
+                Serve the Translator over HTTP, POST a schema to /translate.
+                ''')
+    parser.add_argument('--host', help='interface to listen on', default='127.0.0.1')
+    parser.add_argument('-p', '--port', help='port to listen on', type=int, default=8421)
+    parser.add_argument('-w', '--workers',
+                        help='number of translation worker processes, 0 translates in the request thread',
+                        type=int, default=2)
+    parser.add_argument('-q', '--queue',
+                        help='SQLite file of the job queue, /jobs is not served without one',
+                        default=None)
+    parser.add_argument('-j', '--job_workers',
+                        help='number of worker processes running the jobs of the queue, 0 if others do',
+                        type=int, default=2)
+    parser.add_argument('--max_queued',
+                        help='number of jobs waiting at most, more are refused with 503',
+                        type=int, default=MAX_QUEUED)
+    parser.add_argument('-v', '--verbosity',
+                        help='log every request', action="store_true")
+
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == '__main__':
+
+    args = parse_arguments()
+
+    QuietHandler.verbose = args.verbosity
+    queue = JobQueue(args.queue, args.max_queued) if args.queue else None
+    job_workers = JobWorkers(args.queue, args.job_workers) if queue and args.job_workers > 0 else None
+    app = TranslatorApp(args.workers, queue)
+    httpd = make_server(args.host, args.port, app,
+                        server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+    print('Serving translator on http://{}:{}/translate with {} workers'.format(
+                args.host, args.port, args.workers))
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        app.close()
+        if job_workers is not None:
+            job_workers.close()
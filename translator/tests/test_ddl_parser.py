@@ -0,0 +1,83 @@
+#!/usr/bin/python
+
+'''
+    Relations read from DDL by DdlParser. Run from the translator folder:
+
+        python -m unittest discover tests
+'''
+
+import os
+import sys
+import unittest
+
+from StringIO import StringIO
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+from DdlParser import build_ddl_relations
+
+
+def relations(ddl):
+    return build_ddl_relations(StringIO(ddl))
+
+
+class DdlParserTest(unittest.TestCase):
+
+    def assertColumns(self, R, columns):
+        self.assertEqual(sorted(R.attributes), sorted(columns))
+
+    def test_columns_named_like_constraints(self):
+        R = relations('''CREATE TABLE t (id INT PRIMARY KEY, period TEXT, key TEXT,
+                                         check_no INT, "index" VARCHAR(10), check INT,
+                                         unique INT, `like` TEXT, spatial INT,
+                                         constraint TEXT NOT NULL);''')['t']
+        self.assertColumns(R, ['id', 'period', 'key', 'check_no', 'index', 'check',
+                               'unique', 'like', 'spatial', 'constraint'])
+        self.assertEqual(R.keys, set([frozenset(['id'])]))
+
+    def test_column_types_with_parentheses(self):
+        R = relations('''CREATE TABLE t (id INT, key VARCHAR(10), index DECIMAL(10, 2),
+                                         unique ENUM('a', 'b'), PRIMARY KEY (id));''')['t']
+        self.assertColumns(R, ['id', 'key', 'index', 'unique'])
+        self.assertEqual(R.keys, set([frozenset(['id'])]))
+
+    def test_constraints(self):
+        R = relations('''CREATE TABLE t (
+                             id INT, a INT, b INT, c INT, s DATE, e DATE,
+                             PRIMARY KEY (id),
+                             KEY ix_a (a),
+                             INDEX (b),
+                             UNIQUE KEY uk_ab (a, b),
+                             FULLTEXT KEY ft (c),
+                             KEY ix_c USING BTREE (c),
+                             CONSTRAINT ck CHECK (a > 0),
+                             CHECK (b > a),
+                             CONSTRAINT uq UNIQUE (c),
+                             UNIQUE NULLS NOT DISTINCT (s),
+                             EXCLUDE USING gist (s WITH &&),
+                             PERIOD FOR p (s, e));''')['t']
+        self.assertColumns(R, ['id', 'a', 'b', 'c', 's', 'e'])
+        self.assertEqual(R.keys, set([frozenset(['id']), frozenset(['a', 'b']),
+                                      frozenset(['c']), frozenset(['s'])]))
+
+    def test_like(self):
+        tables = relations('''CREATE TABLE p (id INT PRIMARY KEY);
+                              CREATE TABLE t (id INT PRIMARY KEY, LIKE p INCLUDING ALL);
+                              CREATE TABLE u (id INT PRIMARY KEY, LIKE public.p);
+                              CREATE TABLE v (id INT PRIMARY KEY, like TEXT);''')
+        self.assertColumns(tables['t'], ['id'])
+        self.assertColumns(tables['u'], ['id'])
+        self.assertColumns(tables['v'], ['id', 'like'])
+
+    def test_foreign_keys(self):
+        tables = relations('''CREATE TABLE p (id INT PRIMARY KEY);
+                              CREATE TABLE c (id INT PRIMARY KEY, key INT,
+                                              CONSTRAINT fk FOREIGN KEY (key) REFERENCES p (id));''')
+        fkeys = tables['c'].fkeys.values()
+        self.assertEqual([(fk.key, fk.refed_key, fk.refed_relation) for fk in fkeys],
+                         [(frozenset(['key']), frozenset(['id']), 'p')])
+
+
+if __name__ == '__main__':
+    unittest.main()
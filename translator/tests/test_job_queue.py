@@ -0,0 +1,111 @@
+#!/usr/bin/python
+
+'''
+    Jobs of a JobQueue, their leases and results. Run from the translator
+    folder:
+
+        python -m unittest discover tests
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+from JobQueue import JobQueue, JobWorkers, translate_job
+
+SCHEMA = 'A(a, b)\nA: (a)\n'
+
+
+class JobQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir  = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'jobs.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def queue(self, **kwargs):
+        return JobQueue(self.path, **kwargs)
+
+    def test_finish(self):
+        queue  = self.queue()
+        job_id = queue.submit(SCHEMA)
+        self.assertEqual(queue.claim('w1'), (job_id, SCHEMA))
+        self.assertIsNone(queue.claim('w2'))
+
+        result = translate_job(SCHEMA)
+        # only the worker holding the job stores its result
+        self.assertFalse(queue.finish(job_id, 'w2', *result))
+        self.assertTrue(queue.finish(job_id, 'w1', *result))
+        self.assertEqual(queue.result(job_id), result)
+        self.assertEqual(queue.status(job_id)['status'], 'done')
+        self.assertEqual(json.loads(result[0])[0]['name'], 'A')
+        # once done, not again
+        self.assertFalse(queue.fail(job_id, 'w1', 'error'))
+
+    def test_priority(self):
+        queue = self.queue()
+        low   = queue.submit(SCHEMA)
+        high  = queue.submit(SCHEMA, priority=1)
+        self.assertEqual(queue.status(low)['position'], 1)
+        self.assertEqual(queue.claim('w1')[0], high)
+        self.assertEqual(queue.claim('w1')[0], low)
+
+    def test_lease_expiry(self):
+        queue  = self.queue(lease_time=0.05)
+        job_id = queue.submit(SCHEMA)
+        queue.claim('w1')
+        self.assertTrue(queue.renew(job_id, 'w1'))
+        self.assertEqual(queue.requeue_expired(), 0)
+
+        time.sleep(0.1)
+        # the job of w1, say killed, is claimed by w2
+        self.assertEqual(queue.claim('w2'), (job_id, SCHEMA))
+        self.assertEqual(queue.status(job_id)['attempts'], 2)
+        self.assertFalse(queue.renew(job_id, 'w1'))
+        self.assertFalse(queue.fail(job_id, 'w1', 'error'))
+        self.assertTrue(queue.renew(job_id, 'w2'))
+
+        time.sleep(0.1)
+        # nor stored after the lease ran out, before the job is queued again
+        self.assertFalse(queue.finish(job_id, 'w2', *translate_job(SCHEMA)))
+        self.assertEqual(queue.requeue_expired(), 1)
+        self.assertEqual(queue.status(job_id)['status'], 'queued')
+
+    def test_max_attempts(self):
+        queue  = self.queue(lease_time=0.05, max_attempts=2)
+        job_id = queue.submit(SCHEMA)
+        for worker in ('w1', 'w2'):
+            self.assertEqual(queue.claim(worker)[0], job_id)
+            time.sleep(0.1)
+        self.assertIsNone(queue.claim('w3'))
+
+        status = queue.status(job_id)
+        self.assertEqual((status['status'], status['attempts']), ('failed', 2))
+        self.assertIn('2 times', status['error'])
+
+    def test_workers(self):
+        queue   = self.queue()
+        job_ids = [queue.submit(SCHEMA), queue.submit(SCHEMA, priority=1)]
+        workers = JobWorkers(self.path, 2, poll=0.01)
+        try:
+            deadline = time.time() + 30
+            while time.time() < deadline and queue.stats['jobs_done'] < 2:
+                time.sleep(0.01)
+        finally:
+            workers.close()
+        for job_id in job_ids:
+            self.assertEqual(queue.status(job_id)['status'], 'done')
+            self.assertEqual(queue.result(job_id), translate_job(SCHEMA))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+
+'''
+    Diagnostics of SchemaValidator and the relations built with them. Run
+    from the translator folder:
+
+        python -m unittest discover tests
+'''
+
+import os
+import sys
+import json
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+from SchemaValidator import Severity, build_validated_relations, validate_schema
+from Translator import Translator
+
+
+def messages(lines):
+    ''' (lineno, severity name, message) of the diagnostics of lines '''
+    return [(d.lineno, Severity.names[d.severity], d.message) for d in validate_schema(lines)]
+
+
+class SchemaValidatorTest(unittest.TestCase):
+
+    def test_valid(self):
+        with open(os.path.join(TESTS_DIR, 'data', 'database.txt')) as inf:
+            self.assertEqual(validate_schema(inf), [])
+
+    def test_no_key(self):
+        lines = ['B(b, c)']
+        self.assertEqual(messages(lines),
+                         [(1, 'warning', 'relation B has no key, it is keyed by all its attributes')])
+
+        # translated as it says
+        relations, diagnostics = build_validated_relations(lines)
+        self.assertEqual(relations['B'].keys, set([frozenset(['b', 'c'])]))
+        translator = Translator(relations.values())
+        translator.translate()
+        entities = json.loads(translator.entity_json)
+        self.assertEqual([(e['name'], sorted(e['identifier']['elements'])) for e in entities],
+                         [('B', ['b', 'c'])])
+
+    def test_key(self):
+        self.assertEqual(messages(['A(a, b)', 'A: (a, c)']),
+                         [(2, 'error', 'key (a, c) of A has attributes not in A: c')])
+        self.assertEqual(messages(['A: (a)', 'A(a)']),
+                         [(1, 'error', 'key skipped, relation A is defined after it, at line 2'),
+                          (2, 'warning', 'relation A has no key, it is keyed by all its attributes')])
+
+    def test_IND(self):
+        head = ['A(a)', 'A: (a)', 'B(b, c)', 'B: (b)']
+        self.assertEqual(messages(head + ['B(d) <= A(a)']),
+                         [(5, 'error', 'IND skipped, attributes not in B: d')])
+        self.assertEqual(messages(head + ['B(b, c) <= A(a)']),
+                         [(5, 'error', 'IND has 2 distinct attributes in B but 1 in A')])
+        self.assertEqual(messages(head + ['B(b) <= C(a)']),
+                         [(5, 'error', 'IND skipped, relation C is not defined')])
+        self.assertEqual(messages(head + ['A(a) <= B(c)']),
+                         [(5, 'warning', 'IND references (c) which is not a key of B')])
+        self.assertEqual(messages(head + ['B(b) <= A(a)', 'B(b) <= A(a)']),
+                         [(6, 'warning', 'IND replaces that of line 5 on the same attributes of B')])
+
+    def test_relation(self):
+        self.assertEqual(messages(['A(a, a)', 'A: (a)']),
+                         [(1, 'warning', 'relation A lists an attribute twice')])
+        self.assertEqual(messages(['A(a)', 'A(b)', 'A: (b)', 'not a line']),
+                         [(2, 'warning', 'relation A is defined again, the definition of line 1 '
+                                         'and its keys and INDs are dropped'),
+                          (4, 'warning', 'skipped, not a relation, IND or key')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,216 @@
+#!/usr/bin/python
+
+'''
+    Translations of the schemas of data/ checked against data/NAME.json,
+    the output of the original Translator for data/NAME.txt (with each
+    relationship once). Run from the translator folder:
+
+        python -m unittest discover tests
+'''
+
+import os
+import sys
+import json
+import random
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+from ClassDfn import MAX_EXACT_GROUP, Relation, ForeignKey, AttributeTable, NameTable
+from ClassDfn import count_disjoint_keys, count_disjoint_masks
+from SchemaParser import build_relations
+from SchemaGenerator import SchemaGenerator
+from Translator import Translator
+
+# components is database, isa, generated-30-1 and generated-30-2 renamed apart,
+# a schema of four IND-graph components
+SCHEMAS = ['database', 'isa', 'generated-30-1', 'generated-30-2', 'generated-30-4',
+           'generated-30-5', 'components']
+
+
+def schema_lines(name):
+    with open(os.path.join(TESTS_DIR, 'data', name + '.txt')) as inf:
+        return inf.read().splitlines()
+
+def expected_output(name):
+    with open(os.path.join(TESTS_DIR, 'data', name + '.json')) as inf:
+        return json.load(inf)
+
+def canonical(value):
+    ''' value with every list sorted, the order of the output is not compared '''
+    if isinstance(value, dict):
+        return tuple(sorted((k, canonical(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return tuple(sorted(canonical(v) for v in value))
+    return value
+
+def translation(translator):
+    ''' {'entities': [...], 'relationships': [...]} of translator '''
+    return {'entities': json.loads(translator.entity_json or '[]'),
+            'relationships': json.loads(translator.relationship_json or '[]')}
+
+def without(lines, names):
+    ''' the lines of a schema without the relations of names, their INDs and keys '''
+    kept = []
+    for line in lines:
+        words = set(w for w in line.replace('(', ' ').replace(')', ' ').replace(':', ' ').split())
+        if not words & names:
+            kept.append(line)
+    return kept
+
+
+class TranslatorTest(unittest.TestCase):
+
+    def assertTranslation(self, translator, name):
+        expected = expected_output(name)
+        output   = translation(translator)
+        for part in ('entities', 'relationships'):
+            # a list of tuples, so relationships found twice are not equal
+            self.assertEqual(sorted(canonical(v) for v in output[part]),
+                             sorted(canonical(v) for v in expected[part]),
+                             '{} of {}'.format(part, name))
+
+    def test_translate(self):
+        for name in SCHEMAS:
+            translator = Translator(build_relations(schema_lines(name)).values())
+            translator.translate()
+            self.assertTranslation(translator, name)
+
+    def test_apply(self):
+        for name in SCHEMAS:
+            lines  = schema_lines(name)
+            new    = build_relations(lines)
+            # every third relation added by the edit
+            names  = set(sorted(new)[::3])
+            old    = build_relations(without(lines, names))
+            translator = Translator(old.values(), fkey_targets=True)
+            translator.translate()
+            translator.apply(*Translator.diff(old, new))
+            self.assertTranslation(translator, name)
+
+            # by default an identifier shared by Entities resolves by the
+            # order the relations were given in, the added ones last
+            translator = Translator(old.values())
+            translator.translate()
+            added, removed, changed = Translator.diff(old, new)
+            translator.apply(added, removed, changed)
+            # undone and done again, the indexes of apply kept current
+            translator.apply(*Translator.diff(new, old))
+            translator.apply(added, removed, changed)
+            full = Translator([new[name] for name in old] + added)
+            full.translate()
+            self.assertEqual(sorted(canonical(v) for v in translation(translator)['relationships']),
+                             sorted(canonical(v) for v in translation(full)['relationships']), name)
+
+    def test_processes(self):
+        for name in SCHEMAS:
+            relations = build_relations(schema_lines(name))
+            translator = Translator(relations.values(), processes=2)
+            translator.translate()
+            self.assertTranslation(translator, name)
+            self.assertTrue(translator.has_model)
+
+            # the same JSON, in the same order, as in one process
+            serial = Translator(relations.values())
+            serial.translate()
+            self.assertEqual(translator.entity_json, serial.entity_json, name)
+            self.assertEqual(translator.relationship_json, serial.relationship_json, name)
+
+    def test_bitsets(self):
+        # the same JSON with the fkeys tested as masks, also after apply
+        for name in SCHEMAS:
+            lines = schema_lines(name)
+            relations = build_relations(lines)
+            serial = Translator(relations.values())
+            serial.translate()
+            translator = Translator(relations.values(), bitsets=True)
+            translator.translate()
+            self.assertEqual(translator.entity_json, serial.entity_json, name)
+            self.assertEqual(translator.relationship_json, serial.relationship_json, name)
+
+            old = build_relations(without(lines, set(sorted(relations)[::3])))
+            translator = Translator(old.values(), bitsets=True, fkey_targets=True)
+            translator.translate()
+            translator.apply(*Translator.diff(old, relations))
+            self.assertTranslation(translator, name)
+
+        R = Relation('R', frozenset(['a', 'b', 'c', 'd']))
+        keys = [frozenset(['a']), frozenset(['b', 'c']), frozenset(['c', 'd']), frozenset(['d'])]
+        for key in keys:
+            R.add_fkey(ForeignKey(key, key, 'S'))
+        R.add_key(frozenset(['a', 'b']))
+        AttributeTable().encode([R])
+        masks = [R.fkeys[k].key_mask for k in keys]
+        self.assertEqual(R.layout.elements(masks[1]), keys[1])
+        self.assertEqual(R.pkey_mask, R.layout.mask(['a', 'b']))
+        self.assertEqual(count_disjoint_masks(masks[:2], keys[:2]), 2)
+        self.assertEqual(count_disjoint_masks(masks, keys), count_disjoint_keys(keys))
+        # masks are left behind by a new key
+        R.add_key(frozenset(['c']))
+        self.assertIsNone(R.layout)
+
+    def test_compact(self):
+        # the same JSON from compacted relations, also after apply
+        for name in SCHEMAS:
+            lines = schema_lines(name)
+            serial = Translator(build_relations(lines).values())
+            serial.translate()
+            relations = build_relations(lines, NameTable())
+            translator = Translator(relations.values(), compact=True)
+            translator.translate()
+            self.assertEqual(translator.entity_json, serial.entity_json, name)
+            self.assertEqual(translator.relationship_json, serial.relationship_json, name)
+
+            old = build_relations(without(lines, set(sorted(relations)[::3])), NameTable())
+            translator = Translator(old.values(), compact=True, fkey_targets=True)
+            translator.translate()
+            translator.apply(*Translator.diff(old, relations))
+            self.assertTranslation(translator, name)
+
+    def test_disjoint_fkeys(self):
+        # the largest number of pairwise disjoint fkeys, in any order
+        lines = ['A(a)', 'B(b)', 'AB(a, b)', 'R(a, b, c)',
+                 'R(a) <= A(a)', 'R(b) <= B(b)', 'R(a, b) <= AB(a, b)',
+                 'A: (a)', 'B: (b)', 'AB: (a, b)', 'R: (a, b, c)']
+        for order in (lines, lines[:4] + lines[4:7][::-1] + lines[7:]):
+            self.assertEqual(build_relations(order)['R'].num_disjoint_fkeys, 2)
+
+        # kept current as fkeys are added, replaced ones included
+        rng   = random.Random(1)
+        attrs = ['a{}'.format(i) for i in range(8)]
+        for i in range(200):
+            R = Relation('R', frozenset(attrs))
+            for j in range(rng.randint(1, 10)):
+                key = frozenset(rng.sample(attrs, rng.randint(1, 3)))
+                R.add_fkey(ForeignKey(key, key, 'S'))
+                self.assertEqual(R.num_disjoint_fkeys, count_disjoint_keys(R.fkeys))
+
+        # a chain of keys too long to try all choices, counted greedily
+        chain = [frozenset(['a{}'.format(i), 'a{}'.format(i + 1)]) for i in range(MAX_EXACT_GROUP + 4)]
+        self.assertEqual(count_disjoint_keys(chain), len(chain) // 2)
+        self.assertEqual(count_disjoint_keys(chain[::-1]), count_disjoint_keys(chain))
+
+    def test_shared_identifier(self):
+        # the subtypes of an ISA hierarchy share the identifier of their root,
+        # with fkey_targets a relationship is with the Entity its fkey references
+        for seed in range(1, 6):
+            relations  = build_relations(SchemaGenerator(30, seed=seed).lines())
+            translator = Translator(relations.values(), fkey_targets=True)
+            translator.translate()
+            for rel in json.loads(translator.relationship_json):
+                R = relations.get(rel['name'])
+                if R is None or R.fkeys is None:
+                    continue
+                targets = set(fk.refed_relation for fk in R.fkeys.values())
+                for ent in rel['participating_entities']:
+                    self.assertIn(ent['name'], targets, '{} of seed {}'.format(rel['name'], seed))
+
+            if seed == 3:
+                R4 = [rel for rel in json.loads(translator.relationship_json) if rel['name'] == 'R4']
+                self.assertEqual(sorted(ent['name'] for ent in R4[0]['participating_entities']),
+                                 ['E3', 'E5'])
+
+
+if __name__ == '__main__':
+    unittest.main()
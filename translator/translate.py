@@ -1,22 +1,26 @@
 #!/usr/bin/python
 
-import re
+import os
 import sys
+import cgi
+import urlparse
 import argparse
 
-from ClassDfn import Relation, Relationship
+from ClassDfn import Relation, Relationship, NameTable
 from ClassDfn import Cardinality, ForeignKey
 from ClassDfn import repr_cardinality, repr_keys, repr_indi_key
 
 from Translator import Translator
-
-TBL_PAT = r'(?P<name>\w+)\((?P<attributes>[a-zA-Z0-9, ]+)\)$'
-IND_PAT = r'(?P<lrel>\w+)\((?P<latt>.*)\) <= (?P<rrel>\w+)\((?P<ratt>.*)\)$'
-KEY_PAT = r'(?P<name>\w+):[ ]*(?P<keys>.*)$'
-
-INDIVIDUAL_KEY_PAT = r'\((?P<attr>.+)\)'
+from TranslationCache import TranslationCache
+from SchemaValidator import read_validated_schema, Severity
+from SqliteCatalog import read_sqlite
+from DdlParser import read_ddl
+from OutputWriter import write_translation, write_bundle, remove_bundle
+from DiagramLayout import LaidOutTranslation, layout_available
+from Workspace import Workspace, evict_workspaces, valid_upload_id, WORKSPACE_TTL
 
 renderPath='/var/www/CS4221/render/'
+bundleFile='erd_bundle.json'
 renderURL='http://localhost/CS4221/render'
 uploadPath='/var/www/CS4221/upload/'
 
@@ -31,63 +35,53 @@ print '<p> Please make sure the following variables are correct.If any of these
 print '<p>The render folder path:'+renderPath+'<br>'
 print 'The render URL path:'+renderURL+'<br>'
 print 'The upload folder path:'+uploadPath+'</p>'
-def read_inputs(input_file):
+def read_inputs(input_file, names=None):
     # get the relational table schema and INDs
-    # from input_file
-    infile = open(input_file)
-    line = None
-    relations = {}
-
-    try:
-        while True:
-            line = next(infile).strip()
-
-            # match table pattern
-            matches = re.match(TBL_PAT, line)
-            if matches is not None:
-                name       = matches.group('name')
-                attributes = frozenset([c.strip() for c in matches.group('attributes').split(',')])
-                relations[name] = Relation(name, attributes) # add to relations
-
-            # match inclusion dependency pattern
-            matches = re.match(IND_PAT, line)
-            if matches is not None:
-                lrel   = matches.group('lrel')
-                rrel   = matches.group('rrel')
-                latt   = frozenset(c.strip() for c in matches.group('latt').split(','))
-                ratt   = frozenset(c.strip() for c in matches.group('ratt').split(','))
-                if lrel in relations and rrel in relations:
-
-                    fkey = ForeignKey(latt, ratt, rrel)
-                    relations[lrel].add_fkey(fkey)
-                    relations[rrel].add_refed_by(lrel)
-
-                else:
-                    print('Skip IND {} since relation definition missing.'.format(line))
-
-            # match key patern
-            matches = re.match(KEY_PAT, line)
-            if matches is not None:
-                name        = matches.group('name')
-                keys_clause = matches.group('keys')
-                for ind_k in keys_clause.split(';'):
-                    ind_k = ind_k.strip()
-                    matches = re.match(INDIVIDUAL_KEY_PAT, ind_k)
-                    if matches is not None:
-                        key = frozenset([k.strip() for k in matches.group('attr').split(',')])
-                        try:
-                            relations[name].add_key(key)
-                        except KeyError:
-                            print('Skip key {} since relation definition missing.'.format(line))
-                    
-    except StopIteration:
-        infile.close()
-        return relations
-
-def write_to_file(filename, content):
-    ''' Write content to file of filename '''
-    with open(filename, 'w+') as outf:
-        outf.write(content + '\n')
+    # from input_file, with the diagnostics of its lines
+    return read_validated_schema(input_file, names)
+
+def print_diagnostics(diagnostics):
+    ''' print the diagnostics of the schema file as HTML '''
+    errors = sum(1 for d in diagnostics if d.severity == Severity.error)
+    print '<p>Schema check: {} errors, {} warnings</p>'.format(errors, len(diagnostics) - errors)
+    if diagnostics:
+        print '<pre>'
+        for d in diagnostics:
+            print cgi.escape('{}\n    {}'.format(d, d.line) if d.line else str(d))
+        print '</pre>'
+
+def request_upload_id():
+    ''' the id parameter of the CGI request, None if there is none '''
+    query = urlparse.parse_qs(os.environ.get('QUERY_STRING', ''))
+    return query.get('id', [None])[0]
+
+def request_flag(name):
+    ''' the yes or no parameter name of the CGI request, e.g. layout=0,
+        None if there is none
+    '''
+    query = urlparse.parse_qs(os.environ.get('QUERY_STRING', ''))
+    value = query.get(name, [''])[0].lower()
+    if value in ('1', 'yes', 'true', 'on'):
+        return True
+    if value in ('0', 'no', 'false', 'off'):
+        return False
+    return None
+
+def choose(option, name, default):
+    ''' option given on the command line, else the flag name of the
+        request, else default
+    '''
+    if option is not None:
+        return option
+    flag = request_flag(name)
+    return default if flag is None else flag
+
+def end_page(message):
+    ''' print message and end the page without translating '''
+    print '<p>{}</p>'.format(cgi.escape(message))
+    print '</body>'
+    print '</html>'
+    sys.exit(1)
 
 def parse_arguments():
     ''' parse command line arguments '''
@@ -108,6 +102,48 @@ def parse_arguments():
     parser.add_argument('-r', '--relationship_outfile', 
                         help='filename where JSON of translated Relationships will be saved.',
                         default='relationship_json.txt')
+    parser.add_argument('-c', '--cache_dir',
+                        help='directory caching translations, a schema translated before is not translated again.',
+                        default=None)
+    parser.add_argument('-j', '--processes',
+                        help='number of processes translating the independent parts of the schema.',
+                        type=int, default=1)
+    parser.add_argument('-b', '--bundle',
+                        help='also save entities and relationships in one compact file, ' + bundleFile + ' (and .gz), which the renderer loads first; the default, unless the request has bundle=0.',
+                        action="store_true", default=None)
+    parser.add_argument('-B', '--no_bundle', dest='bundle',
+                        help='do not save ' + bundleFile + '.',
+                        action="store_false")
+    parser.add_argument('-d', '--database',
+                        help='SQLite database whose tables are translated instead of the uploaded schema file.',
+                        default=None)
+    parser.add_argument('-s', '--sql_dump',
+                        help='SQL dump whose CREATE TABLE statements are translated instead of the uploaded schema file.',
+                        default=None)
+    parser.add_argument('-t', '--timings',
+                        help='print the wall time and calls of each phase of the translation.',
+                        action="store_true")
+    parser.add_argument('-u', '--upload_id',
+                        help='translate the schema of this upload in its own workspace, by default the id parameter of the request; without one the schema in the upload folder is translated.',
+                        default=None)
+    parser.add_argument('-w', '--workspace_ttl',
+                        help='seconds after which the workspaces of uploads not used are removed.',
+                        type=int, default=WORKSPACE_TTL)
+    parser.add_argument('-k', '--check',
+                        help='only check the uploaded schema file and print its diagnostics, without translating it.',
+                        action="store_true")
+    parser.add_argument('-l', '--layout',
+                        help='lay the diagram out and save the positions of its shapes with the JSON, for the renderer to draw them there; needs NumPy. The default when NumPy is installed, unless the request has layout=0.',
+                        action="store_true", default=None)
+    parser.add_argument('-L', '--no_layout', dest='layout',
+                        help='do not lay the diagram out, the renderer places the shapes itself.',
+                        action="store_false")
+    parser.add_argument('-m', '--compact',
+                        help='keep the schema in as little memory as possible, for schemas of 100k+ relations, and print the peak memory.',
+                        action="store_true")
+    parser.add_argument('-f', '--fkey_targets',
+                        help='a relationship with an identifier shared by entities, e.g. those of an ISA hierarchy, is with the entity its foreign key references, or the root of the hierarchy.',
+                        action="store_true")
 
     args = parser.parse_args()
     return args
@@ -118,10 +154,35 @@ if __name__ == '__main__':
     # get parsed arguments
     args = parse_arguments()
 
-    # Reading schemas
-    print '<h3>Reading schema ... ', 
+    # the files of an upload are kept apart from those of the others
+    upload_id = args.upload_id or request_upload_id()
+    if upload_id is not None:
+        if not valid_upload_id(upload_id):
+            end_page('Invalid upload ID {}'.format(upload_id))
+        workspace = Workspace(upload_id, uploadPath, renderPath)
+        if not os.path.isfile(workspace.schema_file):
+            end_page('No schema uploaded as {}, it may have expired, please upload it again.'.format(upload_id))
+        workspace.create()
+        evict_workspaces(uploadPath, renderPath, args.workspace_ttl)
+        schemaFile = workspace.schema_file
+        outputPath = os.path.join(workspace.output_dir, '')
+        outputURL  = renderURL + '/?id=' + upload_id
+    else:
+        schemaFile = uploadPath + "database.txt"
+        outputPath = renderPath
+        outputURL  = renderURL
+
+    # Reading schemas, the messages of the readers go before the heading
     indent = '    '
-    relations = read_inputs(uploadPath+"database.txt") 
+    if args.database:
+        relations = read_sqlite(args.database)
+    elif args.sql_dump:
+        relations = read_ddl(args.sql_dump)
+    else:
+        relations, diagnostics = read_inputs(schemaFile,
+                                             NameTable() if args.compact else None)
+
+    print '<h3>Reading schema ... done</h3>'
 
     if args.verbosity:
         print('\nRelations: ')
@@ -135,15 +196,31 @@ if __name__ == '__main__':
             if R.refed_by is not None:
                 print('{}{}: {}'.format(indent*2, 'Referenced by', ', '.join(str(r) for r in R.refed_by)))
 
-    print 'done\n'
+    if not (args.database or args.sql_dump):
+        print_diagnostics(diagnostics)
+        if args.check:
+            print '</body>'
+            print '</html>'
+            sys.exit(0)
 
     # TRANSLATING part
-    print 'Translating ... ',
-    translator = Translator(relations.values())
+    print '<h3>Translating ... ',
+    cache = TranslationCache(cache_dir=args.cache_dir) if args.cache_dir else None
+    translator = Translator(relations.values(), cache=cache, processes=args.processes,
+                            timings=args.timings, compact=args.compact,
+                            fkey_targets=args.fkey_targets)
     translator.translate()
-    print 'done\n</h3>'
+    print 'done{}\n</h3>'.format(' (from cache)' if translator.from_cache else '')
 
-    if args.verbosity:
+    if args.verbosity and cache is not None:
+        print('Cache: {}'.format(', '.join('{} {}'.format(k, v) for k, v in sorted(cache.stats.items()))))
+        print
+
+    if args.verbosity and translator.from_cache:
+        print 'Intemediate output not available, the translation was cached.'
+    elif args.verbosity and not translator.has_model:
+        print 'Intemediate output not available, the translation was done in {} processes.'.format(args.processes)
+    elif args.verbosity:
         print 'Intemediate output: '
         # find core relations
         core_relations = translator.core_relations
@@ -168,7 +245,7 @@ if __name__ == '__main__':
         ISA_relations = translator.ISA_relations
         print('ISA_relations: ')
         for r1, r2 in ISA_relations.items():
-            print('{}{:15s} -> {}'.format(indent, r1, r2))
+            print('{}{:15s} -> {}'.format(indent, r1, ', '.join(r2)))
         print
 
 
@@ -199,12 +276,39 @@ if __name__ == '__main__':
                 print
         print
 
+    # lay out the diagram, the renderer places the shapes itself otherwise
+    output = translator
+    layout = choose(args.layout, 'layout', layout_available())
+    if layout and not layout_available():
+        print '<p>NumPy is not installed, the diagram is not laid out.</p>'
+    elif layout and args.timings:
+        output = translator.stats.time('layout', LaidOutTranslation, translator)
+    elif layout:
+        output = LaidOutTranslation(translator)
+
     # write to outfile
-    write_to_file(renderPath+args.entity_outfile, translator.entity_json)
-    write_to_file(renderPath+args.relationship_outfile, translator.relationship_json)
+    if args.timings:
+        translator.stats.time('write_json', write_translation, output,
+                              outputPath+args.entity_outfile, outputPath+args.relationship_outfile)
+    else:
+        write_translation(output, outputPath+args.entity_outfile, outputPath+args.relationship_outfile)
+    if choose(args.bundle, 'bundle', True):
+        write_bundle(output, outputPath+bundleFile)
+    else:
+        # the renderer would load the bundle of an earlier translation
+        remove_bundle(outputPath+bundleFile)
+
+    if args.timings:
+        print '<h3>Timings</h3>'
+        print '<pre>'
+        print '\n'.join(translator.stats.report())
+        print '</pre>'
+
+    if args.compact and translator.peak_memory is not None:
+        print '<p>Peak memory: {:.1f} MB</p>'.format(translator.peak_memory / 1048576.0)
 
     print "<p>Finish Translation, JSON saved to render path {}, {}".format(args.entity_outfile, args.relationship_outfile)
     print ', please make sure the directory is readable/writable</p>'
-    print '<p> Go to the render URL <a href="'+renderURL+'"> <button>Go To</button></a></p>';
+    print '<p> Go to the render URL <a href="'+outputURL+'"> <button>Go To</button></a></p>';
     print '</body>'
     print '</html>'
@@ -11,12 +11,19 @@ if ((($_FILES["file"]["type"] == "text/plain"))
     }
   else
     {
+      // every upload gets its own folder, named by an ID of 32 hex digits
+      // which the translator and the renderer are given, so that the
+      // uploads of users at the same time do not replace each other
+      $id = md5(uniqid(mt_rand(), true));
+      mkdir($id);
       move_uploaded_file($_FILES["file"]["tmp_name"],
-      "database.txt");
+      $id . "/database.txt");
+      $translator = "http://localhost/cgi-bin/translator/translate.py?id=" . $id;
       echo "<h1>Step 2: Check The CGI Support of The Server </h1>";
-      echo '<p>Please put the Python translator module into your CGI-Bin folder and it should be accessable via <a href="http://localhost/cgi-bin/translator/translate.py">http://localhost/cgi-bin/translator/translate.py </a> </p>';
+      echo '<p>Please put the Python translator module into your CGI-Bin folder and it should be accessable via <a href="' . $translator . '">' . $translator . ' </a> </p>';
       echo '<p>For the translator to run properly, Python and CGI will need to be enabled. You should also set the translator folder and the files into readable/writable.</p>';
-      echo '<p><a href="http://localhost/cgi-bin/translator/translate.py"><button>Run The Translator</button></a></p>';
+      echo '<p>Your upload is kept for a day as ' . $id . '.</p>';
+      echo '<p><a href="' . $translator . '"><button>Run The Translator</button></a></p>';
     }
   }
 else